@@ -83,6 +83,23 @@ struct CVMRightShiftParam : public utils::Parameter<CVMRightShiftParam> {
   }
 };
 
+struct CVMRequantParam : public utils::Parameter<CVMRequantParam> {
+  int precision;
+  bool is_sign;
+  int multiplier;
+  int shift_bit;
+  CVMUTIL_DECLARE_PARAMETER(CVMRequantParam) {
+    CVMUTIL_DECLARE_FIELD(precision)
+      .describe("Precision such that value out of range this will be clipped.");
+    CVMUTIL_DECLARE_FIELD(is_sign).set_default(true)
+      .describe("Clip range is sign int or unsigned int.");
+    CVMUTIL_DECLARE_FIELD(multiplier).set_default(1)
+      .describe("Integer scale multiplied before shift.");
+    CVMUTIL_DECLARE_FIELD(shift_bit).set_default(0)
+      .describe("Right shift bit if positive, left shift bit if negative.");
+  }
+};
+
 
 //  // Shared by softmax and log_softmax
 //  struct SoftmaxParam : public utils::Parameter<SoftmaxParam> {
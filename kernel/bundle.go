@@ -0,0 +1,97 @@
+package kernel
+
+import (
+	"bytes"
+	"crypto/sha256"
+	"encoding/binary"
+	"errors"
+	"fmt"
+
+	"github.com/CortexFoundation/CortexTheseus/log"
+)
+
+// The single-file model bundle written by `cvm.bundle`, in little-endian:
+//
+//	uint64 magic, uint32 version, uint32 N
+//	N * (uint32 kind, uint32 reserved, uint64 offset, uint64 size, [32]byte sha256)
+//	sections, each aligned to the page size
+const (
+	BUNDLE_MAGIC   uint64 = 0x4C444E424D5643BF
+	BUNDLE_VERSION uint32 = 1
+
+	BUNDLE_SECTION_META   uint32 = 1
+	BUNDLE_SECTION_GRAPH  uint32 = 2
+	BUNDLE_SECTION_PARAMS uint32 = 3
+	BUNDLE_SECTION_DATA   uint32 = 4
+
+	bundleHeadSize    = 16
+	bundleSectionSize = 56
+)
+
+type Bundle struct {
+	Meta   []byte
+	Graph  []byte
+	Params []byte
+	Data   []byte
+}
+
+func IsBundle(data []byte) bool {
+	return len(data) >= bundleHeadSize &&
+		binary.LittleEndian.Uint64(data[0:8]) == BUNDLE_MAGIC
+}
+
+// ParseBundle slices the sections out of the bundle bytes without copying,
+// and verifies the sha256 digests of sections if `verify` is set.
+func ParseBundle(data []byte, verify bool) (*Bundle, error) {
+	if !IsBundle(data) {
+		return nil, errors.New("invalid bundle magic")
+	}
+	if version := binary.LittleEndian.Uint32(data[8:12]); version != BUNDLE_VERSION {
+		return nil, fmt.Errorf("unsupported bundle version %d", version)
+	}
+	num := uint64(binary.LittleEndian.Uint32(data[12:16]))
+	if bundleHeadSize+num*bundleSectionSize > uint64(len(data)) {
+		return nil, errors.New("bundle section table truncated")
+	}
+
+	bundle := &Bundle{}
+	for i := uint64(0); i < num; i++ {
+		entry := data[bundleHeadSize+i*bundleSectionSize:]
+		kind := binary.LittleEndian.Uint32(entry[0:4])
+		offset := binary.LittleEndian.Uint64(entry[8:16])
+		size := binary.LittleEndian.Uint64(entry[16:24])
+		if offset > uint64(len(data)) || size > uint64(len(data))-offset {
+			return nil, fmt.Errorf("bundle section %d out of range", kind)
+		}
+		section := data[offset : offset+size]
+		if verify {
+			digest := sha256.Sum256(section)
+			if !bytes.Equal(digest[:], entry[24:56]) {
+				return nil, fmt.Errorf("bundle section %d checksum mismatch", kind)
+			}
+		}
+		switch kind {
+		case BUNDLE_SECTION_META:
+			bundle.Meta = section
+		case BUNDLE_SECTION_GRAPH:
+			bundle.Graph = section
+		case BUNDLE_SECTION_PARAMS:
+			bundle.Params = section
+		case BUNDLE_SECTION_DATA:
+			bundle.Data = section
+		}
+	}
+	if len(bundle.Graph) == 0 || len(bundle.Params) == 0 {
+		return nil, errors.New("bundle graph or params section missing")
+	}
+	return bundle, nil
+}
+
+func NewFromBundle(lib *LibCVM, data []byte, deviceType, deviceId int) (*Model, int) {
+	bundle, err := ParseBundle(data, true)
+	if err != nil {
+		log.Warn("model bundle invalid", "error", err)
+		return nil, ERROR_LOGIC
+	}
+	return New(lib, bundle.Graph, bundle.Params, deviceType, deviceId)
+}
@@ -11,6 +11,7 @@ from mrt.V3.calibrate import DOC as calibrate_doc
 from mrt.V3.quantize import DOC as quantize_doc
 from mrt.V3.evaluate import DOC as evaluate_doc
 from mrt.V3.mrt_compile import DOC as compile_doc
+from mrt.V3.sensitivity import DOC as sensitivity_doc
 
 DOC = """
 Usage:  python {0} --help
@@ -24,7 +25,7 @@ if __name__ == "__main__":
     if len(sys.argv) == 2 and sys.argv[1] in ["--help", "-h"]:
         docs = "\n".join([
             DOC, utils_doc, prepare_doc, calibrate_doc,
-            quantize_doc, evaluate_doc, compile_doc])
+            quantize_doc, evaluate_doc, compile_doc, sensitivity_doc])
         print(docs)
     else:
         assert len(sys.argv) >= 2 and len(sys.argv)%2 == 0, \
@@ -3,6 +3,9 @@ from . import symbol as sym
 from . import graph
 from . import ndarray
 from . import ndarray as nd
+from . import params
+from . import blobs
+from . import bundle
 
 from .common import *
 from . import runtime
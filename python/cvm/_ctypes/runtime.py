@@ -126,6 +126,56 @@ def CVMAPIGetOutputTypeSize(net):
     check_call(_LIB.CVMAPIGetOutputTypeSize(net, ctypes.byref(size)))
     return size.value
 
+def output_dtype(type_size):
+    """ The numpy dtype of model output with the output type size. """
+    if type_size == 1:
+        return np.dtype("int8")
+    if type_size == 4:
+        return np.dtype("<i4")
+    raise ValueError("unsupported output type size: %d" % type_size)
+
+def CVMAPIInferenceInto(net, input_data, out=None):
+    """ Ctypes wrapper method: CVMAPIInferenceInto
+
+        CVM interface for model inference writing into the output buffer.
+
+        Both the input and output are accessed via buffer protocol
+        without copying, so they must be C-contiguous.
+
+        Parameters
+        ==========
+        net : ctypes.c_void_p
+            The CVM model handle created by the interface :func:`cvm.runtime.CVMAPILoadModel <.CVMAPILoadModel>`.
+        input_data : bytes, numpy.ndarray or memoryview
+            The input image data.
+        out : numpy.ndarray or writable buffer, optional
+            The output buffer of at least :func:`CVMAPIGetOutputLength <.CVMAPIGetOutputLength>` bytes.
+            A new array of int8 or int32 according to the output type
+            size is created if not specified.
+
+        Returns
+        =======
+        out : numpy.ndarray or writable buffer
+            The output buffer.
+    """
+    osize = CVMAPIGetOutputLength(net)
+    if out is None:
+        otype_size = CVMAPIGetOutputTypeSize(net)
+        out = np.empty(osize // otype_size, dtype=output_dtype(otype_size))
+
+    ibuf = np.frombuffer(memoryview(input_data).cast('B'), dtype="uint8")
+    obuf = np.frombuffer(memoryview(out).cast('B'), dtype="uint8")
+    if ibuf.size == 0:
+        raise ValueError("empty input data")
+    if obuf.size < osize:
+        raise ValueError("output buffer of %d bytes is less than %d" % (
+            obuf.size, osize))
+    check_call(_LIB.CVMAPIInference(
+        net,
+        ibuf.ctypes.data_as(ctypes.c_char_p), ctypes.c_int(ibuf.size),
+        obuf.ctypes.data_as(ctypes.c_char_p)))
+    return out
+
 def CVMAPIInference(net, input_data):
     """ Ctypes wrapper method: CVMAPIInference
 
@@ -139,21 +189,59 @@ def CVMAPIInference(net, input_data):
         input_data : bytes
             The input image bytes.
 
+        Returns
+        =======
+        ret : list of int
+            The signed output values of output type size.
     """
-    osize = CVMAPIGetOutputLength(net)
+    return CVMAPIInferenceInto(net, input_data).tolist()
 
-    output_data = bytes(osize)
-    check_call(_LIB.CVMAPIInference(
-        net,
-        ctypes.c_char_p(input_data), ctypes.c_int(len(input_data)),
-        ctypes.c_char_p(output_data)))
-
-    otype_size = CVMAPIGetOutputTypeSize(net)
-    ret = []
-    max_v = (1 << (otype_size * 8  - 1))
-    for i in range(0, osize, otype_size):
-        int_val = int.from_bytes(
-            output_data[i:i+otype_size], byteorder='little')
-        ret.append(int_val if int_val < max_v else int_val - 2 * max_v)
-
-    return ret
+def CVMAPIGetStorageSize(net):
+    """ Ctypes wrapper method: CVMAPIGetStorageSize
+
+        Get the bytes of the planned storage pool of the loaded model.
+
+        Parameters
+        ==========
+        net : ctypes.c_void_p
+            The CVM model handle created by the interface :func:`cvm.runtime.CVMAPILoadModel <.CVMAPILoadModel>`.
+
+    """
+    size = ctypes.c_ulonglong()
+    check_call(_LIB.CVMAPIGetStorageSize(net, ctypes.byref(size)))
+    return size.value
+
+def CVMAPIGetGasFromModel(net):
+    """ Ctypes wrapper method: CVMAPIGetGasFromModel
+
+        Get the gas, namely the estimated operations plus the memory
+        cost, of the loaded model.
+
+        Parameters
+        ==========
+        net : ctypes.c_void_p
+            The CVM model handle created by the interface :func:`cvm.runtime.CVMAPILoadModel <.CVMAPILoadModel>`.
+
+    """
+    gas = ctypes.c_ulonglong()
+    check_call(_LIB.CVMAPIGetGasFromModel(net, ctypes.byref(gas)))
+    return gas.value
+
+def CVMAPIGetGasFromGraphFile(json_str):
+    """ Ctypes wrapper method: CVMAPIGetGasFromGraphFile
+
+        Estimate the gas from the model json only, the parameters
+        are neither loaded nor allocated.
+
+        Parameters
+        ==========
+        json_str: bytes or str
+            The model json content.
+
+    """
+    if isinstance(json_str, str):
+        json_str = json_str.encode("utf-8")
+    gas = ctypes.c_ulonglong()
+    check_call(_LIB.CVMAPIGetGasFromGraphFile(
+        ctypes.c_char_p(json_str), ctypes.byref(gas)))
+    return gas.value
@@ -0,0 +1 @@
+"""Namespace for the cython generated modules of python3."""
@@ -1,5 +1,5 @@
 
-cdef extern from "cvm/c_api.h":
+cdef extern from "cvm/c_api.h" nogil:
     int CVMAPILoadModel(const char *graph_json, int graph_strlen,
         const char *param_bytes, int param_strlen,
         void **net,
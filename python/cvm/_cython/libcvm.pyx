@@ -1,41 +1,59 @@
+""" Cython binding of CVM runtime C API.
+
+    The inference takes any C-contiguous buffer-protocol object, such
+    as bytes, numpy.ndarray or memoryview, as input without copying,
+    and writes the result into a typed memoryview of the output buffer.
+    The GIL is released during model load and inference, so threads
+    run models concurrently.
+"""
+
 cimport ccvm
+import ctypes
 import numpy as np
 from cvm._base import check_call
-from cvm import CVMContext, kDLCPU, runtime_context
+from cvm.common import CVMContext, kDLCPU, runtime_context
 
 
 cdef class CVMRuntime:
     cdef void *network
 
+    def __cinit__(self):
+        self.network = NULL
+
     def __init__(self, bytes graph_json, bytes param_bytes,
             int device_type = kDLCPU,
             int device_id = 0):
-
         ctx = runtime_context(CVMContext(device_type, device_id))
-        check_call(ccvm.CVMAPILoadModel(
-            graph_json, len(graph_json),
-            param_bytes, len(param_bytes),
-            &self.network, ctx.device_type, ctx.device_id))
+        cdef const char *cjson = graph_json
+        cdef const char *cparams = param_bytes
+        cdef int json_len = len(graph_json)
+        cdef int params_len = len(param_bytes)
+        cdef int dev_type = ctx.device_type
+        cdef int dev_id = ctx.device_id
+        cdef int status
+        with nogil:
+            status = ccvm.CVMAPILoadModel(
+                cjson, json_len, cparams, params_len,
+                &self.network, dev_type, dev_id)
+        check_call(status)
+
+    def __dealloc__(self):
+        if self.network != NULL:
+            ccvm.CVMAPIFreeModel(self.network)
+            self.network = NULL
+
+    @property
+    def handle(self):
+        """ The address of model handle, usable by the module functions. """
+        return <size_t>self.network
 
     def FreeModel(self):
-        check_call(ccvm.CVMAPIFreeModel(self.network))
+        if self.network != NULL:
+            check_call(ccvm.CVMAPIFreeModel(self.network))
+            self.network = NULL
 
-    def Inference(self, char *input_data):
-        input_size = self.GetInputLength()
-        output_size = self.GetOutputLength()
-        output_data = bytes(output_size)
-        output_type_size = self.GetOutputTypeSize()
-
-        check_call(ccvm.CVMAPIInference(
-            self.network, input_data, input_size, output_data))
-
-        max_v = (1 << (output_type_size * 8 - 1))
-        infer_result = []
-        for i in range(0, output_size, output_type_size):
-            int_val = int.from_bytes(output_data[i:i+output_type_size], byteorder='little')
-            infer_result.append(int_val if int_val < max_v else \
-                int_val - 2 * max_v)
-        return infer_result
+    def Inference(self, input_data, out=None):
+        return _inference(self.network, input_data, out)
 
     def GetVersion(self, char *version):
         check_call(ccvm.CVMAPIGetVersion(self.network, version))
@@ -73,7 +91,65 @@ cdef class CVMRuntime:
         check_call(ccvm.CVMAPIGetGasFromModel(self.network, cgas))
         return cgas[0]
 
+    @staticmethod
     def GetGasFromGraphFile(const char *graph_json):
         cdef unsigned long long[1] cgas
         check_call(ccvm.CVMAPIGetGasFromGraphFile(graph_json, cgas))
         return cgas[0]
+
+
+cdef void *_handle(object net) except? NULL:
+    if isinstance(net, CVMRuntime):
+        net = (<CVMRuntime>net).handle
+    elif isinstance(net, ctypes.c_void_p):
+        net = net.value
+    if not net:
+        raise ValueError("invalid model handle: %s" % net)
+    return <void *><size_t>net
+
+def output_dtype(size_t type_size):
+    """ The numpy dtype of model output with the output type size. """
+    if type_size == 1:
+        return np.dtype("int8")
+    if type_size == 4:
+        return np.dtype("<i4")
+    raise ValueError("unsupported output type size: %d" % type_size)
+
+cdef object _inference(void *net, object input_data, object out):
+    cdef unsigned long long osize, otype_size
+    check_call(ccvm.CVMAPIGetOutputLength(net, &osize))
+    if out is None:
+        check_call(ccvm.CVMAPIGetOutputTypeSize(net, &otype_size))
+        out = np.empty(osize // otype_size, dtype=output_dtype(otype_size))
+
+    # casting to bytes view never copies, and raises TypeError
+    # for the non-contiguous buffers.
+    cdef const unsigned char[::1] ibuf = memoryview(input_data).cast('B')
+    cdef unsigned char[::1] obuf = memoryview(out).cast('B')
+    if ibuf.shape[0] == 0:
+        raise ValueError("empty input data")
+    if <unsigned long long>obuf.shape[0] < osize:
+        raise ValueError("output buffer of %d bytes is less than %d" % (
+            obuf.shape[0], osize))
+
+    cdef int input_len = ibuf.shape[0]
+    cdef int status
+    with nogil:
+        status = ccvm.CVMAPIInference(
+            net, <char *>&ibuf[0], input_len, <char *>&obuf[0])
+    check_call(status)
+    return out
+
+def CVMAPIInferenceInto(net, input_data, out=None):
+    """ Cython wrapper method: CVMAPIInferenceInto
+
+        Refer to :func:`cvm.runtime.CVMAPIInferenceInto` for details.
+    """
+    return _inference(_handle(net), input_data, out)
+
+def CVMAPIInference(net, input_data):
+    """ Cython wrapper method: CVMAPIInference
+
+        Refer to :func:`cvm.runtime.CVMAPIInference` for details.
+    """
+    return _inference(_handle(net), input_data, None).tolist()
@@ -0,0 +1,250 @@
+""" Content-hashed Parameter Blob Store
+
+    Model variants compiled from one backbone, such as the split models,
+    the heads or the batch sizes, share most of the lowered weights. The
+    blob store saves every tensor once, as a file named by the sha256
+    digest of its serialized record in the CVM parameters format (see
+    :mod:`cvm.params`), so the identical tensors of the variants are
+    deduplicated::
+
+        <root>/<digest[:2]>/<digest>
+
+    A compiled model refers to the blobs with a manifest file,
+    `params.blobs` in the model directory, instead of the `params`
+    file::
+
+        {"version": 1, "store": <root>,
+         "params": [[name, digest], ...]}
+
+    The blobs are memory-mapped read-only and the mappings are shared
+    by all models in the process, so the identical weights are viewed
+    by numpy without copying and occupy the page cache once per host.
+    The parameters binary for the runtime is assembled from the mapped
+    blobs by :meth:`BlobStore.assemble`.
+"""
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+import threading
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from .params import kCVMNDArrayMagic, _TENSOR_HEAD, _dtype_from_dl, \
+                    _header_chunks, _tensor_chunks
+
+__all__ = ["MANIFEST_NAME", "BlobStore", "save_manifest", "load_manifest",
+           "read_manifest_params"]
+
+MANIFEST_NAME = "params.blobs"
+""" The manifest file name in model directory. """
+
+kManifestVersion = 1
+
+def _record_view(buf):
+    """ Parse the serialized tensor record into numpy view. """
+    magic, _, _, _, ndim, code, bits, lanes = \
+        _TENSOR_HEAD.unpack_from(buf, 0)
+    if magic != kCVMNDArrayMagic:
+        raise ValueError("Invalid DLTensor file format")
+    offset = _TENSOR_HEAD.size
+    shape = struct.unpack_from("<%dq" % ndim, buf, offset)
+    offset += 8 * ndim
+    nbytes = struct.unpack_from("<q", buf, offset)[0]
+    offset += 8
+    dtype = _dtype_from_dl(code, bits, lanes)
+    if offset + nbytes != len(buf):
+        raise ValueError("Invalid DLTensor file format")
+    return np.frombuffer(buf, dtype=dtype, count=nbytes // dtype.itemsize,
+                         offset=offset).reshape(shape)
+
+class BlobStore:
+    """ Directory of content-hashed tensor blobs.
+
+        Parameters
+        ==========
+        root: str
+            The store directory, created if not exists.
+    """
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps = {}
+
+    def path(self, digest):
+        """ The file path of the blob. """
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, value):
+        """ Save the tensor into store if not exists.
+
+            Parameters
+            ==========
+            value: numpy.ndarray or NDArray
+                The tensor, serialized as :func:`cvm.params.save_params`.
+
+            Returns
+            =======
+            digest: str
+                The sha256 hex digest of the serialized record.
+        """
+        chunks = list(_tensor_chunks(value))
+        sha = hashlib.sha256()
+        for chunk in chunks:
+            sha.update(chunk)
+        digest = sha.hexdigest()
+        fname = self.path(digest)
+        if os.path.exists(fname):
+            return digest
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        fd, tmp_fname = tempfile.mkstemp(dir=os.path.dirname(fname))
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                for chunk in chunks:
+                    fout.write(chunk)
+            # the concurrent writers of the same blob write identical
+            # content, the atomic rename keeps either one.
+            os.replace(tmp_fname, fname)
+        except Exception:
+            os.remove(tmp_fname)
+            raise
+        return digest
+
+    def put_params(self, names, values):
+        """ Save the tensors into store.
+
+            The `values` could be a generator producing the tensors
+            lazily, in the order of `names`, see
+            :func:`cvm.params.write_params`.
+
+            Returns
+            =======
+            entries: list of tuple
+                The (name, digest) pairs.
+        """
+        entries = [(name, self.put(value)) \
+                   for name, value in zip(names, values)]
+        if len(entries) != len(names):
+            raise ValueError("expected %d tensors but got %d" \
+                % (len(names), len(entries)))
+        return entries
+
+    def open(self, digest):
+        """ The read-only memory map of the blob, shared in process. """
+        with self._lock:
+            buf = self._maps.get(digest, None)
+            if buf is None:
+                with open(self.path(digest), "rb") as fin:
+                    buf = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[digest] = buf
+            return buf
+
+    def tensor(self, digest):
+        """ The zero-copy numpy view of the blob. """
+        return _record_view(self.open(digest))
+
+    def load(self, entries):
+        """ The name to zero-copy numpy view dict of the entries. """
+        return OrderedDict((name, self.tensor(digest)) \
+                           for name, digest in entries)
+
+    def assemble(self, entries):
+        """ Assemble the parameters binary from blobs for runtime.
+
+            The output is bit-exact with the `params` file of the
+            model written without blob store.
+        """
+        chunks = _header_chunks([name for name, _ in entries])
+        chunks.extend(self.open(digest) for _, digest in entries)
+        return b"".join(chunks)
+
+    def digests(self):
+        """ All the blob digests in store. """
+        ret = set()
+        for prefix in os.listdir(self.root):
+            subdir = os.path.join(self.root, prefix)
+            if len(prefix) == 2 and os.path.isdir(subdir):
+                ret.update(f for f in os.listdir(subdir) \
+                           if f.startswith(prefix) and len(f) == 64)
+        return ret
+
+    def nbytes(self):
+        """ Total bytes of blobs in store. """
+        return sum(os.path.getsize(self.path(d)) for d in self.digests())
+
+    def gc(self, manifests):
+        """ Remove the blobs not referenced by the manifest files.
+
+            Returns
+            =======
+            removed: list of str
+                The removed blob digests.
+        """
+        used = set()
+        for fname in manifests:
+            used.update(d for _, d in load_manifest(fname)[1])
+        removed = sorted(self.digests() - used)
+        with self._lock:
+            for digest in removed:
+                buf = self._maps.pop(digest, None)
+                if buf is not None:
+                    try:
+                        buf.close()
+                    except BufferError:
+                        pass
+                os.remove(self.path(digest))
+        return removed
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def _get_store(root):
+    root = os.path.abspath(root)
+    with _STORES_LOCK:
+        if root not in _STORES:
+            _STORES[root] = BlobStore(root)
+        return _STORES[root]
+
+def save_manifest(fname, store, entries):
+    """ Save the manifest of blob entries into file. """
+    with open(fname, "w") as fout:
+        json.dump({"version": kManifestVersion, "store": store.root,
+                   "params": [list(e) for e in entries]}, fout)
+
+def load_manifest(fname, store=None):
+    """ Load the manifest file.
+
+        Parameters
+        ==========
+        fname: str
+            The manifest file path.
+        store: str, optional
+            Override the store directory recorded in manifest, which
+            defaults to the environment variable `CVM_BLOB_STORE`.
+
+        Returns
+        =======
+        store: BlobStore
+            The store shared by the manifests of the same directory.
+        entries: list of tuple
+            The (name, digest) pairs.
+    """
+    with open(fname, "r") as fin:
+        manifest = json.load(fin)
+    if manifest.get("version", None) != kManifestVersion:
+        raise ValueError("unsupported blob manifest: %s" % fname)
+    root = store or os.environ.get("CVM_BLOB_STORE", manifest["store"])
+    return _get_store(root), [tuple(e) for e in manifest["params"]]
+
+def read_manifest_params(fname, store=None):
+    """ Read the parameters binary referred by the manifest file. """
+    store, entries = load_manifest(fname, store)
+    return store.assemble(entries)
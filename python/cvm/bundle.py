@@ -0,0 +1,280 @@
+""" Single-file Model Bundle
+
+    A compiled CVM model is a directory holding the `symbol` json,
+    the `params` binary, and the optional `data.npy` input sample and
+    `ext` json lines written by the MRT compilation. The bundle packs
+    them into one file, with the layout (little-endian)::
+
+        uint64 kCVMBundleMagic
+        uint32 version, uint32 N
+        N * (uint32 kind, uint32 reserved,
+             uint64 offset, uint64 size, char[32] sha256)
+        sections, each aligned to the page size
+
+    where the sections are:
+
+    - ``meta``: json of the input and output shapes and precisions,
+      postprocess method, storage size, and the `ext` infos, such as
+      `inputs_ext`, `oscales` and `input_shapes`.
+    - ``graph``: the graph json, passed to the runtime as it is.
+    - ``params``: the CVM parameters binary, see :mod:`cvm.params`.
+    - ``data``: the optional input sample in numpy `.npy` format.
+
+    The file is memory-mapped on load, the page-aligned parameters are
+    viewed without copying, and the I/O info is read from the meta
+    instead of the graph json. Each section carries its sha256 digest,
+    verified on load.
+"""
+
+import io
+import os
+import json
+import mmap
+import struct
+import hashlib
+
+import numpy as np
+
+from .params import load_params, save_params
+
+__all__ = ["BUNDLE_SECTIONS", "Bundle", "graph_meta",
+           "write_bundle", "pack_model_dir", "load_bundle", "is_bundle"]
+
+kCVMBundleMagic = 0x4C444E42_4D5643BF
+kCVMBundleVersion = 1
+kPageSize = 4096
+
+BUNDLE_SECTIONS = {"meta": 1, "graph": 2, "params": 3, "data": 4}
+""" Section name to kind map. """
+
+_HEAD = struct.Struct("<QII")
+_SECTION = struct.Struct("<IIQQ32s")
+
+def _align(size, align=kPageSize):
+    return (size + align - 1) // align * align
+
+def _sha256(buf):
+    return hashlib.sha256(buf).digest()
+
+def graph_meta(json_str):
+    """ Derive the input and output info of the graph json.
+
+        Returns
+        =======
+        meta: dict
+            With keys `inputs` and `outputs`, the lists of dict with
+            `name`, `shape` and `precision`, plus `postprocess` and
+            `storage_size`.
+    """
+    from .runtime import estimate_storage_size
+    graph = json.loads(json_str)
+    nodes, attrs = graph["nodes"], graph["attrs"]
+    ptr = graph.get("node_row_ptr", list(range(len(nodes) + 1)))
+    shapes = attrs["shape"][1]
+    precisions = attrs["precision"][1] if "precision" in attrs \
+        else [-1] * len(shapes)
+    def _entry(name, eid):
+        return {"name": name, "shape": shapes[eid],
+                "precision": precisions[eid]}
+    return {
+        "inputs": [_entry(nodes[nid]["name"], ptr[nid]) \
+                   for nid in graph["arg_nodes"] \
+                   if nodes[nid]["name"] == "data"],
+        "outputs": [_entry(nodes[nid]["name"], ptr[nid] + idx) \
+                    for nid, idx, _ in graph["heads"]],
+        "postprocess": graph.get("postprocess", None),
+        "storage_size": estimate_storage_size(json_str),
+    }
+
+def write_bundle(fname, json_str, params, ext=None, data=None):
+    """ Write the model into a bundle file.
+
+        Parameters
+        ==========
+        fname: str
+            The bundle file path.
+        json_str: bytes or str
+            The graph json.
+        params: bytes or dict
+            The parameters binary, or the tensor dict serialized by
+            :func:`cvm.params.save_params`.
+        ext: list of dict, optional
+            The ext infos, each merged into the meta.
+        data: numpy.ndarray, optional
+            The input sample.
+    """
+    if isinstance(json_str, str):
+        json_str = json_str.encode("utf-8")
+    if isinstance(params, dict):
+        params = save_params(params)
+    meta = graph_meta(json_str)
+    for info in (ext or []):
+        meta.update(info)
+    sections = [("meta", json.dumps(meta).encode("utf-8")),
+                ("graph", json_str), ("params", params)]
+    if data is not None:
+        fout = io.BytesIO()
+        np.save(fout, np.asarray(data))
+        sections.append(("data", fout.getvalue()))
+
+    offset = _align(_HEAD.size + _SECTION.size * len(sections))
+    table = []
+    for name, buf in sections:
+        table.append(_SECTION.pack(BUNDLE_SECTIONS[name], 0,
+            offset, len(buf), _sha256(buf)))
+        offset = _align(offset + len(buf))
+    tmp_fname = fname + ".tmp"
+    with open(tmp_fname, "wb") as fout:
+        fout.write(_HEAD.pack(
+            kCVMBundleMagic, kCVMBundleVersion, len(sections)))
+        for entry in table:
+            fout.write(entry)
+        for (_, buf), entry in zip(sections, table):
+            fout.write(b"\0" * (_SECTION.unpack(entry)[2] - fout.tell()))
+            fout.write(buf)
+    os.replace(tmp_fname, fname)
+
+def pack_model_dir(model_dir, fname=None):
+    """ Pack the compiled model directory into a bundle file.
+
+        Parameters
+        ==========
+        model_dir: str
+            The directory holding `symbol`, `params` or the blob
+            manifest, and the optional `data.npy` and `ext` files.
+        fname: str, optional
+            The bundle file path, defaults to `<model_dir>.bundle`.
+
+        Returns
+        =======
+        fname: str
+            The bundle file path.
+    """
+    from .runtime import read_model_dir
+    if fname is None:
+        fname = os.path.normpath(model_dir) + ".bundle"
+    json_str, param_bytes = read_model_dir(model_dir)
+    ext, data = None, None
+    ext_file = os.path.join(model_dir, "ext")
+    if os.path.exists(ext_file):
+        with open(ext_file, "r") as fin:
+            ext = [json.loads(line) for line in fin if line.strip()]
+        ext = [info if isinstance(info, dict) else {"ext": info} \
+               for info in ext]
+    data_file = os.path.join(model_dir, "data.npy")
+    if os.path.exists(data_file):
+        data = np.load(data_file)
+    write_bundle(fname, json_str, param_bytes, ext, data)
+    return fname
+
+def is_bundle(fname):
+    """ Whether the file is a model bundle, checked by the magic. """
+    if not os.path.isfile(fname):
+        return False
+    with open(fname, "rb") as fin:
+        head = fin.read(_HEAD.size)
+    return len(head) == _HEAD.size and \
+        _HEAD.unpack(head)[0] == kCVMBundleMagic
+
+class Bundle:
+    """ Read-only model bundle backed by a single buffer.
+
+        The sections are memoryviews into the buffer, which is the
+        memory map of the bundle file if loaded by :func:`load_bundle`.
+
+        Parameters
+        ==========
+        buf: buffer-like
+            The bundle bytes.
+        verify: bool
+            Verify the sha256 digests of the sections.
+    """
+    def __init__(self, buf, verify=True, _file=None):
+        self._buf = buf
+        self._file = _file
+        view = memoryview(buf)
+        if len(view) < _HEAD.size:
+            raise ValueError("Invalid bundle file format")
+        magic, version, num = _HEAD.unpack_from(view, 0)
+        if magic != kCVMBundleMagic:
+            raise ValueError("Invalid bundle file format")
+        if version != kCVMBundleVersion:
+            raise ValueError("unsupported bundle version: %d" % version)
+        kinds = {v: k for k, v in BUNDLE_SECTIONS.items()}
+        self.sections = {}
+        for i in range(num):
+            kind, _, offset, size, digest = _SECTION.unpack_from(
+                view, _HEAD.size + i * _SECTION.size)
+            if offset + size > len(view):
+                raise ValueError("Invalid bundle file format")
+            section = view[offset:offset+size]
+            if verify and _sha256(section) != digest:
+                raise ValueError("bundle section %s checksum mismatch" \
+                    % kinds.get(kind, kind))
+            if kind in kinds:
+                self.sections[kinds[kind]] = section
+        for name in ["meta", "graph", "params"]:
+            if name not in self.sections:
+                raise ValueError("bundle section %s missing" % name)
+        self.meta = json.loads(bytes(self.sections["meta"]))
+
+    @property
+    def graph_json(self):
+        """ The graph json bytes. """
+        return bytes(self.sections["graph"])
+
+    @property
+    def param_bytes(self):
+        """ The zero-copy view of parameters binary. """
+        return self.sections["params"]
+
+    def params(self):
+        """ The parameters as :class:`cvm.params.ParamArena`. """
+        return load_params(self.param_bytes)
+
+    def data(self):
+        """ The input sample, None if not bundled. """
+        if "data" not in self.sections:
+            return None
+        return np.load(io.BytesIO(self.sections["data"]))
+
+    def close(self):
+        """ Release the underlying buffer. """
+        self.sections.clear()
+        if isinstance(self._buf, mmap.mmap):
+            try:
+                self._buf.close()
+            except BufferError:
+                pass
+        if self._file is not None:
+            self._file.close()
+        self._buf, self._file = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def load_bundle(fname, use_mmap=True, verify=True):
+    """ Load the bundle file into :class:`Bundle`.
+
+        Parameters
+        ==========
+        fname: str
+            The bundle file path.
+        use_mmap: bool
+            Memory-map the file instead of reading it into memory.
+        verify: bool
+            Verify the sha256 digests of the sections.
+    """
+    if not use_mmap:
+        with open(fname, "rb") as fin:
+            return Bundle(fin.read(), verify)
+    fin = open(fname, "rb")
+    try:
+        buf = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        return Bundle(buf, verify, _file=fin)
+    except Exception:
+        fin.close()
+        raise
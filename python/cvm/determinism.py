@@ -0,0 +1,301 @@
+""" Determinism Verification of CVM Runtime
+
+    CVM runtime results are required to be bit-exact, while the CPU
+    kernels are parallelized with OpenMP. This harness runs compiled
+    models on random inputs under several `OMP_NUM_THREADS` values,
+    each in a fresh process since OpenMP reads the variable once, and
+    repeatedly inside every process, then compares the output bytes.
+
+    Once the outputs of a model diverge, every operator is dumped by
+    running the probe graph truncated at the operator, whose single
+    head is the operator output, so that the regression is reported
+    per operator, along with the first divergent one.
+
+    Command line usage:
+
+    .. code-block:: bash
+
+        python -m cvm.determinism /data/std_out/resnet18_v1_tfm \\
+            --threads 1 2 4 8 --repeats 3 --json report.json
+
+    A model is either a directory with `symbol` and `params` files,
+    or a prefix of `<prefix>.json` and `<prefix>.params`.
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+__all__ = ["model_files", "random_input", "probe_graph",
+           "check_model", "format_report"]
+
+def model_files(path):
+    """ Resolve the (json, params) file paths of a model. """
+    if os.path.isdir(path):
+        return os.path.join(path, "symbol"), os.path.join(path, "params")
+    return path + ".json", path + ".params"
+
+def _entry_ptr(graph):
+    if "node_row_ptr" in graph:
+        return graph["node_row_ptr"]
+    return list(range(len(graph["nodes"]) + 1))
+
+def _data_entry(graph):
+    ptr = _entry_ptr(graph)
+    for nid in graph["arg_nodes"]:
+        if graph["nodes"][nid]["name"] == "data":
+            return ptr[nid]
+    raise ValueError("graph has no data input")
+
+def random_input(graph, seed=0):
+    """ Random input within the data precision of the model graph.
+
+        Returns
+        =======
+        data: numpy.ndarray
+            Int8 array for precision not greater than 8, otherwise
+            int32, which is the input layout of the runtime.
+    """
+    eid = _data_entry(graph)
+    shape = graph["attrs"]["shape"][1][eid]
+    precision = graph["attrs"]["precision"][1][eid] \
+        if "precision" in graph["attrs"] else 8
+    precision = 8 if precision < 0 else precision
+    bound = (1 << (precision - 1)) - 1
+    dtype = "int8" if precision <= 8 else "int32"
+    rng = np.random.RandomState(seed)
+    return rng.randint(-bound, bound + 1, size=shape).astype(dtype)
+
+def probe_graph(graph, nid):
+    """ Truncate the graph at node `nid`, whose first output is the head.
+
+        The postprocess method is dropped to dump the raw output.
+
+        Returns
+        =======
+        probe: dict
+            The probe graph json object.
+        param_names: list of str
+            The parameters used by the probe graph.
+    """
+    ptr = _entry_ptr(graph)
+    num_nodes, num_entries = nid + 1, ptr[nid + 1]
+    attrs = {}
+    for key, (type_name, values) in graph["attrs"].items():
+        if key == "op_attrs":
+            values = values[:num_nodes]
+        elif isinstance(values, list) and len(values) == ptr[-1]:
+            values = values[:num_entries]
+        attrs[key] = [type_name, values]
+    probe = dict(graph, nodes=graph["nodes"][:num_nodes],
+                 arg_nodes=[i for i in graph["arg_nodes"] if i <= nid],
+                 node_row_ptr=ptr[:num_nodes + 1],
+                 heads=[[nid, 0, 0]], attrs=attrs)
+    probe.pop("postprocess", None)
+    param_names = [graph["nodes"][i]["name"] for i in probe["arg_nodes"]]
+    return probe, [n for n in param_names if n != "data"]
+
+def _op_nodes(graph):
+    return [nid for nid, node in enumerate(graph["nodes"]) \
+            if node["op"] != "null"]
+
+def _run_worker(spec):
+    """ Inference in the current process, see :func:`_spawn_worker`. """
+    from . import runtime
+    from .common import cpu
+    from .params import load_params, save_params
+
+    with open(spec["json"], "r") as fin:
+        graph = json.load(fin)
+    with open(spec["params"], "rb") as fin:
+        param_bytes = fin.read()
+    data = np.load(spec["input"])
+
+    def _infer(json_str, prm_bytes):
+        net = runtime.CVMAPILoadModel(json_str, prm_bytes, cpu(0))
+        try:
+            return [np.array(runtime.CVMAPIInferenceInto(net, data)) \
+                    for _ in range(spec["repeats"])]
+        finally:
+            runtime.CVMAPIFreeModel(net)
+
+    results = {}
+    for i, out in enumerate(_infer(json.dumps(graph), param_bytes)):
+        results["out_%d" % i] = out
+    if spec["probes"]:
+        arena = load_params(param_bytes)
+        for nid in spec["probes"]:
+            probe, names = probe_graph(graph, nid)
+            prm = save_params({n: arena[n] for n in names})
+            for i, out in enumerate(_infer(json.dumps(probe), prm)):
+                results["node_%d_%d" % (nid, i)] = out
+    np.savez(spec["output"], **results)
+
+def _spawn_worker(spec, threads, timeout=None):
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+    spec_file = spec["output"] + ".spec.json"
+    with open(spec_file, "w") as fout:
+        json.dump(spec, fout)
+    proc = subprocess.run(
+        [sys.executable, "-m", "cvm.determinism", "--worker", spec_file],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        timeout=timeout)
+    if proc.returncode != 0:
+        raise RuntimeError("worker with OMP_NUM_THREADS=%s failed:\n%s" \
+            % (threads, proc.stdout.decode(errors="replace")[-2000:]))
+    return np.load(spec["output"])
+
+def _digest(arr):
+    return hashlib.sha256(np.ascontiguousarray(arr).tobytes()).hexdigest()
+
+def _diff(ref, out):
+    ref, out = ref.astype("int64"), out.astype("int64")
+    if ref.shape != out.shape:
+        return {"num_diff": -1, "max_abs": -1}
+    diff = np.abs(ref - out)
+    return {"num_diff": int((diff != 0).sum()), "max_abs": int(diff.max())}
+
+def check_model(path, threads=(1, 2, 4, 8), repeats=3, seed=0,
+                per_op=True, timeout=None):
+    """ Check whether the model outputs are bit-exact across thread
+            counts and repeated runs.
+
+        The outputs of the first thread count in the first run are
+        the reference.
+
+        Parameters
+        ==========
+        path: str
+            The model directory or prefix, see :func:`model_files`.
+        threads: list of int
+            The `OMP_NUM_THREADS` values.
+        repeats: int
+            The number of inferences in each process.
+        per_op: bool
+            Dump and compare every operator if the outputs diverge.
+
+        Returns
+        =======
+        report: dict
+            With keys `model`, `deterministic`, `digests` (thread count
+            to output digests of runs), `mismatches` of the outputs,
+            `ops` holding the divergent operators in topological order
+            with `nid`, `name`, `op_name`, `threads`, `repeat`,
+            `num_diff` and `max_abs`, and `error` if failed.
+    """
+    json_path, params_path = model_files(path)
+    report = {"model": path, "threads": list(threads), "repeats": repeats,
+              "deterministic": None, "digests": {}, "mismatches": [],
+              "ops": [], "error": None}
+    workdir = tempfile.mkdtemp(prefix="cvm_determinism_")
+    try:
+        with open(json_path, "r") as fin:
+            graph = json.load(fin)
+        input_file = os.path.join(workdir, "input.npy")
+        np.save(input_file, random_input(graph, seed))
+
+        def _run(probes):
+            ret = {}
+            for t in threads:
+                spec = {"json": json_path, "params": params_path,
+                        "input": input_file, "repeats": repeats,
+                        "probes": probes,
+                        "output": os.path.join(workdir, "out_%d.npz" % t)}
+                ret[t] = _spawn_worker(spec, t, timeout)
+            return ret
+
+        results = _run([])
+        ref = results[threads[0]]["out_0"]
+        ref_digest = _digest(ref)
+        for t in threads:
+            outs = [results[t]["out_%d" % i] for i in range(repeats)]
+            report["digests"][str(t)] = [_digest(o) for o in outs]
+            for i, out in enumerate(outs):
+                if _digest(out) != ref_digest:
+                    report["mismatches"].append(
+                        dict(_diff(ref, out), threads=t, repeat=i))
+        report["deterministic"] = not report["mismatches"]
+
+        if per_op and report["mismatches"]:
+            probes = _op_nodes(graph)
+            results = _run(probes)
+            for nid in probes:
+                node = graph["nodes"][nid]
+                key = "node_%d_%d"
+                nref = results[threads[0]][key % (nid, 0)]
+                for t in threads:
+                    for i in range(repeats):
+                        out = results[t][key % (nid, i)]
+                        if not np.array_equal(out, nref):
+                            report["ops"].append(dict(_diff(nref, out),
+                                nid=nid, name=node["name"],
+                                op_name=node["op"], threads=t, repeat=i))
+    except Exception as err: # pylint: disable=broad-except
+        report["error"] = "%s: %s" % (type(err).__name__, err)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def format_report(reports):
+    """ Summarize the reports into text lines. """
+    lines = []
+    for rep in reports:
+        if rep["error"] is not None:
+            lines.append("ERROR  %s: %s" % (rep["model"], rep["error"]))
+            continue
+        status = "PASS" if rep["deterministic"] else "FAIL"
+        lines.append("%s   %s threads=%s repeats=%s" % (
+            status, rep["model"], rep["threads"], rep["repeats"]))
+        for m in rep["mismatches"]:
+            lines.append("    output threads=%s repeat=%s num_diff=%s "
+                         "max_abs=%s" % (m["threads"], m["repeat"],
+                                         m["num_diff"], m["max_abs"]))
+        if rep["ops"]:
+            first = rep["ops"][0]
+            lines.append("    first divergent op: %s (%s, nid=%s)" % (
+                first["name"], first["op_name"], first["nid"]))
+        for op in rep["ops"]:
+            lines.append("    op %-32s %-16s threads=%s repeat=%s "
+                         "num_diff=%s max_abs=%s" % (op["name"][:32],
+                         op["op_name"], op["threads"], op["repeat"],
+                         op["num_diff"], op["max_abs"]))
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser("cvm.determinism",
+        description="verify bit-exact outputs across OMP_NUM_THREADS")
+    parser.add_argument("models", type=str, nargs="*")
+    parser.add_argument("--threads", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-per-op", action="store_true")
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--json", type=str, default=None)
+    parser.add_argument("--worker", type=str, default=None,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        with open(args.worker, "r") as fin:
+            _run_worker(json.load(fin))
+        return 0
+
+    reports = [check_model(m, args.threads, args.repeats, args.seed,
+                           per_op=not args.no_per_op, timeout=args.timeout) \
+               for m in args.models]
+    print(format_report(reports))
+    if args.json is not None:
+        with open(args.json, "w") as fout:
+            json.dump(reports, fout, indent=2)
+    return 0 if all(r["deterministic"] for r in reports) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -380,6 +380,16 @@ def save_param_dict(dict_data):
     return ret.tobytes()
 
 def load_param_dict(bytes_arr):
+    """ Load the bytes binary of parameters into NDArray dict.
+
+        Each tensor is copied into a standalone NDArray, refer to
+        :func:`cvm.params.load_params` for the zero-copy loader.
+
+        Returns
+        =======
+        params: dict
+            The name to :class:`cvm.ndarray.NDArray` dict.
+    """
     ret = {}
     num = ctypes.c_int()
     names = ctypes.POINTER(ctypes.c_void_p)()
@@ -396,7 +406,6 @@ def load_param_dict(bytes_arr):
                 ctypes.c_char_p).value, encoding="utf-8")
         value = NDArray(ctypes.cast(values[i],
                 CVMArrayHandle), False)
-        print (name, value)
         ret[name] = value
     return ret
 
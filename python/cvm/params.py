@@ -0,0 +1,320 @@
+""" Bulk Parameters (De)Serialization
+
+    The CVM parameters binary (generated by
+    :func:`cvm.ndarray.save_param_dict` or the C++
+    ``save_param_dict``) has the layout::
+
+        uint64 kCVMNDArrayListMagic, uint64 reserved
+        uint64 N, N * (uint64 len, char[len] name)
+        uint64 N, N * tensor
+
+    and every tensor is serialized as::
+
+        uint64 kCVMNDArrayMagic, uint64 reserved
+        int32 device_type, int32 device_id
+        int32 ndim, (uint8 code, uint8 bits, uint16 lanes)
+        int64[ndim] shape, int64 data_byte_size
+        char[data_byte_size] data
+
+    This module parses the format in pure python, the tensor data
+    is never copied: the whole file is kept as one contiguous arena
+    (memory-mapped if loaded from disk) and an index of names,
+    dtypes, shapes and offsets is built, tensors are exposed as
+    lazily constructed numpy views into the arena.
+"""
+
+import io
+import mmap
+import struct
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+__all__ = ["ParamEntry", "ParamArena",
+           "load_params", "save_params", "write_params"]
+
+kCVMNDArrayListMagic = 0xF7E58D4F05049CB7
+kCVMNDArrayMagic = 0xDD5E40F096B4A13F
+
+_U64 = struct.Struct("<Q")
+# magic, reserved, device_type, device_id, ndim, code, bits, lanes
+_TENSOR_HEAD = struct.Struct("<QQiiiBBH")
+
+_CODE2STR = {0: "int", 1: "uint", 2: "float"}
+_KIND2CODE = {"i": 0, "u": 1, "f": 2}
+
+ParamEntry = namedtuple("ParamEntry",
+                        ["name", "dtype", "shape", "offset", "nbytes"])
+ParamEntry.__doc__ = """ Index entry of one tensor inside the arena.
+
+    `offset` is the byte offset of the tensor data relative to
+    the beginning of the parameters binary.
+"""
+
+
+def _dtype_from_dl(code, bits, lanes):
+    if code not in _CODE2STR or bits % 8 != 0:
+        raise ValueError("unsupported DLDataType (code=%s, bits=%s)" \
+            % (code, bits))
+    if lanes != 1:
+        raise ValueError("vectorized dtype with lanes=%d is not " \
+            "supported" % lanes)
+    return np.dtype("%s%d" % (_CODE2STR[code], bits)).newbyteorder("<")
+
+def _dtype_to_dl(dtype):
+    dtype = np.dtype(dtype)
+    code = _KIND2CODE.get(dtype.kind, None)
+    if code is None:
+        raise TypeError("unsupported parameter dtype: %s" % dtype)
+    return code, dtype.itemsize * 8, 1
+
+
+class _Reader:
+    def __init__(self, buf):
+        self.buf, self.pos = buf, 0
+
+    def unpack(self, st):
+        if self.pos + st.size > len(self.buf):
+            raise ValueError("Invalid parameters file format")
+        ret = st.unpack_from(self.buf, self.pos)
+        self.pos += st.size
+        return ret
+
+    def u64(self):
+        return self.unpack(_U64)[0]
+
+    def skip(self, nbytes):
+        if self.pos + nbytes > len(self.buf):
+            raise ValueError("Invalid parameters file format")
+        self.pos += nbytes
+
+
+def _build_index(buf):
+    reader = _Reader(buf)
+    if reader.u64() != kCVMNDArrayListMagic:
+        raise ValueError("Invalid parameters file format")
+    reader.u64() # reserved
+
+    names = []
+    for _ in range(reader.u64()):
+        size = reader.u64()
+        start = reader.pos
+        reader.skip(size)
+        names.append(bytes(buf[start:start+size]).decode("utf-8"))
+    if reader.u64() != len(names):
+        raise ValueError("Invalid parameters file format")
+
+    index = OrderedDict()
+    for name in names:
+        magic, _, _, _, ndim, code, bits, lanes = \
+            reader.unpack(_TENSOR_HEAD)
+        if magic != kCVMNDArrayMagic:
+            raise ValueError("Invalid DLTensor file format")
+        shape = reader.unpack(struct.Struct("<%dq" % ndim))
+        nbytes = reader.unpack(struct.Struct("<q"))[0]
+        dtype = _dtype_from_dl(code, bits, lanes)
+        if nbytes != int(np.prod(shape, dtype="int64")) * dtype.itemsize:
+            raise ValueError("Invalid DLTensor file format")
+        index[name] = ParamEntry(name, dtype, shape, reader.pos, nbytes)
+        reader.skip(nbytes)
+    return index
+
+
+class ParamArena:
+    """ Read-only parameters dict backed by a single contiguous buffer.
+
+        Tensors are numpy views into the arena, created on first
+        access and cached, so that inspecting the index (names,
+        dtypes, shapes) of a huge params file costs nothing more
+        than parsing the headers.
+
+        Parameters
+        ==========
+        buf: buffer-like
+            The parameters binary, bytes/bytearray/memoryview or
+            `mmap.mmap` object.
+    """
+    def __init__(self, buf, _file=None):
+        self._buf = buf
+        self._file = _file
+        with memoryview(buf) as view:
+            self.index = _build_index(view)
+        self._views = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        view = self._views.get(name, None)
+        if view is None:
+            entry = self.index[name]
+            view = np.frombuffer(
+                self._buf, dtype=entry.dtype,
+                count=entry.nbytes // entry.dtype.itemsize,
+                offset=entry.offset).reshape(entry.shape)
+            self._views[name] = view
+        return view
+
+    def keys(self):
+        return self.index.keys()
+
+    def values(self):
+        return [self[k] for k in self.index]
+
+    def items(self):
+        return [(k, self[k]) for k in self.index]
+
+    @property
+    def nbytes(self):
+        """ Total bytes of tensor data stored in the arena. """
+        return sum(e.nbytes for e in self.index.values())
+
+    def as_ndarray(self, name, ctx=None):
+        """ Copy the named tensor into a :class:`cvm.ndarray.NDArray`.
+        """
+        from . import ndarray as _nd
+        from .common import cpu
+        return _nd.array(self[name], ctx=cpu() if ctx is None else ctx)
+
+    def to_param_dict(self, ctx=None):
+        """ Materialize the whole arena as NDArray dict, equivalent
+                to :func:`cvm.ndarray.load_param_dict`.
+        """
+        return {k: self.as_ndarray(k, ctx) for k in self.index}
+
+    def close(self):
+        """ Release the underlying buffer.
+
+            The memory map is kept alive until all the tensor views
+            returned by the arena are garbage collected.
+        """
+        self._views.clear()
+        if isinstance(self._buf, mmap.mmap):
+            try:
+                self._buf.close()
+            except BufferError:
+                pass
+        if self._file is not None:
+            self._file.close()
+        self._buf, self._file = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_params(source, use_mmap=True):
+    """ Load parameters binary into :class:`ParamArena`.
+
+        Parameters
+        ==========
+        source: str or buffer-like
+            File path of the params, or the params bytes read
+            from disk.
+        use_mmap: bool
+            Memory-map the file instead of reading it into memory,
+            only valid for path source.
+
+        Returns
+        =======
+        arena: :class:`ParamArena`
+    """
+    if not isinstance(source, str):
+        return ParamArena(source)
+    if not use_mmap:
+        with open(source, "rb") as fin:
+            return ParamArena(fin.read())
+    fin = open(source, "rb")
+    try:
+        buf = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception:
+        fin.close()
+        raise
+    return ParamArena(buf, _file=fin)
+
+
+def _tensor_chunks(value):
+    if hasattr(value, "asnumpy"):
+        value = value.asnumpy()
+    value = np.asarray(value)
+    dtype = value.dtype.newbyteorder("<")
+    value = np.require(value, dtype=dtype, requirements="C")
+    code, bits, lanes = _dtype_to_dl(dtype)
+    yield _TENSOR_HEAD.pack(kCVMNDArrayMagic, 0, 1, 0,
+                            value.ndim, code, bits, lanes)
+    yield struct.pack("<%dq" % value.ndim, *value.shape)
+    yield struct.pack("<q", value.nbytes)
+    yield memoryview(value).cast("B")
+
+def _header_chunks(names):
+    chunks = [_U64.pack(kCVMNDArrayListMagic), _U64.pack(0),
+              _U64.pack(len(names))]
+    for name in names:
+        bname = name.encode("utf-8")
+        chunks.extend([_U64.pack(len(bname)), bname])
+    chunks.append(_U64.pack(len(names)))
+    return chunks
+
+def write_params(fout, names, values):
+    """ Stream tensors into a writable binary file object.
+
+        Only one tensor needs to be resident at a time, so the
+        `values` could be a generator producing the tensors lazily.
+
+        Parameters
+        ==========
+        fout: file object
+            The binary stream to write into.
+        names: list of str
+            The parameter names, written in the header.
+        values: iterable
+            The tensors, produced in the order of `names`.
+    """
+    for chunk in _header_chunks(names):
+        fout.write(chunk)
+    count = 0
+    for value in values:
+        for chunk in _tensor_chunks(value):
+            fout.write(chunk)
+        count += 1
+    if count != len(names):
+        raise ValueError("expected %d tensors but got %d" \
+            % (len(names), count))
+
+def save_params(params, fname=None):
+    """ Serialize a dict of tensors into CVM parameters binary.
+
+        The values could be numpy arrays or any objects with
+        `asnumpy` method, such as :class:`cvm.ndarray.NDArray`
+        and `mxnet.ndarray.NDArray`. The output is bit-exact with
+        :func:`cvm.ndarray.save_param_dict`.
+
+        Parameters
+        ==========
+        params: dict
+            Name to tensor dict.
+        fname: str, optional
+            Stream the binary into the file if specified.
+
+        Returns
+        =======
+        seq: bytes or None
+            The bytes binary if `fname` is not specified.
+    """
+    names = list(params.keys())
+    values = (params[name] for name in names)
+    if fname is None:
+        fout = io.BytesIO()
+        write_params(fout, names, values)
+        return fout.getvalue()
+
+    with open(fname, "wb") as fout:
+        write_params(fout, names, values)
@@ -0,0 +1,366 @@
+""" Staged Pipeline Engine
+
+    The frames flow from the source through the stages into the sink,
+    with bounded queues in between, so that decoding, preprocessing,
+    inference and postprocessing of different frames overlap:
+
+    .. code-block:: none
+
+        source -> [queue] -> stage 1 -> [queue] -> ... -> stage n -> sink
+
+    - Each stage runs its function on worker threads. The numpy and
+      CVM runtime calls release the GIL, and the function of a stage
+      could run in processes instead with `use_process`.
+    - A stage with `batch_size > 1` collects up to `batch_size` frames,
+      waiting at most `batch_timeout` seconds, and processes them in
+      one call, such as the batched inference.
+    - With `drop_frames`, the source drops the oldest queued frame
+      instead of blocking once the first queue is full, so that a live
+      stream keeps the latency bounded under backpressure.
+    - The sink receives the results in the source order, on the
+      thread calling :meth:`Pipeline.run`.
+
+    The frame rate, busy time and queue occupancy of every stage are
+    reported by :meth:`Pipeline.stats`.
+"""
+
+import time
+import queue
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = ["Stage", "Pipeline"]
+
+_STOP = object()
+
+class Stage:
+    """ The pipeline stage.
+
+        Parameters
+        ==========
+        func: callable
+            The function on the payload of one frame, or on the list
+            of payloads returning the list of results if batched.
+        name: str, optional
+            The stage name in stats, defaults to the function name.
+        num_workers: int
+            The number of worker threads.
+        batch_size: int
+            The maximum number of frames per call, 1 for no batching.
+        batch_timeout: float
+            The seconds to wait for a full batch.
+        queue_size: int
+            The capacity of the input queue.
+        use_process: bool
+            Run `func` in a process pool of `num_workers`, which must
+            be picklable.
+    """
+    def __init__(self, func, name=None, num_workers=1, batch_size=1,
+                 batch_timeout=0.01, queue_size=8, use_process=False):
+        self.func = func
+        self.name = name or getattr(func, "__name__", "stage")
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue_size = queue_size
+        self.use_process = use_process
+
+class _StageState:
+    def __init__(self, stage):
+        self.stage = stage
+        self.inputs = queue.Queue(maxsize=stage.queue_size)
+        self.lock = threading.Lock()
+        self.running = stage.num_workers
+        self.items = 0
+        self.calls = 0
+        self.busy = 0.
+        self.max_queued = 0
+        self.pool = None
+
+class Pipeline:
+    """ Pipeline of stages between the source and the sink.
+
+        Parameters
+        ==========
+        source: iterable
+            The frames, such as :class:`cvm.video.VideoReader`.
+        stages: list of Stage
+            The stages in order.
+        sink: callable, optional
+            Called with (frame index, result) in the source order, the
+            results are collected into a list if not specified.
+        drop_frames: bool
+            Drop the oldest queued frame when the first queue is full,
+            instead of blocking the source.
+
+        Examples
+        ========
+        .. code-block:: python
+
+            pipe = Pipeline(VideoReader("test.mp4"), [
+                Stage(prep.process, num_workers=4),
+                Stage(infer_batch, batch_size=8),
+                Stage(draw, num_workers=2),
+            ], sink=writer.write_frame)
+            pipe.run()
+            print(pipe.format_stats())
+    """
+    def __init__(self, source, stages, sink=None, drop_frames=False):
+        if not stages:
+            raise ValueError("pipeline requires at least one stage")
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink
+        self.drop_frames = drop_frames
+        self._states = [_StageState(s) for s in self.stages]
+        self._outputs = queue.Queue()
+        self._threads = []
+        self._error = None
+        self._stop = threading.Event()
+        self._dropped = set()
+        self._dropped_lock = threading.Lock()
+        self._read = 0
+        self._written = 0
+        self._start = None
+        self._elapsed = None
+
+    def _next_queue(self, index):
+        if index + 1 < len(self._states):
+            return self._states[index + 1].inputs
+        return self._outputs
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, err):
+        if self._error is None:
+            self._error = err
+        self._stop.set()
+
+    def _run_source(self):
+        inputs = self._states[0].inputs
+        try:
+            for seq, frame in enumerate(self.source):
+                if self._stop.is_set():
+                    break
+                self._read += 1
+                if not self.drop_frames:
+                    if not self._put(inputs, (seq, frame)):
+                        break
+                    continue
+                while True:
+                    try:
+                        inputs.put_nowait((seq, frame))
+                        break
+                    except queue.Full:
+                        try:
+                            old_seq, _ = inputs.get_nowait()
+                        except queue.Empty:
+                            continue
+                        with self._dropped_lock:
+                            self._dropped.add(old_seq)
+        except Exception as err: # pylint: disable=broad-except
+            self._fail(err)
+        self._put(inputs, _STOP)
+
+    def _collect(self, state):
+        """ Get the next batch of items, None once stopped. """
+        item = None
+        while item is None:
+            if self._stop.is_set():
+                return None
+            try:
+                item = state.inputs.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if item is _STOP:
+            return None
+        batch = [item]
+        stage = state.stage
+        deadline = time.time() + stage.batch_timeout
+        while len(batch) < stage.batch_size:
+            timeout = deadline - time.time()
+            try:
+                item = state.inputs.get(timeout=max(timeout, 0)) \
+                    if timeout > 0 else state.inputs.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # leave the stop mark to the sibling workers
+                state.inputs.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run_stage(self, index):
+        state = self._states[index]
+        stage, outputs = state.stage, self._next_queue(index)
+        try:
+            while True:
+                state.max_queued = max(state.max_queued, state.inputs.qsize())
+                batch = self._collect(state)
+                if batch is None:
+                    break
+                seqs = [seq for seq, _ in batch]
+                payloads = [payload for _, payload in batch]
+                arg = payloads if stage.batch_size > 1 else payloads[0]
+                start = time.time()
+                if state.pool is not None:
+                    ret = state.pool.submit(stage.func, arg).result()
+                else:
+                    ret = stage.func(arg)
+                cost = time.time() - start
+                rets = ret if stage.batch_size > 1 else [ret]
+                if len(rets) != len(seqs):
+                    raise ValueError("stage %s returns %d results for " \
+                        "%d frames" % (stage.name, len(rets), len(seqs)))
+                with state.lock:
+                    state.items += len(seqs)
+                    state.calls += 1
+                    state.busy += cost
+                for seq, ret in zip(seqs, rets):
+                    if not self._put(outputs, (seq, ret)):
+                        return
+        except Exception as err: # pylint: disable=broad-except
+            self._fail(err)
+        finally:
+            with state.lock:
+                state.running -= 1
+                last = state.running == 0
+            # pass the stop mark to the sibling workers or the next stage
+            self._put(outputs if last else state.inputs, _STOP)
+
+    def _is_dropped(self, seq):
+        with self._dropped_lock:
+            return seq in self._dropped
+
+    def _run_sink(self, results):
+        pending, expected = {}, 0
+        while True:
+            try:
+                item = self._outputs.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _STOP:
+                break
+            pending[item[0]] = item[1]
+            while True:
+                if expected in pending:
+                    ret = pending.pop(expected)
+                    if self.sink is None:
+                        results.append(ret)
+                    else:
+                        self.sink(expected, ret)
+                    self._written += 1
+                elif not self._is_dropped(expected):
+                    break
+                expected += 1
+        # all stages finished, the remaining are after dropped frames
+        for seq in sorted(pending):
+            ret = pending[seq]
+            if self.sink is None:
+                results.append(ret)
+            else:
+                self.sink(seq, ret)
+            self._written += 1
+
+    def run(self):
+        """ Run the pipeline until the source is exhausted.
+
+            Returns
+            =======
+            results: list or None
+                The results in the source order if no sink is given.
+        """
+        self._start = time.time()
+        for state in self._states:
+            if state.stage.use_process:
+                state.pool = ProcessPoolExecutor(
+                    max_workers=state.stage.num_workers,
+                    mp_context=mp.get_context("spawn"))
+        self._threads = [threading.Thread(
+            target=self._run_source, name="pipeline_source", daemon=True)]
+        for index, state in enumerate(self._states):
+            self._threads.extend(threading.Thread(
+                target=self._run_stage, args=(index,), daemon=True,
+                name="pipeline_%s_%d" % (state.stage.name, i)) \
+                for i in range(state.stage.num_workers))
+        for thread in self._threads:
+            thread.start()
+
+        results = []
+        try:
+            self._run_sink(results)
+        except BaseException as err:
+            self._fail(err)
+            raise
+        finally:
+            self._stop.set()
+            for thread in self._threads:
+                thread.join()
+            for state in self._states:
+                if state.pool is not None:
+                    state.pool.shutdown()
+                    state.pool = None
+            self._elapsed = time.time() - self._start
+        if self._error is not None:
+            raise self._error
+        return results if self.sink is None else None
+
+    def stop(self):
+        """ Stop the running pipeline from another thread. """
+        self._stop.set()
+
+    def stats(self):
+        """ The pipeline statistics.
+
+            Returns
+            =======
+            ret: dict
+                With keys `frames` read from the source, `dropped`,
+                `written` into the sink, `elapsed` seconds, `fps` of
+                the written frames, and `stages`, the list of dict with
+                stage `name`, `frames`, `calls`, `fps` over the elapsed
+                time, `busy_fps` over the busy time of the workers, and
+                `max_queued` frames in the input queue.
+        """
+        elapsed = self._elapsed if self._elapsed is not None else \
+            time.time() - self._start if self._start is not None else 0.
+        stages = []
+        for state in self._states:
+            with state.lock:
+                stages.append({
+                    "name": state.stage.name, "frames": state.items,
+                    "calls": state.calls,
+                    "fps": state.items / elapsed if elapsed else 0.,
+                    "busy_fps": state.items * state.stage.num_workers \
+                        / state.busy if state.busy else 0.,
+                    "max_queued": state.max_queued,
+                })
+        return {"frames": self._read, "dropped": len(self._dropped),
+                "written": self._written, "elapsed": elapsed,
+                "fps": self._written / elapsed if elapsed else 0.,
+                "stages": stages}
+
+    def format_stats(self):
+        """ Format the statistics into text table. """
+        stats = self.stats()
+        lines = ["frames=%d dropped=%d written=%d elapsed=%.2fs fps=%.2f" \
+                 % (stats["frames"], stats["dropped"], stats["written"],
+                    stats["elapsed"], stats["fps"])]
+        lines.append("{:<16} {:>8} {:>8} {:>10} {:>10} {:>10}".format(
+            "stage", "frames", "calls", "fps", "busy_fps", "max_queued"))
+        for s in stats["stages"]:
+            lines.append("{:<16} {:>8} {:>8} {:>10.2f} {:>10.2f} {:>10}" \
+                .format(s["name"][:16], s["frames"], s["calls"], s["fps"],
+                        s["busy_fps"], s["max_queued"]))
+        return "\n".join(lines)
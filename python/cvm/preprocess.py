@@ -0,0 +1,388 @@
+""" Vectorized Input Preprocessing
+
+    The runtime input of a compiled model is the float data multiplied
+    by the input scale, rounded half away from zero and clipped into
+    the target precision, as :func:`mrt.sim_quant_helper.load_real_data`
+    does, given the `inputs_ext` info in the compiled `ext` file.
+
+    This module runs the whole host side preprocessing over batches
+    with numpy, writing into a preallocated int8 buffer of NCHW layout:
+
+    - :class:`Resize`: center crop and bilinear or nearest resize of
+      uint8 images with cached index tables and per-thread workspaces.
+    - :func:`quantize`: quantize float data, fusing scale, round and
+      clip in place.
+    - :class:`Preprocessor`: for uint8 images, normalization with mean
+      and std, the channel order swap, quantization and NHWC to NCHW
+      packing are fused into one lookup table per channel, since the
+      output of every (channel, pixel value) is a constant. The images
+      are decoded and processed concurrently in a thread pool, where
+      numpy releases the GIL.
+
+    OpenCV is only required by image decoding.
+"""
+
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ["load_inputs_ext", "quant_range", "quantize", "Resize",
+           "decode_image", "Preprocessor"]
+
+def load_inputs_ext(fname, name="data"):
+    """ Load the input quantization info from the compiled `ext` file.
+
+        Both the dict line with `inputs_ext` key written by the V2/V3
+        compilation, and the legacy `inputs_ext` line are supported.
+
+        Returns
+        =======
+        ext: dict
+            With keys `scale` and `target_bit`, and `input_shape` if
+            recorded.
+    """
+    with open(fname, "r") as fin:
+        infos = [json.loads(line) for line in fin if line.strip()]
+    for info in infos:
+        if not isinstance(info, dict):
+            continue
+        if "inputs_ext" in info and name in info["inputs_ext"]:
+            ext = dict(info["inputs_ext"][name])
+            if "input_shapes" in info:
+                shape = info["input_shapes"]
+                ext["input_shape"] = shape.get(name, None) \
+                    if isinstance(shape, dict) else shape
+            return ext
+        if name in info and isinstance(info[name], dict) and \
+                "scale" in info[name]:
+            return dict(info[name])
+    raise ValueError("inputs_ext of %s not found in %s" % (name, fname))
+
+def quant_range(target_bit):
+    """ The symmetric clip range of the target precision. """
+    return 2 ** (target_bit - 1) - 1
+
+def _quant_dtype(target_bit):
+    return np.dtype("int8") if target_bit <= 8 else np.dtype("int32")
+
+def quantize(data, scale, target_bit=8, out=None):
+    """ Quantize the float data into runtime input.
+
+        Equals to `load_real_data` of MRT, computed in place on two
+        float64 workspaces of the data shape.
+
+        Parameters
+        ==========
+        data: numpy.ndarray
+            The float data.
+        scale: float
+            The input scale of `inputs_ext`.
+        target_bit: int
+            The input precision of `inputs_ext`.
+        out: numpy.ndarray, optional
+            The output buffer of the data shape, int8 for 8-bit
+            precision, otherwise int32.
+    """
+    if out is None:
+        out = np.empty(data.shape, dtype=_quant_dtype(target_bit))
+    work = np.multiply(data, scale, dtype="float64")
+    # round half away from zero: trunc(x + copysign(0.5, x))
+    half = np.copysign(0.5, work)
+    np.add(work, half, out=work)
+    np.trunc(work, out=work)
+    clip = quant_range(target_bit)
+    np.clip(work, -clip, clip, out=work)
+    np.copyto(out, work, casting="unsafe")
+    return out
+
+def _center_crop(img):
+    h, w = img.shape[:2]
+    if h > w:
+        start = (h - w) // 2
+        return img[start:start+w]
+    start = (w - h) // 2
+    return img[:, start:start+h]
+
+class Resize:
+    """ Resize of uint8 HWC images.
+
+        The source indices and weights for each input shape are
+        computed once and cached. The bilinear interpolation uses the
+        pixel center alignment of `cv2.INTER_LINEAR`, in float32 with
+        per-thread workspaces.
+
+        Parameters
+        ==========
+        size: tuple of int
+            The output (height, width).
+        method: str
+            "bilinear" or "nearest".
+        center_crop: bool
+            Crop the center square of the image before resize.
+    """
+    def __init__(self, size, method="bilinear", center_crop=False):
+        if method not in ["bilinear", "nearest"]:
+            raise ValueError("unsupported resize method: %s" % method)
+        self.size = tuple(size)
+        self.method = method
+        self.center_crop = center_crop
+        self._tables = {}
+        self._local = threading.local()
+
+    @staticmethod
+    def _axis_table(in_size, out_size, method):
+        ratio = in_size / out_size
+        if method == "nearest":
+            idx = np.floor(np.arange(out_size) * ratio).astype("intp")
+            return np.minimum(idx, in_size - 1)
+        pos = (np.arange(out_size) + 0.5) * ratio - 0.5
+        pos = np.clip(pos, 0, in_size - 1)
+        idx0 = np.floor(pos).astype("intp")
+        idx1 = np.minimum(idx0 + 1, in_size - 1)
+        return idx0, idx1, (pos - idx0).astype("float32")
+
+    def _table(self, shape):
+        table = self._tables.get(shape, None)
+        if table is None:
+            table = tuple(self._axis_table(i, o, self.method) \
+                          for i, o in zip(shape[:2], self.size))
+            self._tables[shape] = table
+        return table
+
+    def _workspace(self, key, shape, dtype):
+        spaces = getattr(self._local, "spaces", None)
+        if spaces is None:
+            spaces = self._local.spaces = {}
+        buf = spaces.get(key, None)
+        if buf is None or buf.shape != shape:
+            buf = spaces[key] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def __call__(self, img, out=None):
+        """ Resize the image into `out` of (height, width, channel). """
+        if self.center_crop:
+            img = _center_crop(img)
+        oh, ow = self.size
+        c = img.shape[2]
+        if out is None:
+            out = np.empty((oh, ow, c), dtype="uint8")
+        if img.shape[:2] == self.size:
+            np.copyto(out, img)
+            return out
+        ytab, xtab = self._table(img.shape[:2])
+        if self.method == "nearest":
+            rows = self._workspace("rows", (oh, img.shape[1], c), "uint8")
+            np.take(img, ytab, axis=0, out=rows)
+            np.take(rows, xtab, axis=1, out=out)
+            return out
+
+        (y0, y1, wy), (x0, x1, wx) = ytab, xtab
+        shape = (oh, img.shape[1], c)
+        rows = self._workspace("rows", shape, "uint8")
+        top = self._workspace("top", shape, "float32")
+        bot = self._workspace("bot", shape, "float32")
+        np.take(img, y0, axis=0, out=rows)
+        np.copyto(top, rows)
+        np.take(img, y1, axis=0, out=rows)
+        np.copyto(bot, rows)
+        # rows = top + (bot - top) * wy
+        np.subtract(bot, top, out=bot)
+        np.multiply(bot, wy[:, None, None], out=bot)
+        np.add(top, bot, out=top)
+        shape = (oh, ow, c)
+        left = self._workspace("left", shape, "float32")
+        right = self._workspace("right", shape, "float32")
+        np.take(top, x0, axis=1, out=left)
+        np.take(top, x1, axis=1, out=right)
+        np.subtract(right, left, out=right)
+        np.multiply(right, wx[None, :, None], out=right)
+        np.add(left, right, out=left)
+        np.add(left, 0.5, out=left)
+        np.copyto(out, left, casting="unsafe")
+        return out
+
+def decode_image(source):
+    """ Decode the image file path or encoded bytes into HWC array.
+
+        The `.npy` files are loaded by numpy, the others are decoded
+        into BGR uint8 by OpenCV.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, str) and source.endswith(".npy"):
+        return np.load(source)
+    import cv2
+    if isinstance(source, str):
+        img = cv2.imread(source, cv2.IMREAD_COLOR)
+    else:
+        img = cv2.imdecode(np.frombuffer(source, dtype="uint8"),
+                           cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("failed to decode image: %s" \
+            % (source if isinstance(source, str) else "<bytes>"))
+    return img
+
+class Preprocessor:
+    """ Batched preprocessing of uint8 images into runtime input.
+
+        Every image is processed as:
+
+        .. code-block:: python
+
+            x = resize(center_crop(img))[..., ::-1] / 255.  # if bgr
+            x = (x - mean) / std
+            x = clip(round(x * scale), -r, r)  # r = 2^(target_bit-1)-1
+
+        and packed into the NCHW output. All the steps but resize are
+        one lookup table gather per channel.
+
+        Parameters
+        ==========
+        input_shape: tuple of int
+            The (batch, channel, height, width) shape of model input.
+        scale: float
+            The input scale of `inputs_ext`.
+        target_bit: int
+            The input precision of `inputs_ext`.
+        mean, std: list of float, optional
+            The per-channel normalization of pixels in [0, 1], in the
+            model channel order, defaults to no normalization.
+        pixel_scale: float
+            The divisor of pixel values before normalization.
+        bgr: bool
+            The images are decoded in BGR order, like OpenCV, and the
+            model takes RGB.
+        resize: str
+            The resize method of :class:`Resize`.
+        center_crop: bool
+            Crop the center square before resize.
+        num_workers: int, optional
+            The thread pool size for decode and preprocess, defaults
+            to the number of CPUs.
+    """
+    def __init__(self, input_shape, scale, target_bit=8, mean=None,
+                 std=None, pixel_scale=255., bgr=True, resize="bilinear",
+                 center_crop=False, num_workers=None):
+        if len(input_shape) != 4:
+            raise ValueError("expected NCHW input shape, got %s" \
+                % (input_shape,))
+        self.input_shape = tuple(input_shape)
+        self.scale = scale
+        self.target_bit = target_bit
+        self.dtype = _quant_dtype(target_bit)
+        channels = self.input_shape[1]
+        self.bgr = bgr and channels == 3
+        self.resize = Resize(self.input_shape[2:], resize, center_crop)
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self._executor = None
+
+        mean = np.zeros(channels) if mean is None else np.array(mean)
+        std = np.ones(channels) if std is None else np.array(std)
+        pixels = np.arange(256, dtype="float64") / pixel_scale
+        lut = (pixels[None, :] - mean[:, None]) / std[:, None]
+        self.lut = quantize(lut, scale, target_bit, \
+            out=np.empty((channels, 256), dtype=self.dtype))
+
+    @classmethod
+    def from_ext(cls, fname, input_shape=None, name="data", **kwargs):
+        """ Create from the compiled `ext` file, see
+                :func:`load_inputs_ext`.
+
+            The input shape defaults to the one recorded in ext.
+        """
+        ext = load_inputs_ext(fname, name)
+        if input_shape is None:
+            input_shape = ext.get("input_shape", None)
+            if input_shape is None:
+                raise ValueError("input shape not recorded in %s" % fname)
+        return cls(input_shape, ext["scale"], ext["target_bit"], **kwargs)
+
+    def empty(self, batch=None):
+        """ Allocate the output buffer. """
+        shape = self.input_shape if batch is None else \
+            (batch,) + self.input_shape[1:]
+        return np.empty(shape, dtype=self.dtype)
+
+    def process_image(self, img, out):
+        """ Preprocess one image into `out` of (channel, height, width). """
+        if img.ndim == 2:
+            img = img[:, :, None]
+        if img.dtype != np.uint8:
+            raise TypeError("expected uint8 image, got %s" % img.dtype)
+        channels = out.shape[0]
+        if img.shape[2] < channels:
+            raise ValueError("image of %d channels for %d-channel " \
+                "input" % (img.shape[2], channels))
+        if img.shape[:2] != self.resize.size or self.resize.center_crop:
+            img = self.resize(img, self.resize._workspace(
+                "out", self.resize.size + (img.shape[2],), "uint8"))
+        for c in range(channels):
+            src = channels - 1 - c if self.bgr else c
+            np.take(self.lut[c], img[:, :, src], out=out[c])
+        return out
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.num_workers,
+                thread_name_prefix="cvm_preprocess")
+        return self._executor
+
+    def __call__(self, images, out=None):
+        """ Preprocess the batch of images.
+
+            Parameters
+            ==========
+            images: list of numpy.ndarray, or numpy.ndarray
+                The uint8 HWC images, or NHWC batch.
+            out: numpy.ndarray, optional
+                The output buffer, see :meth:`empty`.
+
+            Returns
+            =======
+            out: numpy.ndarray
+                The NCHW runtime input, passed to
+                :func:`cvm.runtime.CVMAPIInferenceInto` directly.
+        """
+        if out is None:
+            out = self.empty(len(images))
+        if len(images) > out.shape[0]:
+            raise ValueError("batch of %d images exceeds buffer of %d" \
+                % (len(images), out.shape[0]))
+        if len(images) == 1 or self.num_workers == 1:
+            for img, dst in zip(images, out):
+                self.process_image(img, dst)
+            return out
+        list(self._pool().map(self.process_image, images, out))
+        return out
+
+    def run(self, sources, out=None):
+        """ Decode and preprocess the images concurrently.
+
+            Parameters
+            ==========
+            sources: list
+                The image file paths or encoded bytes, see
+                :func:`decode_image`.
+        """
+        if out is None:
+            out = self.empty(len(sources))
+        def _impl(source, dst):
+            return self.process_image(decode_image(source), dst)
+        list(self._pool().map(_impl, sources, out))
+        return out
+
+    def close(self):
+        """ Shutdown the thread pool. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -2,16 +2,482 @@
 
     This namespace wraps the python interface of c backend API. Inference methods contain model load, inference, ..., and free etc.
 
-    We have supply two wrapper format via *ctypes* and *cython* (TODO).
+    We have supply two wrapper format via *ctypes* and *cython*. The
+    cython extension `cvm._cy3.libcvm`, built by setup.py with the
+    environment variable `CVM_ENABLE_CYTHON=1`, is used for inference once
+    built, which takes buffer inputs without copying and releases the
+    GIL, and falls back to ctypes otherwise. Set `CVM_ENABLE_CYTHON=0`
+    at runtime to force the ctypes wrapper.
 
 """
 
+import os
+import json
+import time
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from ._ctypes.runtime import CVMAPILoadModel, CVMAPIFreeModel
 from ._ctypes.runtime import CVMAPIGetInputLength, CVMAPIGetInputTypeSize
-from ._ctypes.runtime import CVMAPIInference
+from ._ctypes.runtime import CVMAPIInference, CVMAPIInferenceInto
 from ._ctypes.runtime import CVMAPIGetOutputLength, CVMAPIGetOutputTypeSize
+from ._ctypes.runtime import CVMAPIGetStorageSize, CVMAPIGetGasFromModel
+from ._ctypes.runtime import CVMAPIGetGasFromGraphFile
+from .bundle import load_bundle
+from .blobs import MANIFEST_NAME, read_manifest_params
+
+libcvm = None
+BACKEND = "ctypes"
+if os.environ.get("CVM_ENABLE_CYTHON", "1") != "0":
+    try:
+        from ._cy3 import libcvm
+        from ._cy3.libcvm import CVMAPIInference, CVMAPIInferenceInto
+        BACKEND = "cython"
+    except ImportError:
+        pass
+
+def _graph_attr(graph, key, type_name):
+    attr = graph.get("attrs", {}).get(key, None)
+    if attr is None or attr[0] != type_name:
+        raise ValueError("invalid graph attribute: %s" % key)
+    return attr[1]
+
+def estimate_storage_size(json_str):
+    """ Compute the storage size from the model json only.
+
+        The result equals to :func:`CVMAPIGetStorageSize` of the loaded
+        model: every entry is planned as int32, the entries sharing a
+        storage id occupy the largest one, and each storage is aligned
+        to 4 bytes.
+
+        Parameters
+        ==========
+        json_str: bytes or str
+            The model json content.
+    """
+    graph = json.loads(json_str)
+    shapes = _graph_attr(graph, "shape", "list_shape")
+    storage_ids = _graph_attr(graph, "storage_id", "list_int")
+    pool = {}
+    for shape, sid in zip(shapes, storage_ids):
+        size = 1
+        for dim in shape:
+            size *= dim
+        pool[sid] = max(pool.get(sid, 0), size * 4)
+    return sum((size + 3) // 4 * 4 for size in pool.values())
+
+def estimate_model_cost(json_path):
+    """ Estimate the gas and storage size of a model json file.
+
+        Returns
+        =======
+        ret: dict
+            With keys `path`, `gas`, `storage_size`, and `error` holding
+            the error message if the model is invalid, in which case the
+            gas and storage size are None.
+    """
+    ret = {"path": json_path, "gas": None,
+           "storage_size": None, "error": None}
+    try:
+        with open(json_path, "rb") as fin:
+            json_str = fin.read()
+        ret["storage_size"] = estimate_storage_size(json_str)
+        ret["gas"] = CVMAPIGetGasFromGraphFile(json_str)
+    except Exception as err: # pylint: disable=broad-except
+        ret["error"] = "%s: %s" % (type(err).__name__, err)
+    return ret
+
+def estimate_model_costs(json_paths, num_workers=None):
+    """ Estimate the gas and storage size of model json files in parallel.
+
+        The estimation never allocates the parameters, and the GIL is
+        released inside the C API so the files are estimated
+        concurrently by threads.
+
+        Parameters
+        ==========
+        json_paths: list of str
+            The model json files.
+        num_workers: int, optional
+            The number of threads, defaults to the executor default.
+
+        Returns
+        =======
+        ret: list of dict
+            The result of :func:`estimate_model_cost` in the order of
+            `json_paths`.
+    """
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(estimate_model_cost, json_paths))
+
+def model_files(model_dir):
+    """ The files of the model directory or bundle file.
+
+        The parameters are either the `params` file, or the blob
+        manifest file, see :mod:`cvm.blobs`.
+    """
+    if os.path.isfile(model_dir):
+        return [model_dir]
+    params_file = os.path.join(model_dir, "params")
+    if not os.path.exists(params_file):
+        manifest_file = os.path.join(model_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_file):
+            params_file = manifest_file
+    return [os.path.join(model_dir, "symbol"), params_file]
+
+def read_model_dir(model_dir):
+    """ Read the `symbol` and `params` files of the model directory,
+            or the model bundle file, see :mod:`cvm.bundle`.
+
+        Returns
+        =======
+        ret: tuple of bytes
+            The json and parameter bytes for :func:`CVMAPILoadModel`.
+    """
+    files = model_files(model_dir)
+    if len(files) == 1:
+        with load_bundle(model_dir) as bundle:
+            return bundle.graph_json, bytes(bundle.param_bytes)
+    with open(files[0], "rb") as fin:
+        json_str = fin.read()
+    if os.path.basename(files[1]) == MANIFEST_NAME:
+        return json_str, read_manifest_params(files[1])
+    with open(files[1], "rb") as fin:
+        param_bytes = fin.read()
+    return json_str, param_bytes
+
+def warmup_model(net):
+    """ Run one inference of all-zero input on the loaded model.
+
+        The first inference pays the page faults and first-touch costs
+        of the storage pool, which are moved off the serving path.
+    """
+    return CVMAPIInferenceInto(net, bytearray(CVMAPIGetInputLength(net)))
+
+def load_model_dir(model_dir, ctx=None, warmup=False):
+    """ Load the model directory and optionally warm it up.
+
+        Returns
+        =======
+        net: ctypes.c_void_p
+            The model handle, freed by :func:`CVMAPIFreeModel`.
+    """
+    net = CVMAPILoadModel(*read_model_dir(model_dir), ctx)
+    if warmup:
+        try:
+            warmup_model(net)
+        except Exception:
+            CVMAPIFreeModel(net)
+            raise
+    return net
+
+class _CacheEntry:
+    def __init__(self, key, net, nbytes):
+        self.key = key
+        self.net = net
+        self.nbytes = nbytes
+        self.refs = 0
+
+class ModelCache:
+    """ LRU cache of loaded models sharing one process.
+
+        The models are keyed by the model directory, holding the
+        `symbol` and `params` files, or the model bundle file, see
+        :mod:`cvm.bundle`, plus the sha256 digest of their
+        content, so that an updated model is reloaded. The digest is
+        only recomputed when the file size or modification time changes.
+
+        At most `max_models` models or `max_bytes` bytes of storage,
+        accounted by :func:`CVMAPIGetStorageSize`, are kept resident,
+        and the least recently used models are freed to make room. A
+        model acquired by :meth:`acquire` is pinned and never freed
+        until released, so the cache may temporarily exceed the limits
+        when all the resident models are in use.
+
+        Models are loaded outside of the cache lock, thus different
+        models load concurrently, while the concurrent requests of the
+        same model wait for the single load.
+
+        Parameters
+        ==========
+        max_models: int, optional
+            The maximum number of resident models, unlimited if None.
+        max_bytes: int, optional
+            The maximum bytes of resident storage, unlimited if None.
+        ctx: cvm.CVMContext, optional
+            The context of models loaded into, defaults to `cpu(0)`.
+        warmup: bool
+            Run :func:`warmup_model` once loaded.
+
+        Examples
+        ========
+        .. code-block:: python
+
+            cache = ModelCache(max_models=16, max_bytes=1 << 30)
+            with cache.acquire("/data/std_out/trec") as net:
+                out = CVMAPIInferenceInto(net, data)
+            print(cache.stats())
+    """
+    def __init__(self, max_models=None, max_bytes=None, ctx=None,
+                 warmup=False):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.ctx = ctx
+        self.warmup = warmup
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._digests = {}
+        self._nbytes = 0
+        self._reserved_models = 0
+        self._reserved_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load_seconds = []
+
+    def _digest(self, model_dir):
+        files = model_files(model_dir)
+        signature = tuple((st.st_size, st.st_mtime_ns) \
+                          for st in map(os.stat, files))
+        cached = self._digests.get(model_dir, None)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        sha = hashlib.sha256()
+        for fname in files:
+            with open(fname, "rb") as fin:
+                for chunk in iter(lambda: fin.read(1 << 20), b""):
+                    sha.update(chunk)
+        digest = sha.hexdigest()
+        self._digests[model_dir] = (signature, digest)
+        return digest
+
+    def _free(self, entry):
+        del self._entries[entry.key]
+        self._nbytes -= entry.nbytes
+        self._evictions += 1
+        CVMAPIFreeModel(entry.net)
+
+    def _shrink(self, num_models=0, nbytes=0):
+        """ Free the unused models in LRU order until `num_models`
+                models of `nbytes` bytes more fit into the limits,
+                besides the models being loaded.
+        """
+        num_models += self._reserved_models
+        nbytes += self._reserved_bytes
+        for entry in list(self._entries.values()):
+            over_models = self.max_models is not None and \
+                len(self._entries) + num_models > self.max_models
+            over_bytes = self.max_bytes is not None and \
+                self._nbytes + nbytes > self.max_bytes
+            if not (over_models or over_bytes):
+                break
+            if entry.refs == 0:
+                self._free(entry)
+
+    def _load(self, model_dir, key):
+        json_str, param_bytes = read_model_dir(model_dir)
+        nbytes = estimate_storage_size(json_str)
+        with self._lock:
+            self._shrink(1, nbytes)
+            self._reserved_models += 1
+            self._reserved_bytes += nbytes
+        net = None
+        try:
+            start = time.time()
+            net = CVMAPILoadModel(json_str, param_bytes, self.ctx)
+            load_seconds = time.time() - start
+            if self.warmup:
+                warmup_model(net)
+        except Exception:
+            if net is not None:
+                CVMAPIFreeModel(net)
+            raise
+        finally:
+            with self._lock:
+                self._reserved_models -= 1
+                self._reserved_bytes -= nbytes
+        with self._lock:
+            entry = _CacheEntry(key, net, CVMAPIGetStorageSize(net))
+            entry.refs += 1
+            self._entries[key] = entry
+            self._nbytes += entry.nbytes
+            self._load_seconds.append(load_seconds)
+            return entry
+
+    def _pin(self, model_dir):
+        model_dir = os.path.abspath(model_dir)
+        while True:
+            key = (model_dir, self._digest(model_dir))
+            with self._lock:
+                entry = self._entries.get(key, None)
+                if entry is not None:
+                    self._hits += 1
+                    self._entries.move_to_end(key)
+                    entry.refs += 1
+                    return entry
+                loading = self._loading.get(key, None)
+                if loading is None:
+                    self._misses += 1
+                    for stale in [e for k, e in self._entries.items() \
+                                  if k[0] == model_dir and e.refs == 0]:
+                        self._free(stale)
+                    self._loading[key] = Future()
+            if loading is not None:
+                # wait for the load of another thread, and retry
+                loading.result()
+                continue
+            try:
+                entry = self._load(model_dir, key)
+            except Exception as err:
+                with self._lock:
+                    self._loading.pop(key).set_exception(err)
+                raise
+            with self._lock:
+                self._loading.pop(key).set_result(None)
+            return entry
+
+    def _unpin(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            self._shrink()
+
+    @contextlib.contextmanager
+    def acquire(self, model_dir):
+        """ Pin the model of `model_dir`, loading it on miss, and yield
+                the model handle.
+        """
+        entry = self._pin(model_dir)
+        try:
+            yield entry.net
+        finally:
+            self._unpin(entry)
+
+    def inference(self, model_dir, input_data, out=None):
+        """ Inference with the cached model of `model_dir`.
+
+            Refer to :func:`CVMAPIInferenceInto` for the arguments.
+        """
+        with self.acquire(model_dir) as net:
+            return CVMAPIInferenceInto(net, input_data, out)
+
+    def preload(self, model_dirs, num_workers=None):
+        """ Load the models into cache concurrently.
+
+            Refer to :func:`load_models` for details.
+        """
+        return load_models(model_dirs, num_workers=num_workers, cache=self)
+
+    def evict(self, model_dir):
+        """ Free the unused models loaded from `model_dir`. """
+        model_dir = os.path.abspath(model_dir)
+        with self._lock:
+            for entry in [e for k, e in self._entries.items() \
+                          if k[0] == model_dir and e.refs == 0]:
+                self._free(entry)
+
+    def clear(self):
+        """ Free all the unused models. """
+        with self._lock:
+            for entry in list(self._entries.values()):
+                if entry.refs == 0:
+                    self._free(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, model_dir):
+        model_dir = os.path.abspath(model_dir)
+        return any(k[0] == model_dir for k in self._entries)
+
+    def stats(self):
+        """ The cache statistics.
+
+            Returns
+            =======
+            ret: dict
+                With keys `models` and `bytes` resident, `hits`,
+                `misses`, `hit_rate`, `evictions`, `loads`, and the
+                `load_mean_ms` and `load_max_ms` latency of
+                :func:`CVMAPILoadModel`.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            loads = self._load_seconds
+            return {
+                "models": len(self._entries), "bytes": self._nbytes,
+                "hits": self._hits, "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.,
+                "evictions": self._evictions, "loads": len(loads),
+                "load_mean_ms": sum(loads) / len(loads) * 1e3 \
+                    if loads else 0.,
+                "load_max_ms": max(loads) * 1e3 if loads else 0.,
+            }
+
+def _preload(cache, model_dir):
+    entry = cache._pin(model_dir) # pylint: disable=protected-access
+    cache._unpin(entry) # pylint: disable=protected-access
+    return model_dir
+
+def load_models(model_dirs, num_workers=None, warmup=False, ctx=None,
+                cache=None):
+    """ Load and warm up the models concurrently.
+
+        The model files are read and :func:`CVMAPILoadModel` runs in a
+        thread pool, where the GIL is released inside the C API. The
+        futures are returned immediately, thus a server could serve
+        the models already loaded while the others are loading.
+
+        Parameters
+        ==========
+        model_dirs: list of str
+            The model directories holding `symbol` and `params` files.
+        num_workers: int, optional
+            The number of models loaded in parallel, defaults to the
+            executor default.
+        warmup: bool
+            Run :func:`warmup_model` on each model once loaded, ignored
+            with `cache`, whose own option applies.
+        ctx: cvm.CVMContext, optional
+            The context of models loaded into, ignored with `cache`.
+        cache: ModelCache, optional
+            Load the models into the cache instead.
+
+        Returns
+        =======
+        futures: dict of str to concurrent.futures.Future
+            The readiness future of each model directory, resolving to
+            the model handle, which is owned by the caller and freed by
+            :func:`CVMAPIFreeModel`, or to the model directory if loaded
+            into `cache`. The future raises if the model fails to load.
+    """
+    executor = ThreadPoolExecutor(max_workers=num_workers,
+                                  thread_name_prefix="cvm_loader")
+    futures = OrderedDict()
+    for model_dir in model_dirs:
+        if cache is None:
+            fut = executor.submit(load_model_dir, model_dir, ctx, warmup)
+        else:
+            fut = executor.submit(_preload, cache, model_dir)
+        futures[model_dir] = fut
+    executor.shutdown(wait=False)
+    return futures
+
+def aload_models(model_dirs, num_workers=None, warmup=False, ctx=None,
+                 cache=None, loop=None):
+    """ The asyncio version of :func:`load_models`.
 
-#  try:
-    #  from ._cy3 import libcvm
-#  except ImportError:
-    #  pass
+        Returns
+        =======
+        futures: dict of str to asyncio.Future
+            The awaitable readiness future of each model directory,
+            bound to the event `loop`, defaults to the running one.
+    """
+    loop = asyncio.get_running_loop() if loop is None else loop
+    futures = load_models(model_dirs, num_workers, warmup, ctx, cache)
+    return OrderedDict((k, asyncio.wrap_future(f, loop=loop)) \
+                       for k, f in futures.items())
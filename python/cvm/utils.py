@@ -2,6 +2,7 @@ import numpy as np
 import logging
 from . import symbol as _sym
 from . import graph
+from . import bundle as _bundle
 
 def argmax(out):
     return np.argmax(out)
@@ -34,7 +35,15 @@ def detection_output(out, batch=1):
                break
            print (tmp[i:i+6])
 
-def load_model(sym_path, prm_path):
+def load_model(sym_path, prm_path=None):
+    """ Read the model json and params bytes for runtime.
+
+        The model is read from the bundle file of `sym_path`, see
+        :mod:`cvm.bundle`, if `prm_path` is not specified.
+    """
+    if prm_path is None:
+        with _bundle.load_bundle(sym_path) as bundle:
+            return bundle.graph_json, bytes(bundle.param_bytes)
     with open(sym_path, "r") as f:
         json_str = f.read()
     with open(prm_path, "rb") as f:
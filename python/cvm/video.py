@@ -1,6 +1,19 @@
+""" Video Reading, Writing and Pipelined Inference
+
+    :func:`video_inference` runs the staged pipeline of
+    :mod:`cvm.pipeline` over the frames of a video file: decoding,
+    preprocessing, batched inference, postprocessing and encoding of
+    different frames overlap on threads, with bounded queues between.
+"""
+
 import cv2
 import os
 
+import numpy as np
+
+from . import runtime
+from .pipeline import Pipeline, Stage
+
 
 class VideoReader:
     def __init__(self, filename):
@@ -18,6 +31,17 @@ class VideoReader:
         self.is_ok, frame = self.cap.read()
         return self.is_ok, frame
 
+    @property
+    def fps(self):
+        return self.cap.get(cv2.CAP_PROP_FPS)
+
+    def __iter__(self):
+        while self.is_ok:
+            ok, frame = self.read()
+            if not ok:
+                break
+            yield frame
+
     def release(self):
         self.cap.release()
 
@@ -32,9 +56,10 @@ class VideoWriter:
         VideoType.AVI : 'MJPG',
     }
 
-    def __init__(self, filename, file_type=VideoType.AVI):
+    def __init__(self, filename, file_type=VideoType.AVI, fps=24):
         self.filename = filename + "." + file_type
         self.file_type = file_type
+        self.fps = fps
         self.width, self.height = None, None
         self.out = None
 
@@ -45,17 +70,124 @@ class VideoWriter:
             self.out = cv2.VideoWriter(
                 self.filename,
                 cv2.VideoWriter_fourcc(*VideoWriter.FORMAT[self.file_type]),
-                24, (self.width, self.height))
+                self.fps, (self.width, self.height))
         else:
             assert self.width == w and self.height == h
 
         self.out.write(image)
 
     def release(self):
-        self.out.release()
+        if self.out is not None:
+            self.out.release()
+
+def _batch_inference(net, preprocessor):
+    # the inference stage has one worker, which owns the batch buffer
+    batch = preprocessor.empty()
+    def _infer(items):
+        batch[len(items):] = 0
+        for dst, (_, data) in zip(batch, items):
+            np.copyto(dst, data)
+        out = runtime.CVMAPIInferenceInto(net, batch)
+        out = out.reshape((batch.shape[0], -1))
+        return [(frame, o) for (frame, _), o in zip(items, out)]
+    return _infer
+
+def video_inference(source, model, preprocessor, postprocess=None,
+                    dest=None, dest_type=VideoType.AVI, drop_frames=False,
+                    num_workers=2, queue_size=8, batch_timeout=0.01):
+    """ Pipelined inference over the frames of the video file.
+
+        The frames are batched by the model input batch size, the last
+        partial batch is padded with zeros.
+
+        Parameters
+        ==========
+        source: str or VideoReader
+            The video file path or reader.
+        model: str or handle
+            The model directory or bundle file, loaded and freed here,
+            or the loaded model handle.
+        preprocessor: cvm.preprocess.Preprocessor
+            The preprocessor whose input shape matches the model.
+        postprocess: callable, optional
+            Called with (frame, output) on the output of one frame,
+            returning the image to encode, such as the frame with
+            detections drawn. Defaults to the frame itself.
+        dest: str, optional
+            The output video file name without extension, the
+            processed frames are discarded if not specified.
+        drop_frames: bool
+            Drop the frames under backpressure, see
+            :class:`cvm.pipeline.Pipeline`.
+        num_workers: int
+            The worker threads of preprocessing and postprocessing.
+
+        Returns
+        =======
+        stats: dict
+            The pipeline statistics, see :meth:`Pipeline.stats`.
+    """
+    reader = VideoReader(source) if isinstance(source, str) else source
+    own_net = isinstance(model, str)
+    net = runtime.load_model_dir(model) if own_net else model
+    writer = None
+    if dest is not None:
+        writer = VideoWriter(dest, dest_type, reader.fps or 24)
+
+    def _preprocess(frame):
+        data = preprocessor.empty(1)[0]
+        return frame, preprocessor.process_image(frame, data)
+
+    def _postprocess(item):
+        frame, out = item
+        return frame if postprocess is None else postprocess(frame, out)
+
+    def _encode(_, image):
+        if writer is not None:
+            writer.write(image)
+
+    pipe = Pipeline(reader, [
+        Stage(_preprocess, "preprocess", num_workers, queue_size=queue_size),
+        Stage(_batch_inference(net, preprocessor), "inference",
+              batch_size=preprocessor.input_shape[0],
+              batch_timeout=batch_timeout, queue_size=queue_size),
+        Stage(_postprocess, "postprocess", num_workers,
+              queue_size=queue_size),
+    ], sink=_encode, drop_frames=drop_frames)
+    try:
+        pipe.run()
+    finally:
+        if own_net:
+            runtime.CVMAPIFreeModel(net)
+        if writer is not None:
+            writer.release()
+        reader.release()
+    return pipe.stats()
 
 
 if __name__ == "__main__":
-    vr = VideoReader("/data/wlt/videos/office-1.mp4")
-    frame = vr.read()
-    print (type(frame), frame.shape)
+    import json
+    import argparse
+    from .bundle import graph_meta
+    from .preprocess import Preprocessor
+
+    parser = argparse.ArgumentParser("cvm.video",
+        description="pipelined inference over the video file")
+    parser.add_argument("source", type=str)
+    parser.add_argument("model", type=str,
+                        help="compiled model directory with the ext file")
+    parser.add_argument("--dest", type=str, default=None)
+    parser.add_argument("--mean", type=float, nargs="+", default=None)
+    parser.add_argument("--std", type=float, nargs="+", default=None)
+    parser.add_argument("--drop-frames", action="store_true")
+    parser.add_argument("--num-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    json_str, _ = runtime.read_model_dir(args.model)
+    input_shape = graph_meta(json_str)["inputs"][0]["shape"]
+    prep = Preprocessor.from_ext(os.path.join(args.model, "ext"),
+                                 input_shape, mean=args.mean, std=args.std)
+    stats = video_inference(args.source, args.model, prep, dest=args.dest,
+                            drop_frames=args.drop_frames,
+                            num_workers=args.num_workers)
+    print(json.dumps(stats, indent=2))
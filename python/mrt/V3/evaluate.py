@@ -16,6 +16,7 @@ from mrt.transformer import Model, MRT, reduce_graph
 from mrt import dataset as ds
 from mrt import utils
 from mrt import sim_quant_helper as sim
+from mrt.np_executor import NumpyExecutor
 from mrt.V3.utils import (
     MRT_CFG, get_model_prefix, get_logger, set_batch, load_fname, load_conf,
     check_file_existance, get_ctx, get_batch_axis)
@@ -26,6 +27,8 @@ EVALUATE Stage Options:
     --evaluate.device_type      Context type for evaluation stage chosen from "cpu" or "gpu".
     --evaluate.device_ids       A comma list within square brackets specifying the context ids, eg.[0,1,2].
     --evaluate.iter_num         Number of evaluating iteration steps.
+    --evaluate.executor         Executor for the quantized model chosen from "mxnet" or "numpy".
+    --evaluate.native_ops       Lower MRT custom ops into builtin MxNet ops for "mxnet" executor.
 """
 
 MRT_CFG.EVALUATE = CN()
@@ -33,6 +36,8 @@ MRT_CFG.EVALUATE.BATCH = None
 MRT_CFG.EVALUATE.DEVICE_TYPE = None
 MRT_CFG.EVALUATE.DEVICE_IDS = None
 MRT_CFG.EVALUATE.ITER_NUM = 10
+MRT_CFG.EVALUATE.EXECUTOR = "mxnet"
+MRT_CFG.EVALUATE.NATIVE_OPS = False
 
 def forward(net, data, ctx, baxis, olen):
     """
@@ -155,13 +160,27 @@ def get_evaluation_info(cm_cfg, pass_cfg, logger=None):
         oscales = mrt.get_output_scales()
         inputs_ext = mrt.get_inputs_ext()
         qmodel = mrt.current_model
-    qgraph = qmodel.to_graph(ctx=ctx)
     qmetric = dataset.metrics()
+    executor = pass_cfg.EXECUTOR
+    if executor == "numpy":
+        qexec = NumpyExecutor(qmodel.symbol, qmodel.params)
+    elif executor == "mxnet":
+        qgraph = qmodel.to_graph(ctx=ctx, native_ops=pass_cfg.NATIVE_OPS)
+    else:
+        raise RuntimeError("Invalid executor: {}".format(executor))
+
+    def _numpy_forward(data):
+        outs = qexec.forward(data=data)
+        outs = [nd.array(o, ctx=ctx[0]) for o in outs]
+        return outs[0] if olen == 1 else outs
 
     def quantize(data, label):
         data = sim.load_real_data(data, 'data', inputs_ext)
         # outs = forward(qgraph, data, ctx)
-        outs = forward(qgraph, data, ctx, baxis, olen)
+        if executor == "numpy":
+            outs = _numpy_forward(data)
+        else:
+            outs = forward(qgraph, data, ctx, baxis, olen)
         outs = outs / oscales[0] if olen == 1 \
             else [(t / oscales[i]) for i, t in enumerate(outs)]
         start = time.time()
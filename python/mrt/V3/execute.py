@@ -12,7 +12,9 @@ from mrt.V3.calibrate import calibrate
 from mrt.V3.quantize import quantize
 from mrt.V3.evaluate import evaluate
 from mrt.V3.mrt_compile import mrt_compile
+from mrt.V3.sensitivity import sensitivity
 from mrt.V3.utils import get_logger
+from mrt.common import trace
 
 thismodule = sys.modules[__name__]
 
@@ -46,15 +48,20 @@ def yaml_main(cfg, logger=None):
             start_after, start_pos_map)
     start_pos = start_pos_map[start_after]
     if start_pos < 1:
-        prepare(cfg.COMMON, cfg.PREPARE, logger=logger)
+        with trace.span("prepare", cat="stage"):
+            prepare(cfg.COMMON, cfg.PREPARE, logger=logger)
     if start_pos < 2:
-        calibrate(cfg.COMMON, cfg.CALIBRATE, logger=logger)
+        with trace.span("calibrate", cat="stage"):
+            calibrate(cfg.COMMON, cfg.CALIBRATE, logger=logger)
     if start_pos < 3:
-        quantize(cfg.COMMON, cfg.QUANTIZE, logger=logger)
+        with trace.span("quantize", cat="stage"):
+            quantize(cfg.COMMON, cfg.QUANTIZE, logger=logger)
     if cfg.COMMON.RUN_EVALUATE:
-        evaluate(cfg.COMMON, cfg.EVALUATE, logger=logger)
+        with trace.span("evaluate", cat="stage"):
+            evaluate(cfg.COMMON, cfg.EVALUATE, logger=logger)
     if cfg.COMMON.RUN_COMPILE:
-        mrt_compile(cfg.COMMON, cfg.COMPILE, logger=logger)
+        with trace.span("compile", cat="stage"):
+            mrt_compile(cfg.COMMON, cfg.COMPILE, logger=logger)
 
 def run(cfg, logger=None):
     """
@@ -70,6 +77,20 @@ def run(cfg, logger=None):
     """
     pass_name = cfg.COMMON.PASS_NAME
     logger = get_logger(cfg.COMMON.VERBOSITY)
+    trace_file = cfg.COMMON.TRACE_FILE
+    if trace_file is not None:
+        trace.reset()
+        trace.enable()
+    try:
+        _run(cfg, pass_name, logger)
+    finally:
+        if trace_file is not None:
+            trace.disable()
+            trace.export_chrome_trace(trace_file)
+            logger.info("trace of %d spans dumped into %s",
+                        len(trace.events()), trace_file)
+
+def _run(cfg, pass_name, logger):
     if pass_name == "all":
         yaml_main(cfg, logger=logger)
     else:
@@ -84,4 +105,8 @@ def run(cfg, logger=None):
         else:
             cfg_name = pass_name.upper()
         pass_cfg = getattr(cfg, cfg_name)
-        yaml_func(cm_cfg, pass_cfg, logger=logger)
+        with trace.span(cfg_name.lower(), cat="stage"):
+            if pass_name == "sensitivity":
+                yaml_func(cm_cfg, pass_cfg, cfg.QUANTIZE, logger=logger)
+            else:
+                yaml_func(cm_cfg, pass_cfg, logger=logger)
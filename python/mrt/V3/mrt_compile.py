@@ -14,6 +14,7 @@ import numpy as np
 from mrt.transformer import Model, MRT
 from mrt import dataset as ds
 from mrt import sim_quant_helper as sim
+from cvm.bundle import pack_model_dir
 from mrt.V3.utils import (
     MRT_CFG, get_model_prefix, get_logger, set_batch, load_fname, load_conf,
     check_file_existance)
@@ -24,6 +25,9 @@ COMPILE Stage Options:
     --compile.dump_dir          Directory for saving compilation results.
     --compile.device_type       Context type for compilation stage chosen from "cpu" or "gpu".
     --compile.device_ids        A comma list within square brackets specifying the context ids, eg.[0,1,2].
+    --compile.bundle            Whether to pack the compiled model into a single bundle file.
+    --compile.blob_store        Directory of content-hashed parameter blobs shared across models, eg. split models.
+    --compile.fuse_requant      Whether to fuse requantization chains into cvm_requant, which requires the runtime supporting it.
 """
 
 default_dump_dir = path.expanduser("~/mrt_dump")
@@ -33,6 +37,9 @@ MRT_CFG.COMPILE.BATCH = 1
 MRT_CFG.COMPILE.DUMP_DIR = default_dump_dir
 MRT_CFG.COMPILE.DEVICE_TYPE = None
 MRT_CFG.COMPILE.DEVICE_IDS = None
+MRT_CFG.COMPILE.BUNDLE = True
+MRT_CFG.COMPILE.BLOB_STORE = None
+MRT_CFG.COMPILE.FUSE_REQUANT = False
 
 def mrt_compile(cm_cfg, pass_cfg, logger=None):
     """
@@ -93,7 +100,8 @@ def mrt_compile(cm_cfg, pass_cfg, logger=None):
     qmodel.to_cvm(
         model_name_tfm, datadir=dump_dir,
         input_shape=set_batch(input_shape, batch), target=device_type,
-        device_ids=device_ids_compile)
+        device_ids=device_ids_compile, blob_store=pass_cfg.BLOB_STORE,
+        fuse_requant=pass_cfg.FUSE_REQUANT)
     dataset = ds.DS_REG[conf_map["dataset_name"]](set_batch(input_shape, batch))
     dump_data, _ = dataset.iter_func()()
     dump_data = sim.load_real_data(
@@ -107,4 +115,7 @@ def mrt_compile(cm_cfg, pass_cfg, logger=None):
         "input_shapes": input_shape,
     }
     sim.save_ext(path.join(model_root, "ext"), infos)
+    if pass_cfg.BUNDLE:
+        bundle_file = pack_model_dir(model_root)
+        logger.info("model bundle saved into %s", bundle_file)
     logger.info("compilation stage finished")
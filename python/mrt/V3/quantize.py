@@ -40,6 +40,53 @@ MRT_CFG.QUANTIZE.THRESHOLDS = []
 MRT_CFG.QUANTIZE.ATTRIBUTE_DEPS = []
 MRT_CFG.QUANTIZE.OSCALE_MAPS = []
 
+def get_restore_names(symbol, restore_names):
+    """
+    Expand the restoration configuration into graph node names.
+
+    Parameters
+    ----------
+    symbol : mxnet.symbol
+        The calibrated graph.
+    restore_names : list
+        Node names, names prefixed with `_OP_` stand for all the nodes
+        of the operator, `_ALL_EXCEPT_` restores all the quantizable
+        nodes except the listed ones.
+
+    Returns
+    -------
+    restore_names : set
+        The node names to be restored.
+    """
+    name_to_op = {}
+    for sym in sutils.topo_sort(symbol):
+        name, op_name = sym.attr('name'), sym.attr('op_name')
+        if op_name not in name_to_op:
+            name_to_op[op_name] = []
+        name_to_op[op_name].append(name)
+    new_names = []
+    for name in restore_names:
+        if name.startswith("_OP_") and name[4:] in name_to_op:
+            for new_name in name_to_op[name[4:]]:
+                new_names.append(new_name)
+        else:
+            new_names.append(name)
+    restore_names = set(new_names)
+    if '_ALL_EXCEPT_' in restore_names:
+        from tfm_base import _pass_manager
+        from tfm_ops import disabled_restore_ops
+
+        quantize_ops = [op_name for op_name in _pass_manager["quantize"] \
+                        if op_name not in disabled_restore_ops]
+        restore_names_new = []
+        for sym in sutils.topo_sort(symbol):
+            name, op_name = sym.attr('name'), sym.attr('op_name')
+            if op_name in quantize_ops and \
+                name not in restore_names:
+                restore_names_new.append(name)
+        restore_names = set(restore_names_new)
+    return restore_names
+
 def quantize(cm_cfg, pass_cfg, logger=None):
     """
     YAML configuration API of MRT quantization stage.
@@ -86,33 +133,8 @@ def quantize(cm_cfg, pass_cfg, logger=None):
     conf_quant_file = model_prefix + ".quantize.conf"
 
     # restoration configuration
-    name_to_op = {}
-    for sym in sutils.topo_sort(mrt.current_model.symbol):
-        name, op_name = sym.attr('name'), sym.attr('op_name')
-        if op_name not in name_to_op:
-            name_to_op[op_name] = []
-        name_to_op[op_name].append(name)
-    new_names = []
-    for name in restore_names:
-        if name.startswith("_OP_") and name[4:] in name_to_op:
-            for new_name in name_to_op[name[4:]]:
-                new_names.append(new_name)
-        else:
-            new_names.append(name)
-    restore_names = set(new_names)
-    if '_ALL_EXCEPT_' in restore_names:
-        from tfm_base import _pass_manager
-        from tfm_ops import disabled_restore_ops
-
-        quantize_ops = [op_name for op_name in _pass_manager["quantize"] \
-                        if op_name not in disabled_restore_ops]
-        restore_names_new = []
-        for sym in sutils.topo_sort(mrt.current_model.symbol):
-            name, op_name = sym.attr('name'), sym.attr('op_name')
-            if op_name in quantize_ops and \
-                name not in restore_names:
-                restore_names_new.append(name)
-        restore_names = set(restore_names_new)
+    restore_names = get_restore_names(
+        mrt.current_model.symbol, restore_names)
     for name in restore_names:
         mrt.set_restore(name)
 
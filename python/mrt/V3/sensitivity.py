@@ -0,0 +1,392 @@
+"""
+Sensitivity Analysis Module for MRT V3.
+
+Layer-wise quantization sensitivity analysis, which evaluates the accuracy
+of the quantized model while restoring each candidate layer (or changing
+the input precision of an operator) on a fixed cached evaluation subset,
+and ranks the candidates by the accuracy versus cost.
+
+The calibrated model and the evaluation batches are loaded once, only the
+quantization pass is re-run for each candidate, and the candidates could
+be fanned out over a process pool.
+"""
+
+from os import path
+import re
+import copy
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from yacs.config import CfgNode as CN
+import numpy as np
+import mxnet as mx
+from mxnet import ndarray as nd
+
+from mrt.transformer import Model, MRT
+from mrt import dataset as ds
+from mrt import sym_utils as sutils
+from mrt import tfm_pass as tpass
+from mrt.tfm_base import apply_pass
+from mrt import sim_quant_helper as sim
+from mrt.V3.utils import (
+    MRT_CFG, get_model_prefix, get_logger, set_batch, load_fname, load_conf,
+    check_file_existance, get_ctx, get_batch_axis)
+from mrt.V3.evaluate import forward
+from mrt.V3.quantize import get_restore_names
+
+DOC = """
+SENSITIVITY Stage Options:
+    --sensitivity.candidates    Names of graph nodes to be restored one by one, names prefixed with "_OP_" stand for all the nodes of the operator, all the Convolution and FullyConnected nodes by default.
+    --sensitivity.precisions    A list of [operator name, input precision] pairs to be evaluated, eg.[["Convolution",6]].
+    --sensitivity.batch         Batch size for sensitivity analysis.
+    --sensitivity.iter_num      Number of cached evaluation batches.
+    --sensitivity.num_workers   Number of processes evaluating the candidates in parallel.
+    --sensitivity.device_type   Context type for sensitivity analysis chosen from "cpu" or "gpu".
+    --sensitivity.device_ids    A comma list within square brackets specifying the context ids, eg.[0,1,2].
+    --sensitivity.output_file   JSON file to dump the ranked table into, defaults to the model prefix with ".sensitivity.json" suffix.
+"""
+
+MRT_CFG.SENSITIVITY = CN()
+MRT_CFG.SENSITIVITY.CANDIDATES = []
+MRT_CFG.SENSITIVITY.PRECISIONS = []
+MRT_CFG.SENSITIVITY.BATCH = None
+MRT_CFG.SENSITIVITY.ITER_NUM = 5
+MRT_CFG.SENSITIVITY.NUM_WORKERS = 1
+MRT_CFG.SENSITIVITY.DEVICE_TYPE = None
+MRT_CFG.SENSITIVITY.DEVICE_IDS = None
+MRT_CFG.SENSITIVITY.OUTPUT_FILE = None
+
+default_candidate_ops = ["Convolution", "FullyConnected"]
+
+def get_score(acc):
+    """
+    Extract the leading accuracy of the dataset validation result.
+
+    Parameters
+    ----------
+    acc : str
+        Result of `Dataset.validate`, eg. "top1= 76.12% top5= 92.80%".
+
+    Returns
+    -------
+    score : float
+        The first percentage in the result, eg. 76.12.
+    """
+    match = re.search(r"(-?[\d.]+)%", acc)
+    if match is None:
+        raise RuntimeError("unrecognized validation result: {}".format(acc))
+    return float(match.group(1))
+
+def layer_ops(model):
+    """
+    Number of operations of each graph node.
+
+    Parameters
+    ----------
+    model : mrt.transformer.Model
+        The model with input shape attached.
+
+    Returns
+    -------
+    ops : dict
+        Node name to number of operations map.
+    """
+    ops = {}
+    infer_shapes = tpass.infer_shape(model.symbol, model.params)
+    def _impl(op, **kwargs):
+        ops[op.attr('name')] = apply_pass("calculate_ops")(op, **kwargs)
+    sutils.topo_visit_transformer(
+        model.symbol, model.params, _impl, infer_shapes=infer_shapes)
+    return ops
+
+def load_batches(dataset, iter_num, cache_file=None):
+    """
+    Load the fixed evaluation subset, which is cached in `.npz` file.
+
+    Parameters
+    ----------
+    dataset : mrt.dataset.Dataset
+        The dataset to draw the batches from.
+    iter_num : int
+        Number of batches.
+    cache_file : str
+        The cache file, reused if it holds enough batches of the same shape.
+
+    Returns
+    -------
+    batches : list
+        List of (data, label) numpy array pairs.
+    """
+    if cache_file is not None and path.exists(cache_file):
+        with np.load(cache_file) as cache:
+            num = len(cache.files) // 2
+            if num >= iter_num and \
+                cache["data_0"].shape == tuple(dataset.ishape):
+                return [(cache["data_%d" % i], cache["label_%d" % i]) \
+                        for i in range(iter_num)]
+    data_iter_func = dataset.iter_func()
+    batches = []
+    for _ in range(iter_num):
+        data, label = data_iter_func()
+        batches.append((data.asnumpy(), label.asnumpy()))
+    if cache_file is not None:
+        arrays = {}
+        for i, (data, label) in enumerate(batches):
+            arrays["data_%d" % i], arrays["label_%d" % i] = data, label
+        np.savez(cache_file, **arrays)
+    return batches
+
+
+class SensitivityAnalyzer:
+    """
+    Evaluator of the quantization variants of one calibrated model.
+
+    Parameters
+    ----------
+    mrt : mrt.transformer.MRT
+        The calibrated mrt instance, which is never modified.
+    dataset : mrt.dataset.Dataset
+        The dataset providing metrics and validation.
+    batches : list
+        The cached (data, label) numpy array pairs.
+    ctx : list
+        List of mxnet contexts.
+    quant_cfg : yacs.config.CfgNode
+        CfgNode of quantization stage, the hyper parameters of which
+        are applied to every variant.
+    """
+    def __init__(self, mrt, dataset, batches, ctx, quant_cfg):
+        self.mrt = mrt
+        self.dataset = dataset
+        self.batches = batches
+        self.ctx = [ctx] if isinstance(ctx, mx.Context) else ctx
+        self.quant_cfg = quant_cfg
+        self.baxis = get_batch_axis(dataset.ishape)
+        self.olen = len(mrt.current_model.symbol)
+        self.base_restore_names = get_restore_names(
+            mrt.current_model.symbol, quant_cfg.RESTORE_NAMES)
+
+    def variant(self, restore_names=(), op_precs=None):
+        """
+        Quantize the calibrated model with extra restored nodes or
+        operator input precisions.
+
+        Returns
+        -------
+        mrt : mrt.transformer.MRT
+            The quantized mrt instance.
+        """
+        base, cfg = self.mrt, self.quant_cfg
+        mrt = MRT(base.current_model)
+        mrt.old_names = list(base.old_names)
+        mrt.th_dict = dict(base.th_dict)
+        mrt.precs = copy.deepcopy(base.precs)
+        mrt.scales = dict(base.scales)
+        for name in self.base_restore_names | set(restore_names):
+            mrt.set_restore(name)
+        if cfg.INPUT_PRECISION is not None:
+            mrt.set_input_prec(cfg.INPUT_PRECISION)
+        if cfg.OUTPUT_PRECISION is not None:
+            mrt.set_output_prec(cfg.OUTPUT_PRECISION)
+        if cfg.SOFTMAX_LAMBD is not None:
+            mrt.set_softmax_lambd(cfg.SOFTMAX_LAMBD)
+        if cfg.SHIFT_BITS is not None:
+            mrt.set_shift_bits(cfg.SHIFT_BITS)
+        for name, threshold in cfg.THRESHOLDS:
+            mrt.set_threshold(name, threshold)
+        if op_precs:
+            mrt.op_input_precs.update(op_precs)
+        mrt.quantize()
+        return mrt
+
+    def evaluate(self, restore_names=(), op_precs=None):
+        """
+        Accuracy of the quantization variant on the cached batches.
+
+        Returns
+        -------
+        acc : str
+            The dataset validation result.
+        """
+        mrt = self.variant(restore_names, op_precs)
+        oscales, inputs_ext = mrt.get_output_scales(), mrt.get_inputs_ext()
+        qgraph = mrt.current_model.to_graph(ctx=self.ctx)
+        metric = self.dataset.metrics()
+        acc = None
+        for data, label in self.batches:
+            data = sim.load_real_data(
+                nd.array(data), 'data', inputs_ext)
+            outs = forward(qgraph, data, self.ctx, self.baxis, self.olen)
+            outs = outs / oscales[0] if self.olen == 1 \
+                else [(t / oscales[i]) for i, t in enumerate(outs)]
+            acc = self.dataset.validate(metric, outs, nd.array(label))
+        return acc
+
+    def evaluate_float(self, model):
+        """
+        Accuracy of the floating model on the cached batches.
+        """
+        graph = model.to_graph(ctx=self.ctx)
+        metric = self.dataset.metrics()
+        olen = len(model.symbol)
+        acc = None
+        for data, label in self.batches:
+            outs = forward(graph, nd.array(data), self.ctx, self.baxis, olen)
+            acc = self.dataset.validate(metric, outs, nd.array(label))
+        return acc
+
+
+def _load_analyzer(cm_cfg, quant_cfg, pass_cfg, batches, logger):
+    model_dir, model_name = cm_cfg.MODEL_DIR, cm_cfg.MODEL_NAME
+    model_prefix = get_model_prefix(model_dir, model_name)
+    conf_calib_file = model_prefix + ".calibrate.conf"
+    check_file_existance(conf_calib_file, logger=logger)
+    conf_map = load_conf(conf_calib_file, logger=logger)
+    if conf_map.get("split_keys", "") != "":
+        raise RuntimeError(
+            "sensitivity analysis of split model is not supported")
+    check_file_existance(*load_fname(
+        model_prefix, suffix="mrt.calibrate", with_ext=True), logger=logger)
+    mrt = MRT.load(model_name+".mrt.calibrate", datadir=model_dir)
+
+    batch = pass_cfg.BATCH or cm_cfg.BATCH
+    device_type = pass_cfg.DEVICE_TYPE or cm_cfg.DEVICE_TYPE
+    device_ids = pass_cfg.DEVICE_IDS or cm_cfg.DEVICE_IDS
+    dataset = ds.DS_REG[conf_map["dataset_name"]](
+        set_batch(conf_map["input_shape"], batch))
+    if batches is None:
+        batches = load_batches(dataset, pass_cfg.ITER_NUM,
+                               cache_file=model_prefix+".sensitivity.npz")
+    ctx = get_ctx(device_type, device_ids)
+    return SensitivityAnalyzer(mrt, dataset, batches, ctx, quant_cfg)
+
+_WORKER = {}
+
+def _init_worker(cm_cfg, quant_cfg, pass_cfg):
+    logger = logging.getLogger("mrt.sensitivity")
+    _WORKER["analyzer"] = _load_analyzer(
+        cm_cfg, quant_cfg, pass_cfg, None, logger)
+
+def _run_candidate(candidate):
+    analyzer = _WORKER["analyzer"]
+    return analyzer.evaluate(candidate["restore"], candidate["precs"])
+
+def get_candidates(mrt, pass_cfg):
+    """
+    Candidate list of the sensitivity analysis.
+
+    Returns
+    -------
+    candidates : list
+        List of dict with `name`, `kind`, `restore` node names and
+        `precs` operator input precisions.
+    """
+    symbol = mrt.current_model.symbol
+    names = pass_cfg.CANDIDATES
+    if not names:
+        names = ["_OP_" + op_name for op_name in default_candidate_ops]
+    candidates = []
+    for name in names:
+        for node in sorted(get_restore_names(symbol, [name])):
+            candidates.append({"name": node, "kind": "restore",
+                               "restore": [node], "precs": {}})
+    for op_name, prec in pass_cfg.PRECISIONS:
+        candidates.append({"name": "{}@{}".format(op_name, prec),
+                           "kind": "precision", "restore": [],
+                           "precs": {op_name: int(prec)}})
+    return candidates
+
+def format_table(rows):
+    """
+    Format the ranked rows into a text table.
+    """
+    fmt = "{:>4} {:<40} {:<9} {:>8} {:>8} {:>12} {:>10}"
+    lines = [fmt.format("rank", "candidate", "kind", "score",
+                        "delta", "cost(ops)", "delta/Gop")]
+    for i, row in enumerate(rows):
+        lines.append(fmt.format(
+            i, row["name"][:40], row["kind"], "%.2f" % row["score"],
+            "%+.2f" % row["delta"], row["cost"],
+            "%.3f" % row["efficiency"]))
+    return "\n".join(lines)
+
+def sensitivity(cm_cfg, pass_cfg, quant_cfg=None, logger=None):
+    """
+    YAML configuration API of MRT sensitivity analysis.
+
+    Parameters
+    ----------
+    cm_cfg : yacs.config.CfgNode
+        CfgNode of common stage.
+    pass_cfg : yacs.config.CfgNode
+        CfgNode of sensitivity analysis.
+    quant_cfg : yacs.config.CfgNode
+        CfgNode of quantization stage, defaults to `MRT_CFG.QUANTIZE`.
+    logger : logging.RootLogger
+        Console logger.
+
+    Returns
+    -------
+    rows : list
+        The candidates ranked by accuracy and cost descendingly.
+    """
+    if logger is None:
+        logger = get_logger(cm_cfg.VERBOSITY)
+    if quant_cfg is None:
+        quant_cfg = MRT_CFG.QUANTIZE
+    model_prefix = get_model_prefix(cm_cfg.MODEL_DIR, cm_cfg.MODEL_NAME)
+    analyzer = _load_analyzer(cm_cfg, quant_cfg, pass_cfg, None, logger)
+    logger.info("sensitivity analysis on %d cached batches",
+                len(analyzer.batches))
+
+    omodel = Model.load(*load_fname(model_prefix + ".fixed"))
+    float_acc = analyzer.evaluate_float(omodel)
+    base_acc = analyzer.evaluate()
+    base_score = get_score(base_acc)
+    logger.info("float: %s | quantized: %s", float_acc, base_acc)
+
+    candidates = get_candidates(analyzer.mrt, pass_cfg)
+    num_workers = max(1, pass_cfg.NUM_WORKERS)
+    logger.info("evaluating %d candidates with %d workers",
+                len(candidates), num_workers)
+    if num_workers == 1:
+        results = [analyzer.evaluate(c["restore"], c["precs"]) \
+                   for c in candidates]
+    else:
+        # spawn workers to avoid forking the initialized mxnet engine
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(cm_cfg, quant_cfg, pass_cfg)) as executor:
+            results = list(executor.map(_run_candidate, candidates))
+
+    ops = layer_ops(analyzer.mrt.current_model)
+    op_types = {s.attr('name'): s.attr('op_name') \
+                for s in sutils.topo_sort(analyzer.mrt.current_model.symbol)}
+    rows = []
+    for c, acc in zip(candidates, results):
+        if c["kind"] == "restore":
+            cost = sum(ops.get(n, 0) for n in c["restore"])
+        else:
+            cost = sum(v for n, v in ops.items() \
+                       if op_types.get(n, None) in c["precs"])
+        score = get_score(acc)
+        delta = score - base_score
+        rows.append({"name": c["name"], "kind": c["kind"], "acc": acc,
+                     "score": score, "delta": delta, "cost": int(cost),
+                     "efficiency": delta * 1e9 / cost if cost > 0 else 0.})
+    rows.sort(key=lambda r: (-r["delta"], r["cost"]))
+
+    logger.info("sensitivity ranking:\n%s", format_table(rows))
+    output_file = pass_cfg.OUTPUT_FILE
+    if output_file is None:
+        output_file = model_prefix + ".sensitivity.json"
+    with open(output_file, "w") as fout:
+        json.dump({"float": float_acc, "quantized": base_acc,
+                   "candidates": rows}, fout, indent=2)
+    logger.info("sensitivity analysis finished, dumped into %s",
+                output_file)
+    return rows
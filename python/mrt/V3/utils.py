@@ -19,7 +19,7 @@ from mrt.utils import extend_fname
 
 DOC = """
 COMMON Stage Options:
-    --common.pass_name          Stage to be executed, chosen from "all", "prepare", "calibrate", "quantize", "evaluate", "compile".
+    --common.pass_name          Stage to be executed, chosen from "all", "prepare", "calibrate", "quantize", "evaluate", "compile", "sensitivity".
     --common.model_dir          Model root directory.
     --common.model_name         Name of the model file without file extension.
     --common.verbosity          Control the logger hiearchy, chosen from "debug", "info", "warning", "error", "critical".
@@ -30,6 +30,7 @@ COMMON Stage Options:
     --common.batch              Default batch size for all stages.
     --common.run_evaluate       Flag for determining whether to execute evaluation stage, "True" for execution, otherwise "False".
     --common.run_compile        Flag for determining whether to execute compilation stage, "True" for execution, otherwise "False".
+    --common.trace_file         Chrome trace file to dump the stage, pass and operator spans into, tracing is disabled if not specified.
 """
 
 # TODO: jiazhen branch code design
@@ -51,6 +52,7 @@ MRT_CFG.COMMON.DEVICE_IDS = default_device_ids
 MRT_CFG.COMMON.BATCH = default_batch
 MRT_CFG.COMMON.RUN_EVALUATE = True
 MRT_CFG.COMMON.RUN_COMPILE = True
+MRT_CFG.COMMON.TRACE_FILE = None
 
 def get_model_prefix(model_dir, model_name):
     """
@@ -0,0 +1,164 @@
+""" Structured Tracing of Nested Spans
+
+    Spans are recorded as Chrome trace complete events, nested by the
+    time range on each thread, such as stage -> pass -> op type:
+
+    .. code-block:: python
+
+        from mrt.common import trace
+
+        trace.enable()
+        with trace.span("calibrate", cat="stage"):
+            ...
+        trace.export_chrome_trace("mrt.trace.json")
+
+    The exported file can be loaded in `chrome://tracing` or perfetto.
+    Tracing is disabled by default, and `span` returns a shared no-op
+    context manager then, which costs a global flag check only.
+"""
+
+import os
+import json
+import time
+import threading
+
+__all__ = ["enable", "disable", "is_enabled", "reset",
+           "span", "traced", "events", "summary",
+           "export_chrome_trace", "export_json"]
+
+_enabled = False
+_lock = threading.Lock()
+_events = []
+_local = threading.local()
+_origin = time.perf_counter()
+
+def enable(flag=True):
+    """ Turn on (or off) span recording. """
+    global _enabled
+    _enabled = bool(flag)
+
+def disable():
+    enable(False)
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """ Clear all the recorded events. """
+    with _lock:
+        del _events[:]
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span(object):
+    """ Recording span, use :func:`span` instead of instantiating. """
+    __slots__ = ["name", "cat", "args", "start", "depth"]
+
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        end = time.perf_counter()
+        _local.stack.pop()
+        event = {
+            "name": self.name, "cat": self.cat, "ph": "X",
+            "ts": (self.start - _origin) * 1e6,
+            "dur": (end - self.start) * 1e6,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        with _lock:
+            _events.append(event)
+        return False
+
+    def set(self, **args):
+        """ Attach extra arguments to the span. """
+        if self.args is None:
+            self.args = {}
+        self.args.update(args)
+
+def span(name, cat="mrt", **args):
+    """ Context manager recording the enclosed code as a span.
+
+        Parameters
+        __________
+        name : str
+            The span name, such as stage, pass or op type name.
+        cat : str
+            The category of span, such as "stage", "pass" or "op".
+        args : dict
+            Extra json-serializable arguments of span.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, cat, args or None)
+
+def traced(name=None, cat="mrt"):
+    """ Decorator recording each call of function as a span. """
+    def wrapper(func):
+        span_name = func.__name__ if name is None else name
+        def _run(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, cat, None):
+                return func(*args, **kwargs)
+        _run.__name__, _run.__doc__ = func.__name__, func.__doc__
+        _run.__wrapped__ = func
+        return _run
+    return wrapper
+
+def events():
+    """ Copy of the recorded events. """
+    with _lock:
+        return list(_events)
+
+def summary():
+    """ Aggregate the events by category and name.
+
+        Returns
+        _______
+        ret : list of dict
+            Items with `cat`, `name`, `count`, `total_ms` and
+            `max_ms`, sorted by total time descendingly.
+    """
+    stats = {}
+    for e in events():
+        key = (e["cat"], e["name"])
+        item = stats.setdefault(key, {"cat": e["cat"], "name": e["name"],
+            "count": 0, "total_ms": 0., "max_ms": 0.})
+        item["count"] += 1
+        item["total_ms"] += e["dur"] / 1e3
+        item["max_ms"] = max(item["max_ms"], e["dur"] / 1e3)
+    return sorted(stats.values(), key=lambda x: -x["total_ms"])
+
+def export_chrome_trace(fname):
+    """ Dump events in Chrome trace event format. """
+    with open(fname, "w") as fout:
+        json.dump({"traceEvents": events(),
+                   "displayTimeUnit": "ms"}, fout)
+
+def export_json(fname):
+    """ Dump the aggregated summary in json. """
+    with open(fname, "w") as fout:
+        json.dump(summary(), fout, indent=2)
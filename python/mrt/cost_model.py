@@ -0,0 +1,324 @@
+""" Per-layer Cost Model and Roofline Report.
+
+    Every operator of the graph is summarized with the number of
+    operations from the `calculate_ops` pass, the multiply-accumulates
+    of the dense operators, the parameter bytes, the activation bytes
+    read and written, and the arithmetic intensity. The latency is
+    predicted with the roofline model of the target machine:
+
+    .. math::
+        t = \\max(ops / peak, bytes / bandwidth)
+
+    and could be calibrated against the per-op times measured by CVM
+    runtime built with `PROFILE`, which prints the op time table.
+
+    The report is plain python lists and dicts, dumped as text table or
+    json. Command line usage:
+
+    .. code-block:: bash
+
+        python -m mrt.cost_model model.json model.params \\
+            --input-shape 1 3 224 224 --top 20 --json cost.json
+"""
+
+import re
+import json
+import argparse
+import logging
+
+import numpy as np
+import mxnet as mx
+from mxnet import ndarray as nd
+
+from .sym_utils import sym_iter, get_entry_id, is_params, \
+                       topo_visit_transformer
+from .tfm_base import apply_pass
+from . import tfm_pass as tpass
+from . import tfm_ops  # pylint: disable=unused-import
+
+__all__ = ["layer_costs", "roofline", "parse_cvm_profile", "calibrate",
+           "format_table", "dump_json"]
+
+CVM_OP_MAP = {
+    "Convolution": "conv2d",
+    "FullyConnected": "dense",
+    "Pooling": "max_pool2d",
+    "relu": "relu",
+    "Activation": "relu",
+    "broadcast_add": "broadcast_add",
+    "broadcast_sub": "broadcast_sub",
+    "broadcast_mul": "broadcast_mul",
+    "elemwise_add": "elemwise_add",
+    "elemwise_sub": "elemwise_sub",
+    "Concat": "concatenate",
+    "Flatten": "flatten",
+    "flatten": "flatten",
+    "Reshape": "reshape",
+    "transpose": "transpose",
+    "slice": "strided_slice",
+    "clip": "clip",
+    "sum": "sum",
+    "max": "max",
+    "UpSampling": "upsampling",
+    "Embedding": "take",
+    "repeat": "repeat",
+    "tile": "tile",
+    "where": "where",
+}
+""" MRT operator name to CVM runtime operator name map. """
+
+def _size(shape):
+    return int(np.prod(shape, dtype="int64"))
+
+def _macs(op, infer_shapes):
+    op_name = op.attr('op_name')
+    childs = sym_iter(op.get_children())
+    osize = _size(infer_shapes[op.attr('name')][get_entry_id(op)])
+    if op_name in ["Convolution", "FullyConnected"]:
+        W = childs[1]
+        wshp = infer_shapes[W.attr('name')][get_entry_id(W)]
+        return osize * _size(wshp[1:])
+    if op_name == "batch_dot":
+        A = childs[0]
+        ashp = infer_shapes[A.attr('name')][get_entry_id(A)]
+        transpose_a = op.list_attr().get('transpose_a', 'False') == 'True'
+        return osize * ashp[-2 if transpose_a else -1]
+    return 0
+
+def layer_costs(symbol, params, input_shape=None, bytes_per_elem=4):
+    """ Collect the cost of each operator in the graph.
+
+        Parameters
+        __________
+        symbol : mxnet.symbol
+            The graph symbols.
+        params : dict
+            The graph parameters dict.
+        input_shape : tuple
+            The input shape of the data, the attached shape is used
+            if not specified.
+        bytes_per_elem : int
+            Bytes of each tensor element, 4 for float32 model and
+            1 for the 8-bit quantized model.
+
+        Returns
+        _______
+        rows : list of dict
+            Cost of each operator in topological order, with keys
+            `name`, `op_name`, `ops`, `macs`, `param_bytes`,
+            `read_bytes`, `write_bytes` and `intensity`.
+    """
+    infer_shapes = tpass.infer_shape(symbol, params, input_shape)
+    rows = []
+    def _impl(op, **kwargs):
+        name, op_name = op.attr('name'), op.attr('op_name')
+        if op_name == 'null':
+            return
+        childs = sym_iter(op.get_children()) or []
+        param_elems, read_elems = 0, 0
+        for c in childs:
+            csize = _size(infer_shapes[c.attr('name')][get_entry_id(c)])
+            if is_params(c, params):
+                param_elems += csize
+            else:
+                read_elems += csize
+        write_elems = sum(_size(shp) for shp in infer_shapes[name])
+        ops = int(apply_pass("calculate_ops")(op, **kwargs))
+        nbytes = (param_elems + read_elems + write_elems) * bytes_per_elem
+        rows.append({
+            "name": name, "op_name": op_name, "ops": ops,
+            "macs": int(_macs(op, infer_shapes)),
+            "param_bytes": param_elems * bytes_per_elem,
+            "read_bytes": read_elems * bytes_per_elem,
+            "write_bytes": write_elems * bytes_per_elem,
+            "intensity": ops / nbytes if nbytes else 0.,
+        })
+    topo_visit_transformer(symbol, params, _impl,
+                           infer_shapes=infer_shapes)
+    return rows
+
+def roofline(rows, peak_gops=100., bandwidth_gbs=20.):
+    """ Predict the latency of each operator with roofline model.
+
+        Parameters
+        __________
+        rows : list of dict
+            The result of :func:`layer_costs`, updated in place with
+            `predicted_ms` and `bound`, either "compute" or "memory".
+        peak_gops : float
+            The peak arithmetic throughput, in giga operations/second.
+        bandwidth_gbs : float
+            The memory bandwidth, in gigabytes/second.
+
+        Returns
+        _______
+        rows : list of dict
+    """
+    balance = peak_gops / bandwidth_gbs
+    for row in rows:
+        nbytes = row["param_bytes"] + row["read_bytes"] + row["write_bytes"]
+        compute_ms = row["ops"] / peak_gops / 1e6
+        memory_ms = nbytes / bandwidth_gbs / 1e6
+        row["predicted_ms"] = max(compute_ms, memory_ms)
+        row["bound"] = "compute" if row["intensity"] >= balance \
+            else "memory"
+    return rows
+
+_PROFILE_MARK = re.compile(r"^\s*-+op time metrix-+\s*$")
+_PROFILE_LINE = re.compile(r"^\s*(\S+)\s*:\s*([\d.eE+-]+)s\s+([\d.]+)%\s*$")
+
+def parse_cvm_profile(text):
+    """ Parse the op time table printed by CVM runtime built with PROFILE.
+
+        The runtime accumulates the op times over all the runs and
+        prints the running totals after every run, so only the last
+        complete table of the log is kept, which holds the times of
+        all the runs of one runtime instance.
+
+        Returns
+        _______
+        times : dict
+            CVM operator name to the total seconds map.
+    """
+    times, table = {}, None
+    for line in text.splitlines():
+        if _PROFILE_MARK.match(line):
+            # the table is enclosed by a pair of marks
+            if table is None:
+                table = {}
+            else:
+                times, table = table, None
+            continue
+        match = _PROFILE_LINE.match(line)
+        if match and table is not None:
+            table[match.group(1)] = float(match.group(2))
+    return times
+
+def calibrate(rows, measured, op_map=CVM_OP_MAP, runs=1):
+    """ Calibrate the predicted latency with measured per-op times.
+
+        The predicted times are scaled by a factor for each operator
+        type so that the totals match the measured ones, the operators
+        not measured share the overall factor.
+
+        Parameters
+        __________
+        rows : list of dict
+            The result of :func:`roofline`, updated in place with
+            `calibrated_ms`.
+        measured : dict
+            CVM operator name to the total seconds map, such as the
+            result of :func:`parse_cvm_profile`.
+        op_map : dict
+            MRT operator name to CVM operator name map.
+        runs : int
+            The number of inferences accumulated in `measured`, that
+            is the runs of the runtime printing the profile log.
+
+        Returns
+        _______
+        factors : dict
+            CVM operator name to the calibration factor map.
+    """
+    predicted = {}
+    for row in rows:
+        cop = op_map.get(row["op_name"], None)
+        if cop in measured:
+            predicted[cop] = predicted.get(cop, 0.) + row["predicted_ms"]
+    factors = {cop: measured[cop] * 1e3 / runs / ms \
+               for cop, ms in predicted.items() if ms > 0}
+    total_pred = sum(predicted.values())
+    total_meas = sum(measured[cop] for cop in predicted) * 1e3 / runs
+    default = total_meas / total_pred if total_pred > 0 else 1.
+    for row in rows:
+        cop = op_map.get(row["op_name"], None)
+        row["calibrated_ms"] = row["predicted_ms"] * \
+            factors.get(cop, default)
+    return factors
+
+_COLUMNS = [
+    ("name", "{:<36}", lambda v: v[:36]),
+    ("op_name", "{:<16}", lambda v: v[:16]),
+    ("ops", "{:>12}", "{:d}".format),
+    ("macs", "{:>12}", "{:d}".format),
+    ("param_bytes", "{:>12}", "{:d}".format),
+    ("read_bytes", "{:>12}", "{:d}".format),
+    ("write_bytes", "{:>12}", "{:d}".format),
+    ("intensity", "{:>9}", "{:.2f}".format),
+    ("bound", "{:>8}", str),
+    ("predicted_ms", "{:>12}", "{:.4f}".format),
+    ("calibrated_ms", "{:>13}", "{:.4f}".format),
+]
+
+def format_table(rows, top=None, sort_key=None):
+    """ Format the cost rows into text table.
+
+        Parameters
+        __________
+        top : int
+            Only list the `top` rows after sorting.
+        sort_key : str
+            Sort the rows by the column descendingly, defaults to
+            the calibrated or predicted latency if present.
+    """
+    if sort_key is None and rows:
+        sort_key = "calibrated_ms" if "calibrated_ms" in rows[0] else \
+            "predicted_ms" if "predicted_ms" in rows[0] else None
+    if sort_key is not None:
+        rows = sorted(rows, key=lambda r: -r[sort_key])
+    if top is not None:
+        rows = rows[:top]
+    columns = [c for c in _COLUMNS if not rows or c[0] in rows[0]]
+    lines = [" ".join(fmt.format(key) for key, fmt, _ in columns)]
+    for row in rows:
+        lines.append(" ".join(fmt.format(conv(row[key])) \
+                     for key, fmt, conv in columns))
+    total = {k: sum(r[k] for r in rows) for k in \
+             ["ops", "macs", "predicted_ms", "calibrated_ms"] \
+             if rows and k in rows[0]}
+    lines.append("total: " + ", ".join(
+        "%s=%s" % (k, v if isinstance(v, int) else "%.4f" % v) \
+        for k, v in total.items()))
+    return "\n".join(lines)
+
+def dump_json(rows, fname, **meta):
+    """ Dump the cost rows with extra meta info into json file. """
+    with open(fname, "w") as fout:
+        json.dump(dict(meta, layers=rows), fout, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser("mrt.cost_model",
+        description="per-layer cost model and roofline report")
+    parser.add_argument("symbol_file", type=str)
+    parser.add_argument("params_file", type=str)
+    parser.add_argument("--input-shape", type=int, nargs="+", default=None)
+    parser.add_argument("--bytes-per-elem", type=int, default=4)
+    parser.add_argument("--peak-gops", type=float, default=100.)
+    parser.add_argument("--bandwidth-gbs", type=float, default=20.)
+    parser.add_argument("--profile-log", type=str, default=None,
+        help="stdout of CVM runtime built with PROFILE for calibration")
+    parser.add_argument("--profile-runs", type=int, default=1)
+    parser.add_argument("--top", type=int, default=None)
+    parser.add_argument("--sort-key", type=str, default=None)
+    parser.add_argument("--json", type=str, default=None)
+    args = parser.parse_args(argv)
+
+    symbol = mx.sym.load(args.symbol_file)
+    params = nd.load(args.params_file)
+    input_shape = None if args.input_shape is None \
+        else tuple(args.input_shape)
+    rows = layer_costs(symbol, params, input_shape, args.bytes_per_elem)
+    roofline(rows, args.peak_gops, args.bandwidth_gbs)
+    factors = {}
+    if args.profile_log is not None:
+        with open(args.profile_log, "r") as fin:
+            measured = parse_cvm_profile(fin.read())
+        factors = calibrate(rows, measured, runs=args.profile_runs)
+    print(format_table(rows, top=args.top, sort_key=args.sort_key))
+    if args.json is not None:
+        dump_json(rows, args.json, peak_gops=args.peak_gops,
+                  bandwidth_gbs=args.bandwidth_gbs, factors=factors)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
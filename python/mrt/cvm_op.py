@@ -157,6 +157,53 @@ class LUT(mx.operator.CustomOp):
     def backward(self, req, out_grad, in_data, out_data, in_grad, aux):
         assert False
 
+class Requant(mx.operator.CustomOp):
+    def __init__(self, precision, multiplier, shift_bit, **kwargs):
+        super(Requant, self).__init__(**kwargs)
+        clip = 2 ** (int(precision) - 1) - 1
+        self.min = int(-clip)
+        self.max = int(clip)
+        self.mul = int(multiplier)
+        self.sb = int(shift_bit)
+        assert self.mul > 0
+
+    def forward(self, is_train, req, in_data, out_data, aux):
+        """ MxNet customized operator forward implementation.
+
+            Fused requantization, equivalent to the chain of
+            `broadcast_mul` with the constant multiplier, the
+            `cvm_right_shift` (positive sb) or `cvm_left_shift`
+            (negative sb) and `cvm_clip`.
+
+            .. math::
+                val = round(X) * mul
+
+            .. math::
+                out = clip(shift(val, sb), -2^{prec}, 2^{prec})
+
+            where the shift is the same as :class:`RightShift` or
+            :class:`LeftShift`.
+        """
+        assert is_train == False
+        X = in_data[0]
+        out = X.round()
+        if self.mul > 1:
+            out = out * self.mul
+        if self.sb > 1:
+            out = out / (2 ** (self.sb-1))
+            out = out.floor()
+        if self.sb > 0:
+            out = out + 1
+            out = out / 2
+            out = out.floor()
+        elif self.sb < 0:
+            out = out * (2 ** (-self.sb))
+        out = out.clip(a_min=self.min, a_max=self.max)
+        self.assign(out_data[0], req[0], out)
+
+    def backward(self, req, out_grad, in_data, out_data, in_grad, aux):
+        assert False
+
 class RightShiftV2(mx.operator.CustomOp):
     def __init__(self, shift_bit, **kwargs):
         super(RightShiftV2, self).__init__(**kwargs)
@@ -288,6 +335,29 @@ class RightShiftProp(mx.operator.CustomOpProp):
     def create_operator(self, ctx, shapes, dtypes):
         return RightShift(self.precision, self.shift_bit)
 
+@mx.operator.register("cvm_requant")
+class RequantProp(mx.operator.CustomOpProp):
+    """ MxNet cvm_requant operator property class.
+    """
+    def __init__(self, precision=8, multiplier=1, shift_bit=0):
+        self.precision= precision
+        self.multiplier = multiplier
+        self.shift_bit = shift_bit
+        super(RequantProp, self).__init__(need_top_grad=False)
+    def list_arguments(self):
+        return ['data']
+    def list_outputs(self):
+        return ['output']
+    def infer_shape(self, in_shape):
+        X_shape = in_shape[0]
+        out_shape = in_shape[0]
+        return [X_shape], [out_shape], []
+    def infer_type(self, in_type):
+        X_type = in_type[0]
+        return [X_type], [X_type], []
+    def create_operator(self, ctx, shapes, dtypes):
+        return Requant(self.precision, self.multiplier, self.shift_bit)
+
 @mx.operator.register("right_shift")
 class RightShiftV2Prop(mx.operator.CustomOpProp):
     """ MxNet right_shift operator property class.
@@ -415,6 +485,139 @@ class PadProp(mx.operator.CustomOpProp):
         return Pad(self.padding)
 
 
-
-
+# === native symbol compositions of the custom ops ===
+#
+# Every custom op above is equivalent to a short composition of
+# builtin MxNet operators, which runs inside the MxNet engine and
+# avoids the GIL-bound python CustomOp callback and NDArray copies.
+
+_native_ops = {}
+
+def register_native(op_type):
+    def wrapper(func):
+        _native_ops[op_type] = func
+        return func
+    return wrapper
+
+@register_native("cvm_clip")
+def _native_clip(X, precision=8, **kwargs):
+    clip = float(2 ** (int(precision) - 1) - 1)
+    return mx.sym.clip(mx.sym.round(X), a_min=-clip, a_max=clip)
+
+@register_native("cvm_left_shift")
+def _native_left_shift(X, precision=8, shift_bit=0, **kwargs):
+    clip, sb = float(2 ** (int(precision) - 1) - 1), int(shift_bit)
+    assert sb > 0
+    out = mx.sym.round(X) * float(2 ** sb)
+    return mx.sym.clip(out, a_min=-clip, a_max=clip)
+
+@register_native("cvm_right_shift")
+def _native_right_shift(X, precision=8, shift_bit=0, **kwargs):
+    clip, sb = float(2 ** (int(precision) - 1) - 1), int(shift_bit)
+    assert sb > 0
+    out = mx.sym.round(X)
+    if sb > 1:
+        out = mx.sym.floor(out * (1.0 / (2 ** (sb - 1))))
+    out = mx.sym.floor((out + 1) * 0.5)
+    return mx.sym.clip(out, a_min=-clip, a_max=clip)
+
+@register_native("cvm_requant")
+def _native_requant(X, precision=8, multiplier=1, shift_bit=0, **kwargs):
+    clip, sb = float(2 ** (int(precision) - 1) - 1), int(shift_bit)
+    out = mx.sym.round(X)
+    if int(multiplier) > 1:
+        out = out * float(multiplier)
+    if sb > 1:
+        out = mx.sym.floor(out * (1.0 / (2 ** (sb - 1))))
+    if sb > 0:
+        out = mx.sym.floor((out + 1) * 0.5)
+    elif sb < 0:
+        out = out * float(2 ** -sb)
+    return mx.sym.clip(out, a_min=-clip, a_max=clip)
+
+@register_native("right_shift")
+def _native_right_shift_v2(X, shift_bit=0, **kwargs):
+    sb = int(shift_bit)
+    assert sb > 0
+    out = mx.sym.round(X)
+    if sb > 1:
+        out = mx.sym.round(out * (1.0 / (2 ** sb)))
+    return out
+
+@register_native("cvm_lut")
+def _native_lut(X, T, in_dim, **kwargs):
+    out = mx.sym.Embedding(X, T, input_dim=int(in_dim), output_dim=1)
+    return mx.sym.squeeze(out, axis=-1)
+
+@register_native("cvm_sim_quant")
+def _native_sim_quant(X, scale, **kwargs):
+    return X * float(scale)
+
+@register_native("mrt_sim_quant")
+def _native_mrt_sim_quant(X, sb, **kwargs):
+    return X * (1.0 / (2 ** int(sb)))
+
+@register_native("cvm_annotate")
+def _native_annotate(X, **kwargs):
+    return X
+
+@register_native("cvm_pad")
+def _native_pad(X, padding, **kwargs):
+    """ Zero padding of the output shape declared by `PadProp`,
+        lowered as `_fuse_pad` of the tensorflow frontend does.
+    """
+    padding = [(int(b), int(a)) for b, a in eval(padding)]
+    if len(padding) in [4, 5] and not any(padding[0] + padding[1]):
+        pad_width = tuple(p for pad in padding for p in pad)
+        return mx.sym.pad(X, mode='constant', pad_width=pad_width)
+    # mx.sym.pad only supports the last 2/3 axes of 4-D/5-D data,
+    # concatenate the zero slices along each padded axis instead.
+    for axis, (before, after) in enumerate(padding):
+        if before == 0 and after == 0:
+            continue
+        zero = mx.sym.zeros_like(mx.sym.slice_axis(
+            X, axis=axis, begin=0, end=1))
+        parts = [X]
+        if before > 0:
+            parts.insert(0, mx.sym.repeat(zero, repeats=before, axis=axis))
+        if after > 0:
+            parts.append(mx.sym.repeat(zero, repeats=after, axis=axis))
+        X = mx.sym.concat(*parts, dim=axis)
+    return X
+
+def lower_custom_ops(symbol):
+    """ Rewrite the custom ops into equivalent native compositions.
+
+        The rewritten symbol is only used for forward computing,
+        the node names of custom ops are preserved on the last
+        operator of the composition.
+
+        Parameters
+        __________
+        symbol : mxnet.symbol
+            The graph symbol that may contain custom ops.
+
+        Returns
+        _______
+        ret : mxnet.symbol
+            The graph symbol without custom ops.
+    """
+    from .sym_utils import topo_sort, sym_iter, get_node, get_mxnet_op
+
+    graph = {}
+    for op in topo_sort(symbol):
+        name, op_name = op.attr('name'), op.attr('op_name')
+        childs, attr = sym_iter(op.get_children()), op.list_attr()
+        if childs is not None:
+            childs = [get_node(c, graph) for c in childs]
+            op_type = attr.get('op_type', None)
+            if op_name == 'Custom' and op_type in _native_ops:
+                attr = {k: v for k, v in attr.items() if k != 'op_type'}
+                op = _native_ops[op_type](*childs, **attr)
+                op = mx.sym.identity(op, name=name)
+            else:
+                op = get_mxnet_op(op_name)(*childs, **attr, name=name)
+        graph[name] = op
+    nodes = [get_node(s, graph) for s in symbol]
+    return nodes[0] if len(nodes) == 1 else mx.sym.Group(nodes)
 
@@ -0,0 +1,249 @@
+""" Streaming Layer-wise Comparison of Float and Quantized Models.
+
+    The float model and the quantized model are executed node by node
+    in lockstep on the same batch, the outputs of nodes with the same
+    name are compared on the fly after rescaling the quantized ones
+    into float, i.e. :math:`Q_X / scale_X`. An activation is released
+    once both of the graph consumers and the comparison have finished,
+    so that the peak memory stays around a single forward of each model
+    instead of dumping every layer to disk.
+
+    The quantized model can be run either by MxNet with the MRT custom
+    ops, or by :class:`mrt.np_executor.NumpyExecutor` which follows the
+    integer semantics of the CVM runtime.
+
+    .. code-block:: python
+
+        diffs = compare_models(
+            prepared_model, mrt.current_model, data, mrt.scales,
+            inputs_ext=mrt.get_inputs_ext(), tolerance=0.1)
+        print(format_report(diffs))
+"""
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+import mxnet as mx
+from mxnet import ndarray as nd
+
+from .sym_utils import topo_sort, sym_iter, get_entry_id, get_nd_op, \
+                       is_inputs
+from .np_executor import NumpyExecutor
+from . import sim_quant_helper as sim
+
+__all__ = ["LayerDiff", "iter_nd_outputs", "layer_metrics",
+           "compare_streams", "compare_models", "format_report"]
+
+LayerDiff = namedtuple("LayerDiff", ["name", "op_name", "index", "shape",
+                                     "cosine", "max_abs", "rel_l2"])
+LayerDiff.__doc__ = """ Error metrics of one output of a node.
+
+    `rel_l2` is the L2 norm of the error relative to the reference
+    output norm, and `index` is the output entry index of the node.
+"""
+
+def iter_nd_outputs(symbol, params, inputs, ctx=mx.cpu()):
+    """ Run the graph with MxNet ndarray ops node by node.
+
+        The output of a node is released as soon as all its consumers
+        have been computed.
+
+        Parameters
+        __________
+        symbol : mxnet.symbol
+            The graph symbols.
+        params : dict
+            The graph parameters dict.
+        inputs : dict
+            The input name to mxnet.NDArray dict.
+
+        Returns
+        _______
+        ret : generator
+            Yield (name, op_name, outputs) for each operator.
+    """
+    order, deps = topo_sort(symbol, with_deps=True)
+    deps = {k: set(v) for k, v in deps.items()}
+    heads = {s.attr('name') for s in symbol}
+    out_cache = {}
+    for op in order:
+        name, op_name = op.attr('name'), op.attr('op_name')
+        childs, attr = sym_iter(op.get_children()), op.list_attr()
+        if op_name == 'null':
+            out_cache[name] = [inputs[name] if is_inputs(op, params) \
+                else params[name].as_in_context(ctx)]
+            continue
+        if childs is None:
+            out = get_nd_op(op_name)(**attr)
+        else:
+            cinfos = [(c.attr('name'), get_entry_id(c)) for c in childs]
+            out = get_nd_op(op_name)(
+                *[out_cache[n][i] for n, i in cinfos], **attr)
+        out = [out] if len(op) == 1 else list(out)
+        out_cache[name] = out
+        for cname in {c.attr('name') for c in childs or []}:
+            deps[cname].discard(name)
+            if not deps[cname] and cname not in heads:
+                del out_cache[cname]
+        if not deps.get(name, None) and name not in heads:
+            del out_cache[name]
+        yield name, op_name, out
+
+def _asnumpy(value):
+    if hasattr(value, "asnumpy"):
+        value = value.asnumpy()
+    return np.asarray(value, dtype="float64").ravel()
+
+def layer_metrics(ref, out):
+    """ Compute the cosine similarity, max absolute error and relative
+            L2 error of the output against the reference.
+    """
+    ref, out = _asnumpy(ref), _asnumpy(out)
+    diff = out - ref
+    ref_norm, out_norm = np.linalg.norm(ref), np.linalg.norm(out)
+    denom = ref_norm * out_norm
+    if denom > 0:
+        cosine = float(np.dot(ref, out) / denom)
+    else:
+        cosine = 1. if ref_norm == out_norm else 0.
+    max_abs = float(np.abs(diff).max()) if diff.size else 0.
+    diff_norm = float(np.linalg.norm(diff))
+    rel_l2 = diff_norm / ref_norm if ref_norm > 0 else \
+        (0. if diff_norm == 0 else float("inf"))
+    return cosine, max_abs, rel_l2
+
+def compare_streams(ref_iter, cmp_iter, names, scales=None, tolerance=None):
+    """ Compare two node output streams in lockstep.
+
+        The comparing stream drives the traversal, and the reference
+        stream is advanced until the same name shows up. Only the
+        reference outputs of `names` that are not compared yet are
+        buffered.
+
+        Parameters
+        __________
+        ref_iter : generator
+            The reference stream of (name, op_name, outputs).
+        cmp_iter : generator
+            The comparing stream of (name, op_name, outputs).
+        names : set
+            The node names to be compared.
+        scales : dict
+            The comparing outputs are divided by the node scales.
+        tolerance : float
+            Stop after the first node whose relative L2 error exceeds
+            the tolerance.
+
+        Returns
+        _______
+        ret : generator
+            Yield :class:`LayerDiff` of the compared node outputs.
+    """
+    logger = logging.getLogger("log.mrt.compare")
+    scales = {} if scales is None else scales
+    pending = {}
+    for name, op_name, outs in cmp_iter:
+        if name not in names:
+            continue
+        while name not in pending:
+            try:
+                rname, _, routs = next(ref_iter)
+            except StopIteration:
+                raise RuntimeError(
+                    "node %s is not found in reference stream" % name)
+            if rname in names:
+                pending[rname] = routs
+        routs = pending.pop(name)
+        scale = scales.get(name, 1)
+        stop = False
+        for i, (ref, out) in enumerate(zip(routs, outs)):
+            if ref.shape != out.shape:
+                logger.debug("skip %s[%d]: shape %s vs. %s",
+                             name, i, ref.shape, out.shape)
+                continue
+            if scale != 1:
+                out = _asnumpy(out) / scale
+            diff = LayerDiff(name, op_name, i, tuple(ref.shape),
+                             *layer_metrics(ref, out))
+            yield diff
+            if tolerance is not None and diff.rel_l2 > tolerance:
+                stop = True
+        del routs, outs
+        if stop:
+            logger.info("stop at node %s exceeding tolerance %s",
+                        name, tolerance)
+            return
+
+def _op_names(symbol):
+    return {s.attr('name') for s in topo_sort(symbol) \
+            if s.attr('op_name') != 'null'}
+
+def compare_models(fmodel, qmodel, data, scales, inputs_ext,
+                   executor="mxnet", ctx=mx.cpu(), tolerance=None):
+    """ Compare the float model and the quantized model layer by layer.
+
+        Parameters
+        __________
+        fmodel : mrt.transformer.Model
+            The float model before quantization, such as the prepared
+            or calibrated model, whose node names are kept in `qmodel`.
+        qmodel : mrt.transformer.Model
+            The quantized model.
+        data : mxnet.NDArray
+            The float input data.
+        scales : dict
+            The node scales of quantization, `MRT.scales`.
+        inputs_ext : dict
+            The input quantization info, `MRT.get_inputs_ext()`.
+        executor : str
+            The quantized model executor, "mxnet" or "numpy".
+        tolerance : float
+            Early stop relative L2 error, see :func:`compare_streams`.
+
+        Returns
+        _______
+        diffs : list of LayerDiff
+            The per-layer error metrics in quantized graph order.
+    """
+    data = nd.array(data, ctx=ctx) if not isinstance(data, nd.NDArray) \
+        else data.as_in_context(ctx)
+    qdata = sim.load_real_data(data.astype("float64"), 'data', inputs_ext)
+
+    fsym, fprm = fmodel.symbol, fmodel.params
+    ref_iter = iter_nd_outputs(
+        fsym, fprm, {'data': data.astype(_params_dtype(fprm))}, ctx=ctx)
+    if executor == "numpy":
+        cmp_iter = NumpyExecutor(qmodel.symbol, qmodel.params) \
+            .iter_outputs(data=qdata)
+    elif executor == "mxnet":
+        cmp_iter = iter_nd_outputs(qmodel.symbol, qmodel.params,
+                                   {'data': qdata}, ctx=ctx)
+    else:
+        raise RuntimeError("Invalid executor: {}".format(executor))
+    names = _op_names(fsym) & _op_names(qmodel.symbol)
+    return list(compare_streams(ref_iter, cmp_iter, names,
+                                scales=scales, tolerance=tolerance))
+
+def _params_dtype(params):
+    for v in params.values():
+        return v.dtype
+    return "float32"
+
+def format_report(diffs, top=None):
+    """ Format the layer diffs into text table.
+
+        Parameters
+        __________
+        top : int
+            Only list the `top` layers with the largest relative error.
+    """
+    if top is not None:
+        diffs = sorted(diffs, key=lambda d: -d.rel_l2)[:top]
+    fmt = "{:<40} {:<16} {:>3} {:>10} {:>12} {:>10}"
+    lines = [fmt.format("name", "op_name", "idx", "cosine",
+                        "max_abs", "rel_l2")]
+    for d in diffs:
+        lines.append(fmt.format(d.name[:40], d.op_name[:16], d.index,
+            "%.6f" % d.cosine, "%.4g" % d.max_abs, "%.4g" % d.rel_l2))
+    return "\n".join(lines)
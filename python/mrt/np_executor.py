@@ -0,0 +1,684 @@
+""" Pure NumPy Reference Executor for Quantized MRT Graphs.
+
+    Run the quantized MRT symbol without MxNet runtime and the
+    python CustomOp bridge of `cvm_op.py`. Every registered op is
+    a vectorized NumPy kernel working on float64 buffers that
+    carry integer values, which is exactly what the MxNet
+    simulation does.
+
+    The graph is parsed from the symbol json once. On the first
+    run of given input shapes, the output shapes are recorded and
+    a liveness plan is built: outputs of elementwise kernels are
+    written into pre-allocated buffers, and a buffer is reused by
+    a later node as soon as all of its consumers have finished.
+
+    Only **crucial parts** of the module are elaborated.
+"""
+
+import ast
+import json
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+__all__ = ["NumpyExecutor", "register_np_op"]
+
+_np_ops = {}
+
+def register_np_op(*op_names, out=False):
+    """ Register NumPy kernel for the op names.
+
+        The kernel has signature `kernel(inputs, attr, out=None)`
+        where `attr` is the string attribute dict of the node.
+
+        Parameters
+        __________
+        out : bool
+            Whether the kernel supports writing into the given
+            `out` buffer, which has the recorded output shape.
+    """
+    def wrapper(kernel):
+        for op_name in op_names:
+            if op_name in _np_ops:
+                raise NameError("NumPy op %s has been registered" % op_name)
+            _np_ops[op_name] = (kernel, out)
+        return kernel
+    return wrapper
+
+def _attr(attr, name, default=None):
+    if name not in attr:
+        return default
+    val = attr[name]
+    try:
+        return ast.literal_eval(val)
+    except (ValueError, SyntaxError):
+        return val
+
+def _tuple(val, ndim=None):
+    if isinstance(val, (list, tuple)):
+        return tuple(val)
+    return (val,) * (1 if ndim is None else ndim)
+
+def _round(x, out=None):
+    """ MxNet rounds half away from zero. """
+    out = np.abs(x, out=out)
+    out += 0.5
+    np.floor(out, out=out)
+    return np.copysign(out, x, out=out)
+
+
+# === elementwise ops ===
+
+def _unary(ufunc):
+    def kernel(inputs, attr, out=None):
+        return ufunc(inputs[0], out=out)
+    return kernel
+
+def _binary(ufunc):
+    def kernel(inputs, attr, out=None):
+        return ufunc(inputs[0], inputs[1], out=out)
+    return kernel
+
+def _scalar(ufunc):
+    def kernel(inputs, attr, out=None):
+        return ufunc(inputs[0], float(_attr(attr, 'scalar')), out=out)
+    return kernel
+
+for _names, _ufunc in [
+        (("elemwise_add", "broadcast_add"), np.add),
+        (("elemwise_sub", "broadcast_sub"), np.subtract),
+        (("elemwise_mul", "broadcast_mul"), np.multiply),
+        (("elemwise_div", "broadcast_div"), np.true_divide),
+        (("_maximum", "broadcast_maximum"), np.maximum),
+        (("_minimum", "broadcast_minimum"), np.minimum)]:
+    register_np_op(*_names, out=True)(_binary(_ufunc))
+for _name, _ufunc in [
+        ("_plus_scalar", np.add), ("_minus_scalar", np.subtract),
+        ("_mul_scalar", np.multiply), ("_div_scalar", np.true_divide),
+        ("_maximum_scalar", np.maximum), ("_minimum_scalar", np.minimum)]:
+    register_np_op(_name, out=True)(_scalar(_ufunc))
+for _name, _ufunc in [
+        ("negative", np.negative), ("abs", np.abs), ("floor", np.floor),
+        ("ceil", np.ceil), ("fix", np.trunc), ("sqrt", np.sqrt),
+        ("exp", np.exp)]:
+    register_np_op(_name, out=True)(_unary(_ufunc))
+register_np_op("round", out=True)(_unary(_round))
+
+@register_np_op("relu", out=True)
+def _relu(inputs, attr, out=None):
+    return np.maximum(inputs[0], 0, out=out)
+
+@register_np_op("Activation", out=True)
+def _activation(inputs, attr, out=None):
+    act_type = _attr(attr, 'act_type')
+    if act_type == "relu":
+        return np.maximum(inputs[0], 0, out=out)
+    if act_type == "sigmoid":
+        return _sigmoid(inputs, attr, out=out)
+    raise NotImplementedError("Activation act_type: %s" % act_type)
+
+@register_np_op("sigmoid", out=True)
+def _sigmoid(inputs, attr, out=None):
+    out = np.negative(inputs[0], out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+@register_np_op("clip", out=True)
+def _clip(inputs, attr, out=None):
+    return np.clip(inputs[0], float(_attr(attr, 'a_min')),
+                   float(_attr(attr, 'a_max')), out=out)
+
+@register_np_op("_greater_scalar", out=True)
+def _greater_scalar(inputs, attr, out=None):
+    ret = inputs[0] > float(_attr(attr, 'scalar'))
+    if out is None:
+        return ret.astype("float64")
+    np.copyto(out, ret)
+    return out
+
+@register_np_op("broadcast_greater", out=True)
+def _broadcast_greater(inputs, attr, out=None):
+    ret = np.greater(inputs[0], inputs[1])
+    if out is None:
+        return ret.astype("float64")
+    np.copyto(out, ret)
+    return out
+
+@register_np_op("where")
+def _where(inputs, attr, out=None):
+    return np.where(inputs[0] != 0, inputs[1], inputs[2])
+
+@register_np_op("zeros_like")
+def _zeros_like(inputs, attr, out=None):
+    return np.zeros_like(inputs[0])
+
+@register_np_op("ones_like")
+def _ones_like(inputs, attr, out=None):
+    return np.ones_like(inputs[0])
+
+@register_np_op("_zeros")
+def _zeros(inputs, attr, out=None):
+    return np.zeros(_tuple(_attr(attr, 'shape', ())))
+
+@register_np_op("_ones")
+def _ones(inputs, attr, out=None):
+    return np.ones(_tuple(_attr(attr, 'shape', ())))
+
+@register_np_op("_full")
+def _full(inputs, attr, out=None):
+    return np.full(_tuple(_attr(attr, 'shape', ())),
+                   float(_attr(attr, 'value', 0.)))
+
+@register_np_op("Cast")
+def _cast(inputs, attr, out=None):
+    dtype = _attr(attr, 'dtype', 'float32')
+    if np.dtype(dtype).kind in "iu":
+        return np.trunc(inputs[0])
+    return inputs[0]
+
+@register_np_op("Dropout")
+def _identity(inputs, attr, out=None):
+    return inputs[0]
+
+
+# === MRT custom ops, refer to `cvm_op.py` ===
+
+def _cvm_clip(x, precision, out=None):
+    clip = 2 ** (int(precision) - 1) - 1
+    out = _round(x, out=out)
+    return np.clip(out, -clip, clip, out=out)
+
+def _cvm_right_shift(x, precision, shift_bit, out=None):
+    sb = int(shift_bit)
+    assert sb > 0
+    clip = 2 ** (int(precision) - 1) - 1
+    out = _round(x, out=out)
+    if sb > 1:
+        out *= 1.0 / (2 ** (sb - 1))
+        np.floor(out, out=out)
+    out += 1
+    out *= 0.5
+    np.floor(out, out=out)
+    return np.clip(out, -clip, clip, out=out)
+
+def _cvm_left_shift(x, precision, shift_bit, out=None):
+    sb = int(shift_bit)
+    assert sb > 0
+    clip = 2 ** (int(precision) - 1) - 1
+    out = _round(x, out=out)
+    out *= 2 ** sb
+    return np.clip(out, -clip, clip, out=out)
+
+def _cvm_requant(x, precision, multiplier, shift_bit, out=None):
+    sb = int(shift_bit)
+    clip = 2 ** (int(precision) - 1) - 1
+    out = _round(x, out=out)
+    out *= int(multiplier)
+    if sb > 1:
+        out *= 1.0 / (2 ** (sb - 1))
+        np.floor(out, out=out)
+    if sb > 0:
+        out += 1
+        out *= 0.5
+        np.floor(out, out=out)
+    elif sb < 0:
+        out *= 2 ** -sb
+    return np.clip(out, -clip, clip, out=out)
+
+def _right_shift(x, shift_bit, out=None):
+    sb = int(shift_bit)
+    assert sb > 0
+    out = _round(x, out=out)
+    if sb > 1:
+        out *= 1.0 / (2 ** sb)
+        _round(out, out=out)
+    return out
+
+def _cvm_lut(x, table):
+    index = np.clip(x, 0, table.shape[0] - 1).astype("int64")
+    return table.reshape(table.shape[0], -1)[index, 0]
+
+@register_np_op("Custom", out=True)
+def _custom(inputs, attr, out=None):
+    op_type = attr['op_type']
+    x = inputs[0]
+    if op_type == "cvm_clip":
+        return _cvm_clip(x, _attr(attr, 'precision', 8), out=out)
+    elif op_type == "cvm_right_shift":
+        return _cvm_right_shift(x, _attr(attr, 'precision', 8),
+            _attr(attr, 'shift_bit', 0), out=out)
+    elif op_type == "cvm_left_shift":
+        return _cvm_left_shift(x, _attr(attr, 'precision', 8),
+            _attr(attr, 'shift_bit', 0), out=out)
+    elif op_type == "cvm_requant":
+        return _cvm_requant(x, _attr(attr, 'precision', 8),
+            _attr(attr, 'multiplier', 1), _attr(attr, 'shift_bit', 0),
+            out=out)
+    elif op_type == "right_shift":
+        return _right_shift(x, _attr(attr, 'shift_bit', 0), out=out)
+    elif op_type == "cvm_lut":
+        ret = _cvm_lut(x, inputs[1])
+    elif op_type == "cvm_pad":
+        ret = np.pad(x, [(int(b), int(a)) \
+            for b, a in _attr(attr, 'padding')])
+    elif op_type == "cvm_annotate":
+        ret = x
+    elif op_type == "cvm_sim_quant":
+        ret = x * float(_attr(attr, 'scale'))
+    elif op_type == "mrt_sim_quant":
+        ret = x / float(2 ** int(_attr(attr, 'sb')))
+    else:
+        raise NotImplementedError("Custom op_type: %s" % op_type)
+    if out is None:
+        return ret
+    np.copyto(out, ret)
+    return out
+
+
+# === nn ops ===
+
+def _pad2d(x, pad, value=0.):
+    if not any(pad):
+        return x
+    return np.pad(x, ((0, 0), (0, 0), (pad[0], pad[0]), (pad[1], pad[1])),
+                  constant_values=value)
+
+def _windows(x, kernel, stride, dilate=(1, 1)):
+    """ (N, C, H, W) -> (N, C, OH, OW, KH, KW) strided view """
+    kh = (kernel[0] - 1) * dilate[0] + 1
+    kw = (kernel[1] - 1) * dilate[1] + 1
+    win = sliding_window_view(x, (kh, kw), axis=(2, 3))
+    return win[:, :, ::stride[0], ::stride[1], ::dilate[0], ::dilate[1]]
+
+@register_np_op("Convolution")
+def _convolution(inputs, attr, out=None):
+    kernel = _tuple(_attr(attr, 'kernel'))
+    if len(kernel) != 2 or _attr(attr, 'layout', 'NCHW') != 'NCHW':
+        raise NotImplementedError("only Conv2D of NCHW layout is supported")
+    stride = _tuple(_attr(attr, 'stride', (1, 1)), 2)
+    dilate = _tuple(_attr(attr, 'dilate', (1, 1)), 2)
+    pad = _tuple(_attr(attr, 'pad', (0, 0)), 2)
+    groups = int(_attr(attr, 'num_group', 1))
+    no_bias = _attr(attr, 'no_bias', False)
+
+    x, w = inputs[0], inputs[1]
+    win = _windows(_pad2d(x, pad), kernel, stride, dilate)
+    n, c, oh, ow = win.shape[:4]
+    o = w.shape[0]
+    if groups == 1:
+        ret = np.tensordot(win, w, axes=([1, 4, 5], [1, 2, 3]))
+        ret = ret.transpose(0, 3, 1, 2)
+    else:
+        win = win.reshape(n, groups, c // groups, oh, ow, *kernel)
+        wg = w.reshape(groups, o // groups, c // groups, *kernel)
+        ret = np.einsum("ngchwij,gocij->ngohw", win, wg, optimize=True)
+        ret = ret.reshape(n, o, oh, ow)
+    if not no_bias:
+        ret = ret + inputs[2].reshape(1, -1, 1, 1)
+    return np.ascontiguousarray(ret)
+
+@register_np_op("FullyConnected")
+def _fully_connected(inputs, attr, out=None):
+    x, w = inputs[0], inputs[1]
+    if _attr(attr, 'flatten', True):
+        x = x.reshape(x.shape[0], -1)
+    ret = np.matmul(x, w.T)
+    if not _attr(attr, 'no_bias', False):
+        ret += inputs[2]
+    return ret
+
+@register_np_op("Pooling")
+def _pooling(inputs, attr, out=None):
+    x = inputs[0]
+    pool_type = _attr(attr, 'pool_type', 'max')
+    if _attr(attr, 'global_pool', False):
+        func = {"max": np.max, "avg": np.mean, "sum": np.sum}[pool_type]
+        return func(x, axis=(2, 3), keepdims=True)
+    if _attr(attr, 'pooling_convention', 'valid') != 'valid':
+        raise NotImplementedError("Pooling convention: %s" \
+            % attr['pooling_convention'])
+    kernel = _tuple(_attr(attr, 'kernel'))
+    stride = _tuple(_attr(attr, 'stride', (1, 1)), 2)
+    pad = _tuple(_attr(attr, 'pad', (0, 0)), 2)
+    if pool_type == "max":
+        win = _windows(_pad2d(x, pad, -np.inf), kernel, stride)
+        return win.max(axis=(4, 5))
+    win = _windows(_pad2d(x, pad), kernel, stride)
+    ret = win.sum(axis=(4, 5))
+    if pool_type == "sum":
+        return ret
+    if pool_type != "avg":
+        raise NotImplementedError("Pooling pool_type: %s" % pool_type)
+    if _attr(attr, 'count_include_pad', True) or not any(pad):
+        return ret / (kernel[0] * kernel[1])
+    ones = np.ones((1, 1) + x.shape[2:])
+    count = _windows(_pad2d(ones, pad), kernel, stride).sum(axis=(4, 5))
+    return ret / count
+
+@register_np_op("UpSampling")
+def _upsampling(inputs, attr, out=None):
+    if _attr(attr, 'sample_type') != 'nearest':
+        raise NotImplementedError("UpSampling sample_type: %s" \
+            % attr.get('sample_type'))
+    scale = int(_attr(attr, 'scale'))
+    return inputs[0].repeat(scale, axis=2).repeat(scale, axis=3)
+
+@register_np_op("Embedding")
+def _embedding(inputs, attr, out=None):
+    x, w = inputs
+    index = np.clip(x, 0, w.shape[0] - 1).astype("int64")
+    return w[index]
+
+@register_np_op("batch_dot")
+def _batch_dot(inputs, attr, out=None):
+    a, b = inputs
+    if _attr(attr, 'transpose_a', False):
+        a = a.swapaxes(-1, -2)
+    if _attr(attr, 'transpose_b', False):
+        b = b.swapaxes(-1, -2)
+    return np.matmul(a, b)
+
+
+# === reduce ops ===
+
+def _reduce(func):
+    def kernel(inputs, attr, out=None):
+        axis = _attr(attr, 'axis', None)
+        if _attr(attr, 'exclude', False):
+            raise NotImplementedError("reduce with exclude=True")
+        if isinstance(axis, list):
+            axis = tuple(axis)
+        if axis == ():
+            axis = None
+        return np.asarray(func(inputs[0], axis=axis,
+                               keepdims=_attr(attr, 'keepdims', False)))
+    return kernel
+
+for _name, _func in [("sum", np.sum), ("max", np.max),
+                     ("min", np.min), ("mean", np.mean)]:
+    register_np_op(_name)(_reduce(_func))
+
+
+# === tensor ops ===
+
+@register_np_op("Flatten", "flatten")
+def _flatten(inputs, attr, out=None):
+    return inputs[0].reshape(inputs[0].shape[0], -1)
+
+@register_np_op("Reshape", "reshape")
+def _reshape(inputs, attr, out=None):
+    x = inputs[0]
+    if _attr(attr, 'reverse', False):
+        raise NotImplementedError("Reshape with reverse=True")
+    shape = []
+    for i, s in enumerate(_tuple(_attr(attr, 'shape'))):
+        if s == 0:
+            s = x.shape[i]
+        elif s < -1:
+            raise NotImplementedError("Reshape special value: %s" % s)
+        shape.append(s)
+    return x.reshape(shape)
+
+@register_np_op("transpose")
+def _transpose(inputs, attr, out=None):
+    axes = _attr(attr, 'axes', None)
+    return inputs[0].transpose(axes if axes else None)
+
+@register_np_op("SwapAxis")
+def _swap_axis(inputs, attr, out=None):
+    return inputs[0].swapaxes(int(_attr(attr, 'dim1', 0)),
+                              int(_attr(attr, 'dim2', 0)))
+
+@register_np_op("Concat", "concat", out=True)
+def _concat(inputs, attr, out=None):
+    return np.concatenate(inputs, axis=int(_attr(attr, 'dim', 1)), out=out)
+
+@register_np_op("expand_dims")
+def _expand_dims(inputs, attr, out=None):
+    return np.expand_dims(inputs[0], int(_attr(attr, 'axis')))
+
+@register_np_op("squeeze")
+def _squeeze(inputs, attr, out=None):
+    axis = _attr(attr, 'axis', None)
+    return np.squeeze(inputs[0],
+        axis=tuple(axis) if isinstance(axis, (list, tuple)) else axis)
+
+@register_np_op("repeat")
+def _repeat(inputs, attr, out=None):
+    return np.repeat(inputs[0], int(_attr(attr, 'repeats')),
+                     axis=_attr(attr, 'axis', None))
+
+@register_np_op("tile")
+def _tile(inputs, attr, out=None):
+    return np.tile(inputs[0], _tuple(_attr(attr, 'reps')))
+
+@register_np_op("slice")
+def _slice(inputs, attr, out=None):
+    begin = _tuple(_attr(attr, 'begin'))
+    end = _tuple(_attr(attr, 'end'))
+    step = _tuple(_attr(attr, 'step', ()))
+    step = step + (None,) * (len(begin) - len(step))
+    key = tuple(slice(b, e, s) for b, e, s in zip(begin, end, step))
+    return inputs[0][key]
+
+@register_np_op("slice_axis")
+def _slice_axis(inputs, attr, out=None):
+    x, axis = inputs[0], int(_attr(attr, 'axis'))
+    key = [slice(None)] * x.ndim
+    key[axis] = slice(_attr(attr, 'begin'), _attr(attr, 'end', None))
+    return x[tuple(key)]
+
+@register_np_op("slice_like")
+def _slice_like(inputs, attr, out=None):
+    x, y = inputs
+    axes = _tuple(_attr(attr, 'axes', ()))
+    axes = range(x.ndim) if axes == () else \
+        [a % x.ndim for a in axes]
+    key = [slice(None)] * x.ndim
+    for a in axes:
+        key[a] = slice(0, y.shape[a])
+    return x[tuple(key)]
+
+
+class NumpyExecutor:
+    """ Graph executor for quantized MRT model with NumPy kernels.
+
+        Parameters
+        __________
+        symbol : mxnet.symbol or str
+            The quantized graph, or its json string.
+        params : dict
+            The graph parameters dict, values could be mxnet.NDArray
+            or numpy.ndarray.
+
+        Examples
+        ________
+        .. code-block:: python
+
+            qmodel = mrt.current_model
+            executor = NumpyExecutor(qmodel.symbol, qmodel.params)
+            outs = executor(data=qdata)
+    """
+    def __init__(self, symbol, params):
+        graph = json.loads(symbol if isinstance(symbol, str) \
+            else symbol.tojson())
+        self.nodes = graph['nodes']
+        self.heads = [(h[0], h[1]) for h in graph['heads']]
+        self.params = {}
+        self.input_names = []
+        for node in self.nodes:
+            if node['op'] != 'null':
+                continue
+            name = node['name']
+            if name in params:
+                value = params[name]
+                if hasattr(value, "asnumpy"):
+                    value = value.asnumpy()
+                self.params[name] = np.asarray(value, dtype="float64")
+            else:
+                self.input_names.append(name)
+
+        for node in self.nodes:
+            if node['op'] != 'null' and node['op'] not in _np_ops:
+                raise NotImplementedError(
+                    "NumPy kernel of op %s has not been registered" \
+                    % node['op'])
+
+        # the index of last node that consumes the node output
+        num = len(self.nodes)
+        self.last_use = list(range(num))
+        for nid, node in enumerate(self.nodes):
+            for inp in node['inputs']:
+                self.last_use[inp[0]] = nid
+        for nid, _ in self.heads:
+            self.last_use[nid] = num
+        self._plans = {}
+
+    def _attrs(self, node):
+        return node.get('attrs', node.get('attr', node.get('param', {})))
+
+    def _run(self, inputs, plan=None):
+        logger = logging.getLogger("mrt.np_executor")
+        values, records = [None] * len(self.nodes), []
+        for nid, node in enumerate(self.nodes):
+            name, op_name = node['name'], node['op']
+            if op_name == 'null':
+                out = self.params[name] if name in self.params \
+                    else inputs[name]
+                values[nid] = [out]
+                records.append(None)
+                continue
+
+            node_inputs = [values[e[0]][e[1]] for e in node['inputs']]
+            kernel, support_out = _np_ops[op_name]
+            buf = None if plan is None else plan[nid]
+            out = kernel(node_inputs, self._attrs(node), out=buf)
+            outs = out if isinstance(out, (list, tuple)) else [out]
+            values[nid] = outs
+            if plan is None:
+                alias = [e[0] for e in node['inputs'] \
+                    if np.may_share_memory(values[e[0]][e[1]], outs[0])]
+                records.append((outs[0].shape, outs[0].dtype,
+                    support_out and len(outs) == 1, alias))
+            logger.debug("run %-40s op=%-16s shape=%s",
+                         name, op_name, outs[0].shape)
+
+            for e in node['inputs']:
+                if self.last_use[e[0]] == nid:
+                    values[e[0]] = None
+        return [values[nid][idx] for nid, idx in self.heads], records
+
+    def _build_plan(self, records):
+        """ Liveness based storage assignment.
+
+            Nodes whose kernel supports `out` get a storage slot,
+            slots are recycled for the same shape and dtype once
+            the last consumer finished. View outputs (reshape,
+            slice, ...) keep the slot of aliased input alive.
+        """
+        storage, slots, refs, free = {}, [], [], {}
+        plan = [None] * len(self.nodes)
+        heads = {nid for nid, _ in self.heads}
+
+        def _release(nid):
+            sid = storage.get(nid, None)
+            if sid is None:
+                return
+            refs[sid] -= 1
+            if refs[sid] == 0:
+                key = (slots[sid].shape, slots[sid].dtype)
+                free.setdefault(key, []).append(sid)
+
+        for nid, node in enumerate(self.nodes):
+            record = records[nid]
+            if record is None:
+                continue
+            shape, dtype, support_out, alias = record
+            if support_out and nid not in heads:
+                candidates = free.get((shape, dtype), [])
+                if candidates:
+                    sid = candidates.pop()
+                else:
+                    sid = len(slots)
+                    slots.append(np.empty(shape, dtype=dtype))
+                    refs.append(0)
+                storage[nid] = sid
+                refs[sid] += 1
+                plan[nid] = slots[sid]
+            elif alias:
+                sids = {storage[a] for a in alias if a in storage}
+                if len(sids) == 1:
+                    storage[nid] = sids.pop()
+                    refs[storage[nid]] += 1
+
+            consumed = {e[0] for e in node['inputs']}
+            for inp in consumed:
+                if self.last_use[inp] == nid:
+                    _release(inp)
+
+        nbytes = sum(s.nbytes for s in slots)
+        logging.getLogger("mrt.np_executor").info(
+            "memory plan: %d buffers, %.2f MB", len(slots), nbytes / 2**20)
+        return plan
+
+    def _inputs(self, inputs):
+        data = {}
+        for name in self.input_names:
+            value = inputs[name]
+            if hasattr(value, "asnumpy"):
+                value = value.asnumpy()
+            data[name] = np.asarray(value, dtype="float64")
+        return data
+
+    def iter_outputs(self, **inputs):
+        """ Run the graph node by node, yielding the outputs.
+
+            No memory plan is used, so the yielded arrays are never
+            overwritten, and the executor drops its reference to an
+            output once all the consumers have finished.
+
+            Returns
+            _______
+            ret : generator
+                Yield (name, op_name, outputs) for each operator.
+        """
+        inputs = self._inputs(inputs)
+        values = [None] * len(self.nodes)
+        for nid, node in enumerate(self.nodes):
+            name, op_name = node['name'], node['op']
+            if op_name == 'null':
+                values[nid] = [self.params[name] if name in self.params \
+                    else inputs[name]]
+                continue
+            node_inputs = [values[e[0]][e[1]] for e in node['inputs']]
+            out = _np_ops[op_name][0](node_inputs, self._attrs(node))
+            values[nid] = out if isinstance(out, (list, tuple)) else [out]
+            for e in node['inputs']:
+                if self.last_use[e[0]] == nid:
+                    values[e[0]] = None
+            yield name, op_name, values[nid]
+
+    def forward(self, **inputs):
+        """ Run the graph with input name to data mapping.
+
+            Returns
+            _______
+            ret : list of numpy.ndarray
+                The outputs of graph heads.
+        """
+        data = self._inputs(inputs)
+        key = tuple(data[n].shape for n in self.input_names)
+        if key not in self._plans:
+            outs, records = self._run(data)
+            self._plans[key] = self._build_plan(records)
+            return outs
+        outs, _ = self._run(data, self._plans[key])
+        # heads are never planned, but a view head may still alias
+        # a planned buffer which is overwritten by the next run.
+        return [np.array(o) if o.base is not None else o for o in outs]
+
+    def __call__(self, **inputs):
+        outs = self.forward(**inputs)
+        return outs[0] if len(outs) == 1 else outs
@@ -7,6 +7,11 @@ import os
 import copy
 import re
 import itertools
+import json
+import inspect
+import marshal
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from mxnet import nd
 
 logger = logging.getLogger('log.ops.unittest')
@@ -300,14 +305,15 @@ class OpUnitIter():
             if inputs[i] is not None:
                 attrs[self.inputs[i].cvm_name] = inputs[i]
         return attrs
-    def eval_data(self, op_name, op_func, is_dump=False):
+    def eval_data(self, op_name, op_func, is_dump=False,
+            datadir="/data/ops_generator"):
         logger.info("Eval operator %s size=%s", op_name, len(self))
         for i in range(len(self)):
             out_npys, err = None, None
             inputs = self[i]
             attrs = self.attrs(inputs)
             try:
-                out_npys = op_func(*[copy.deepcopy(d) for d in inputs])
+                out_npys = op_func(*[_copy_input(d) for d in inputs])
             except Exception as e:
                 err = "Error:\n" + str(e)
             logger.debug("Inputs: %s, Attr: %-30s, Outputs: %s, Error: %s",
@@ -315,7 +321,254 @@ class OpUnitIter():
                     str(out_npys).replace("\n", "").replace(" ", ""),
                     str(err).split("\n"))
             if is_dump:
-                dump(op_name, attrs, inputs[:self.attr_idx], out_npys, err)
+                dump(op_name, attrs, inputs[:self.attr_idx], out_npys, err,
+                     datadir=datadir)
+
+    def generate(self, op_name, op_func, datadir="/data/ops_corpus",
+            num_workers=None, shard_size=256, version=None, prune=False):
+        """ Generate the test vectors into the `.npz` corpus in parallel.
+
+            The combination space is sharded over a forked process pool,
+            and each case is skipped before evaluating if its content
+            hash, over the operator fingerprint, the inputs and the
+            attributes, already exists in the operator index. Since the
+            fingerprint covers the source of `op_func`, only the cases
+            of changed operators are recomputed.
+
+            The fingerprint doesn't cover the helpers or reference
+            operators called by `op_func`, pass a new `version` once
+            they changed, otherwise the stale cases are kept.
+
+            Parameters
+            __________
+            num_workers : int
+                The number of processes, defaults to the cpu count,
+                and 1 evaluates in the current process.
+            shard_size : int
+                The number of cases per shard, and per `.npz` batch.
+            version : str
+                Override the operator fingerprint, which is required
+                to invalidate the cases if the functions called by
+                `op_func` changed.
+            prune : bool
+                Remove the cases of the operator that are not
+                enumerated by this run, such as stale versions.
+
+            Returns
+            _______
+            stats : dict
+                The number of `total`, `skipped`, `computed` and
+                `errors` cases.
+        """
+        corpus = OpCorpus(datadir)
+        index = corpus.load_index(op_name)
+        fingerprint = op_fingerprint(op_func) if version is None \
+            else str(version)
+        state = (self, op_name, op_func, fingerprint, set(index["cases"]))
+        shards = [(start, min(start+shard_size, len(self))) \
+                  for start in range(0, len(self), shard_size)]
+        num_workers = num_workers or os.cpu_count() or 1
+        if "fork" not in mp.get_all_start_methods():
+            num_workers = 1
+        logger.info("Generate operator %s size=%s shards=%s workers=%s",
+                    op_name, len(self), len(shards), num_workers)
+
+        stats = {"total": len(self), "skipped": 0,
+                 "computed": 0, "errors": 0}
+        seen = set()
+        def _collect(cases, keys):
+            seen.update(keys)
+            stats["skipped"] += len(keys) - len(cases)
+            stats["computed"] += len(cases)
+            stats["errors"] += sum(1 for c in cases if c[-1] is not None)
+            if corpus.write_batch(op_name, index, cases):
+                corpus.save_index(op_name, index)
+
+        if num_workers == 1 or len(shards) <= 1:
+            _init_generator(*state)
+            for start, stop in shards:
+                _collect(*_generate_shard(start, stop))
+        else:
+            # the closures of op_func and iterators are inherited by the
+            #   forked workers, only the shard ranges are pickled.
+            with ProcessPoolExecutor(num_workers,
+                    mp_context=mp.get_context("fork"),
+                    initializer=_init_generator, initargs=state) as executor:
+                futures = [executor.submit(_generate_shard, *shard) \
+                           for shard in shards]
+                for future in as_completed(futures):
+                    _collect(*future.result())
+        if prune:
+            corpus.prune(op_name, index, seen)
+        logger.info("Generate operator %s done: %s", op_name, stats)
+        return stats
+
+def _copy_input(data):
+    if isinstance(data, np.ndarray):
+        return data.copy()
+    if isinstance(data, (list, dict)):
+        return copy.deepcopy(data)
+    return data
+
+def _as_npy(data):
+    if isinstance(data, nd.NDArray):
+        return data.asnumpy()
+    if isinstance(data, np.ndarray):
+        return data
+    return np.array(data, dtype="int32")
+
+def op_fingerprint(op_func):
+    """ Hash of the operator implementation source, or bytecode if the
+            source is unavailable.
+
+        Only the source of `op_func` itself is hashed, the functions it
+            calls are not covered.
+    """
+    try:
+        code = inspect.getsource(op_func).encode()
+    except (OSError, TypeError):
+        code = marshal.dumps(op_func.__code__)
+    return hashlib.sha256(code).hexdigest()[:16]
+
+def case_key(op_name, fingerprint, attrs, ins):
+    """ Content hash of a test case, computed before evaluation. """
+    hsh = hashlib.sha256("{}:{}:{}".format(
+        op_name, fingerprint, sorted(attrs.items())).encode())
+    for data in ins:
+        data = np.ascontiguousarray(data)
+        hsh.update("{}{}".format(data.dtype.str, data.shape).encode())
+        hsh.update(data.tobytes())
+    return hsh.hexdigest()
+
+_GEN_STATE = {}
+
+def _init_generator(op_units, op_name, op_func, fingerprint, existing):
+    _GEN_STATE.update(op_units=op_units, op_name=op_name, op_func=op_func,
+                      fingerprint=fingerprint, existing=existing)
+
+def _generate_shard(start, stop):
+    op_units, op_func = _GEN_STATE["op_units"], _GEN_STATE["op_func"]
+    existing = _GEN_STATE["existing"]
+    cases, keys = [], []
+    for i in range(start, stop):
+        inputs = op_units[i]
+        raw_attrs = op_units.attrs(inputs)
+        attrs = {k: str(v) for k, v in raw_attrs.items()}
+        ins = [_as_npy(d) for d in inputs[:op_units.attr_idx]]
+        key = case_key(_GEN_STATE["op_name"], _GEN_STATE["fingerprint"],
+                       attrs, ins)
+        keys.append(key)
+        if key in existing:
+            continue
+        outs, err = None, None
+        try:
+            outs = [_as_npy(o) for o in
+                    op_func(*[_copy_input(d) for d in inputs])]
+        except Exception as e:
+            err = "Error:\n" + str(e)
+        cases.append((key, _GEN_STATE["fingerprint"], attrs,
+                      str(raw_attrs), ins, outs, err))
+    return cases, keys
+
+class OpCorpus():
+    """ Content-addressed operator test vectors.
+
+        Each operator owns a directory with `.npz` batches and an
+        `index.json`, which maps the case hash to the batch file,
+        the attributes and the error message if failed. The text
+        representation of the original attributes is kept, since the
+        case directory of :func:`dump` is named by its hash. The arrays
+        of case are stored as `<hash>.in_<i>` and `<hash>.out_<i>`.
+    """
+    def __init__(self, datadir="/data/ops_corpus"):
+        self.datadir = datadir
+
+    def op_dir(self, op_name):
+        return os.path.join(self.datadir, op_name)
+
+    def load_index(self, op_name):
+        index_file = os.path.join(self.op_dir(op_name), "index.json")
+        if not os.path.exists(index_file):
+            return {"op_name": op_name, "cases": {}}
+        with open(index_file, "r") as fin:
+            return json.load(fin)
+
+    def save_index(self, op_name, index):
+        index_file = os.path.join(self.op_dir(op_name), "index.json")
+        with open(index_file + ".tmp", "w") as fout:
+            json.dump(index, fout)
+        os.replace(index_file + ".tmp", index_file)
+
+    def write_batch(self, op_name, index, cases):
+        """ Write the new cases into a `.npz` batch and update the index.
+
+            Returns the number of cases written.
+        """
+        cases = [c for c in cases if c[0] not in index["cases"]]
+        cases = list({c[0]: c for c in cases}.values())
+        if not cases:
+            return 0
+        op_dir = self.op_dir(op_name)
+        os.makedirs(op_dir, exist_ok=True)
+        batch = "batch_%s.npz" % hashlib.sha1(
+            "".join(c[0] for c in cases).encode()).hexdigest()[:16]
+        arrays = {}
+        for key, _, _, _, ins, outs, _ in cases:
+            for i, data in enumerate(ins):
+                arrays["%s.in_%d" % (key, i)] = data
+            for i, data in enumerate(outs or []):
+                arrays["%s.out_%d" % (key, i)] = data
+        tmp_file = os.path.join(op_dir, batch + ".tmp.npz")
+        np.savez_compressed(tmp_file, **arrays)
+        os.replace(tmp_file, os.path.join(op_dir, batch))
+        for key, fingerprint, attrs, attr_str, ins, outs, err in cases:
+            index["cases"][key] = {
+                "batch": batch, "fingerprint": fingerprint,
+                "attrs": attrs, "attr_str": attr_str,
+                "num_inputs": len(ins),
+                "num_outputs": len(outs or []), "error": err}
+        return len(cases)
+
+    def prune(self, op_name, index, keep):
+        """ Drop the cases not in `keep` and the unreferenced batches. """
+        cases = index["cases"]
+        for key in set(cases) - set(keep):
+            del cases[key]
+        self.save_index(op_name, index)
+        live = {c["batch"] for c in cases.values()}
+        op_dir = self.op_dir(op_name)
+        for fname in os.listdir(op_dir):
+            if fname.endswith(".npz") and fname not in live:
+                os.remove(os.path.join(op_dir, fname))
+
+    def iter_cases(self, op_name):
+        """ Yield (key, attrs, attr_str, ins, outs, err) of the operator
+                cases, opening each batch once.
+        """
+        index = self.load_index(op_name)
+        batches = {}
+        for key, case in index["cases"].items():
+            batches.setdefault(case["batch"], []).append((key, case))
+        for batch, cases in sorted(batches.items()):
+            with np.load(os.path.join(self.op_dir(op_name), batch)) as npz:
+                for key, case in cases:
+                    ins = [npz["%s.in_%d" % (key, i)] \
+                           for i in range(case["num_inputs"])]
+                    outs = [npz["%s.out_%d" % (key, i)] \
+                            for i in range(case["num_outputs"])]
+                    if case["error"] is not None:
+                        outs = None
+                    attr_str = case.get("attr_str", str(case["attrs"]))
+                    yield key, case["attrs"], attr_str, \
+                        ins, outs, case["error"]
+
+    def export_txt(self, op_name, datadir="/data/ops_generator"):
+        """ Export the cases into the text layout read by `test_op.cc`,
+                the same as :func:`dump` of `eval_data`.
+        """
+        for _, attrs, attr_str, ins, outs, err in self.iter_cases(op_name):
+            dump(op_name, attrs, list(ins), outs, err,
+                 datadir=datadir, attr_str=attr_str)
 
 def npy_sha256(data):
     hsh = hashlib.sha256(data.data.tobytes()).hexdigest()
@@ -395,7 +648,7 @@ def clean_dir(datadir="/data/ops_generator"):
     logger.info("Clean directory: %s", datadir)
 
 def dump(op_name, attr, ins, outs, err=None,
-        datadir="/data/ops_generator"):
+        datadir="/data/ops_generator", attr_str=None):
     logger = logging.getLogger('log.ops.unittest')
 
     npdir = "%s/%s" % (datadir, ".hidden.out")
@@ -410,7 +663,8 @@ def dump(op_name, attr, ins, outs, err=None,
 
     ins = [npy_txt(_in) for _in in ins]
     hshes = [txt_sha256(_in) for _in in ins]
-    hsh = hashlib.sha1("{}{}".format(hshes, attr)
+    attr_str = str(attr) if attr_str is None else attr_str
+    hsh = hashlib.sha1("{}{}".format(hshes, attr_str)
                 .encode()).hexdigest()
     hsh_dir = "%s/%s/%s" % (datadir, op_name, hsh)
     if os.path.exists(hsh_dir):
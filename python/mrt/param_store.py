@@ -0,0 +1,93 @@
+""" Shared Parameters Store for MRT Graph Passes.
+
+    Graph passes take the parameters dict and return a new one,
+    the tensors are shared between the input and output store and
+    only the ones set by the pass are newly allocated, so that
+    the memory usage of a sequence of passes stays near one model.
+
+    The passes replace the tensors instead of modifying them in place,
+    which is not enforced by the store.
+"""
+
+from collections.abc import MutableMapping
+
+import numpy as np
+
+__all__ = ["ParamStore", "allocated_bytes"]
+
+_allocated = [0]
+
+def allocated_bytes():
+    """ Total bytes of tensors allocated into all the stores,
+            which is monotonically increasing.
+    """
+    return _allocated[0]
+
+def nbytes(value):
+    """ The data size in bytes of numpy array or NDArray. """
+    return int(np.prod(value.shape)) * np.dtype(value.dtype).itemsize
+
+
+class ParamStore(MutableMapping):
+    """ Parameters dict sharing the tensors with other stores.
+
+        The store holds references of tensors, forking a store costs
+            a shallow dict copy only. The tensors are read-only, set
+            a new tensor under the key to update it.
+
+        Parameters
+        __________
+        params : dict or ParamStore
+            Name to tensor dict, the tensors are shared.
+    """
+    def __init__(self, params=None):
+        self._data = dict(params.items()) if params else {}
+        self._refs = {}
+        for v in self._data.values():
+            self._refs[id(v)] = self._refs.get(id(v), 0) + 1
+        self.allocated = 0
+
+    def fork(self):
+        """ Create a new store sharing all the tensors. """
+        return ParamStore(self)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        if key in self._data:
+            self._release(key)
+        if id(value) not in self._refs:
+            size = nbytes(value)
+            self.allocated += size
+            _allocated[0] += size
+        self._refs[id(value)] = self._refs.get(id(value), 0) + 1
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        self._release(key)
+        del self._data[key]
+
+    def _release(self, key):
+        vid = id(self._data[key])
+        self._refs[vid] -= 1
+        if self._refs[vid] == 0:
+            del self._refs[vid]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return "ParamStore(%d tensors, %d bytes)" % (len(self), self.nbytes)
+
+    @property
+    def nbytes(self):
+        """ Total bytes of the distinct tensors in store. """
+        values = {id(v): v for v in self._data.values()}
+        return sum(nbytes(v) for v in values.values())
@@ -14,6 +14,9 @@ import logging
 import json
 import math
 
+from .param_store import ParamStore
+from .common import trace
+
 INT32_MIN, INT32_MAX = -2147483647, 2147483647
 INT8_MIN, INT8_MAX = -127, 127
 
@@ -525,7 +528,7 @@ def topo_visit(symbol, params, inputs_ext, callback,
             The Mxnet symbol or CVM symbol, parameters dict; and if with_maps is True, also return operator output dict, which maps symbol name to .
     """
     graph, maps = {}, {}
-    params = {k:v[:] for k,v in params.items()} # copy params
+    params = ParamStore(params) # share the tensors
     for sym in topo_sort(symbol, logger=logger):
         name, op_name = sym.attr('name'), sym.attr('op_name')
         childs, attr = sym_iter(sym.get_children()), sym.list_attr()
@@ -565,7 +568,7 @@ def topo_visit_transformer(symbol, params, callback,
             The Mxnet symbol or CVM symbol, parameters dict.
     """
     graph = {}
-    params = {k:v[:] for k, v in params.items()}
+    params = ParamStore(params) # share the tensors
     for op in topo_sort(symbol, logger=logger):
         name, op_name = op.attr('name'), op.attr('op_name')
         childs, attr = sym_iter(op.get_children()), op.list_attr()
@@ -573,7 +576,8 @@ def topo_visit_transformer(symbol, params, callback,
             childs = [get_node(c, graph) for c in childs]
             op = get_op(op_name)(*childs, **attr, name=name)
 
-        graph[name] = callback(op, params=params, graph=graph, **kwargs)
+        with trace.span(op_name, cat="op"):
+            graph[name] = callback(op, params=params, graph=graph, **kwargs)
         if graph[name] is None:
             graph[name] = op
     nodes = [get_node(op, graph) for op in symbol]
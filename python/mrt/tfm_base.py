@@ -3,10 +3,16 @@
     Collection of transformer management functions.
 """
 
-import numpy as np
+import time
+import logging
+from collections import OrderedDict
 from functools import wraps as _wraps
 
+import numpy as np
+
 from .sym_utils import *
+from .param_store import ParamStore, allocated_bytes
+from .common import trace
 
 class Transformer(object):
     """ Base transformer object
@@ -176,6 +182,194 @@ def apply_pass(pass_t, **updates):
         return ret
     return wrapper
 
+def infer_graph_shapes(symbol, params):
+    """ Collect the infer shapes of all the operators in graph.
+
+        All the internal outputs are inferred with one `infer_shape`
+            invocation instead of one for each operator.
+
+        Parameters
+        __________
+        symbol : mxnet.symbol
+            The graph symbols, input shape should be attached.
+        params : dict
+            The graph parameters dict.
+
+        Returns
+        _______
+        ret : dict
+            The name-shape map.
+    """
+    internals = symbol.get_internals()
+    shapes = {k: params[k].shape \
+        for k in internals.list_arguments() if k in params}
+    _, oshps, _ = internals.infer_shape(**shapes)
+    infer_shapes = {}
+    for op, shp in zip(internals, oshps):
+        infer_shapes.setdefault(op.attr('name'), []).append(shp)
+    return infer_shapes
+
+class _LazyShapes(dict):
+    """ Infer shapes dict whose missing entries, operators generated
+            by the passes, are inferred from the graph lazily.
+    """
+    def __init__(self, shapes, graph, params):
+        super(_LazyShapes, self).__init__(shapes)
+        self.graph, self.params = graph, params
+        self.nodes = {}
+
+    def reset(self, op):
+        """ Drop the shape of the name reused by the rebuilt operator,
+                which is inferred from the operator lazily.
+        """
+        name = op.attr('name')
+        self.pop(name, None)
+        self.nodes[name] = op
+
+    def __missing__(self, name):
+        op = self.nodes.get(name, None)
+        if op is None:
+            op = self.graph[name]
+        shapes = {k: self.params[k].shape \
+            for k in op.list_arguments() if k in self.params}
+        _, oshp, _ = op.infer_shape(**shapes)
+        self[name] = oshp
+        return oshp
+
+def _new_nodes(op, graph, reused=()):
+    """ Operators created by pass, which are not in graph yet or
+            rebuilt under the `reused` names, in topological order.
+    """
+    order, visited = [], set()
+    stack = [(c, False) for c in reversed(sym_iter(op.get_children()) or [])]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        name = node.attr('name')
+        if (name in graph and name not in reused) or name in visited:
+            continue
+        visited.add(name)
+        stack.append((node, True))
+        childs = sym_iter(node.get_children()) or []
+        stack.extend((c, False) for c in reversed(childs))
+    return order
+
+class PassPipeline(object):
+    """ Compose the registered per-operator passes into one graph
+            traversal.
+
+        The passes are applied on each operator in order, which is
+            equivalent to invoking `topo_visit_transformer` for each
+            pass in turn as long as the passes are compatible, that is,
+            the former pass doesn't rely on the graph rewritten by the
+            latter ones. Operators generated by a pass, including the
+            one rebuilt under the name of the visited operator, are
+            visited by the following passes only, the same as
+            sequential passes. The other operators of the returned
+            graph must be the original ones, or new names.
+
+        Compared with the sequential passes, the operators are rebuilt
+            only if the pass or the inputs changed, and the infer
+            shapes are collected once.
+
+        Parameters
+        __________
+        passes : list of str
+            The registered pass names, such as `fuse_transpose` and
+            `rewrite`.
+        name : str
+            The name manager prefix of generated operators.
+
+        Example
+        _______
+        .. code-block:: python
+
+            pipeline = PassPipeline(["fuse_transpose", "rewrite"])
+            symbol, params = pipeline(symbol, params)
+            print (pipeline.timings)
+    """
+    def __init__(self, passes, name="pipeline"):
+        for pass_t in passes:
+            if pass_t not in _pass_manager:
+                raise NameError("Pass %s has not been registered" % pass_t)
+        self.passes = list(passes)
+        self.name = name
+        self.timings = OrderedDict()
+
+    def __call__(self, symbol, params, **kwargs):
+        """ Apply the passes on graph in a single sweep.
+
+            Extra keyword arguments are passed to each pass.
+        """
+        return N.register_nm(self.name)(self._run)(
+            symbol, params, **kwargs)
+
+    def _rebuild(self, op, graph, dirty):
+        childs = sym_iter(op.get_children())
+        if childs is None or \
+                not any(c.attr('name') in dirty for c in childs):
+            return op
+        start = time.time()
+        childs = [get_node(c, graph) for c in childs]
+        op = get_mxnet_op(op.attr('op_name'))(
+            *childs, **op.list_attr(), name=op.attr('name'))
+        self.timings["rebuild"] += time.time() - start
+        return op
+
+    def _visit(self, op, start, dirty, **kwargs):
+        graph = kwargs['graph']
+        name, origin = op.attr('name'), op
+        op = graph[name] = self._rebuild(op, graph, dirty)
+        for i in range(start, len(self.passes)):
+            pass_t, tic = self.passes[i], time.time()
+            with trace.span(op.attr('op_name'), cat="op", pass_name=pass_t):
+                ret = apply_pass(pass_t, infer_shapes=self.infer_shapes)(
+                    op, **kwargs)
+            self.timings[pass_t] += time.time() - tic
+            if ret is None or ret is op:
+                continue
+            # the pass may rebuild the operator under its name inside
+            # the returned graph with another shape, such as
+            # `reverse_transpose` and the `fuse_transpose` of Concat.
+            reused = () if ret.attr('name') == name else (name,)
+            renamed = set()
+            for node in _new_nodes(ret, graph, reused):
+                if node.attr('name') in reused:
+                    self.infer_shapes.reset(node)
+                if self._visit(node, i + 1, renamed, **kwargs):
+                    renamed.add(node.attr('name'))
+            op = graph[name] = self._rebuild(ret, graph, renamed)
+        return op is not origin
+
+    def _run(self, symbol, params, **kwargs):
+        logger = logging.getLogger("log.mrt.pipeline")
+        self.timings = OrderedDict((k, 0.) for k in \
+            ["infer_shape", "rebuild"] + self.passes)
+        graph, params = {}, ParamStore(params)
+
+        start = time.time()
+        with trace.span("infer_shape", cat="pass"):
+            self.infer_shapes = _LazyShapes(
+                infer_graph_shapes(symbol, params), graph, params)
+        self.timings["infer_shape"] = time.time() - start
+
+        changed = set()
+        for op in topo_sort(symbol):
+            if self._visit(op, 0, changed,
+                           params=params, graph=graph, **kwargs):
+                changed.add(op.attr('name'))
+        nodes = [get_node(op, graph) for op in symbol]
+        ret = get_mxnet_op("Group")(nodes) if len(nodes) > 1 else nodes[0]
+
+        del self.infer_shapes
+        logger.info("pipeline %s: %d/%d operators changed, %s",
+                    self.name, len(changed), len(graph),
+                    ", ".join("%s=%.3fs" % (k, v) \
+                        for k, v in self.timings.items()))
+        return ret, params
+
 OUT_KEY = "out_key"
 TARGET_KEY = "target_key"
 MAX_BIT = 32
@@ -187,6 +381,8 @@ class N(object):
     _global_name = _NoneName
     _count = {}
     _name_manager = {}
+    allocated = {}
+    """ Parameters bytes allocated by the registered passes. """
 
     @staticmethod
     def n(name=""):
@@ -219,7 +415,13 @@ class N(object):
                 old_name = N._global_name
                 N._set_global(name)
                 N._count[name] += 1
-                ret = pass_f(symbol, params, *args, **kwargs)
+                start = allocated_bytes()
+                with trace.span(name, cat="pass"):
+                    ret = pass_f(symbol, params, *args, **kwargs)
+                nbytes = allocated_bytes() - start
+                N.allocated[name] = N.allocated.get(name, 0) + nbytes
+                logging.getLogger("log.mrt.params").debug(
+                    "pass %-20s allocated %10d bytes", name, nbytes)
                 N._global_name = old_name
                 return ret
             return run
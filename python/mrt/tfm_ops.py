@@ -1775,12 +1775,14 @@ class Custom(Transformer):
         """ Customized validate pass Introduction.
 
             The op type only support 'cvm_clip', 
-            `cvm_left_shift`, 'cvm_right_shift', 'cvm_lut'.
+            `cvm_left_shift`, 'cvm_right_shift', 'cvm_requant',
+            'cvm_lut'.
         """
         attr = op.list_attr()
         op_type = attr['op_type']
         assert op_type in ['cvm_clip', 'cvm_left_shift',
-                           'cvm_right_shift', 'cvm_lut'], \
+                           'cvm_right_shift', 'cvm_requant',
+                           'cvm_lut'], \
             "Invalid op_type:%s in Custom operator" % op_type
         return op
 
@@ -1805,6 +1807,12 @@ class Custom(Transformer):
             new_attrs['precision'] = attr['precision']
             sym = get_nnvm_op(op_type)(*childs, name=N.n('cvm_clip'),
                                        **new_attrs)
+        elif op_type == 'cvm_requant':
+            new_attrs['precision'] = attr['precision']
+            new_attrs['multiplier'] = attr['multiplier']
+            new_attrs['shift_bit'] = attr['shift_bit']
+            sym = get_nnvm_op(op_type)(*childs, name=N.n('cvm_requant'),
+                                       **new_attrs)
         elif op_type == 'cvm_lut':
             new_attrs['in_dim'] = attr['in_dim']
             sym = get_nnvm_op(op_type)(*childs, name=N.n('cvm_lut'),
@@ -9,12 +9,13 @@ import numpy as np
 import time
 from copy import deepcopy
 
-from .tfm_utils import get_bit, scale, requant
+from .tfm_utils import get_bit, scale, requant, realize
 from .sym_utils import is_var, is_params, is_inputs
 from .tfm_base import *
 from . import dataset as ds
 from . import utils
 from . import sim_quant_helper as sim
+from .np_executor import NumpyExecutor
 
 # === symbol pass == 
 
@@ -218,6 +219,100 @@ def prepare_for_compile(symbol, params):
     return topo_visit_transformer(symbol, params,
             apply_pass("prepare_for_compile", infer_shapes=infer_shapes))
 
+_REQUANT_OPS = ['cvm_clip', 'cvm_left_shift',
+                'cvm_right_shift', 'cvm_requant']
+
+def _requant_attr(op):
+    """ Normalize requantization op into (multiplier, shift_bit, precision).
+
+        The shift bit is positive for right shift, negative for left
+            shift and zero for clip only.
+    """
+    attr = op.list_attr()
+    op_type, prec = attr['op_type'], get_attr(attr, 'precision')
+    if op_type == 'cvm_clip':
+        return 1, 0, prec
+    sb = get_attr(attr, 'shift_bit')
+    if op_type == 'cvm_left_shift':
+        return 1, -sb, prec
+    elif op_type == 'cvm_right_shift':
+        return 1, sb, prec
+    return get_attr(attr, 'multiplier', 1), sb, prec
+
+def _scalar_multiplier(op, params):
+    """ The positive integer constant of `broadcast_mul(X, const)`
+            generated by requantization, or None.
+    """
+    if op.attr('op_name') != 'broadcast_mul':
+        return None
+    W = sym_iter(op.get_children())[1]
+    if not is_params(W, params) or params[W.attr('name')].size != 1:
+        return None
+    value = params[W.attr('name')].asscalar()
+    if value < 1 or value != int(value):
+        return None
+    return int(value)
+
+@N.register_nm("fuse_requant")
+def fuse_requant(symbol, params):
+    """ Customized graph-level topo pass definition.
+
+        Equivalent graph transformation.
+        Collapse the requantization chains generated by
+        :func:`mrt.tfm_utils.requant_operator` and the `quantize`
+        pass into single operator:
+
+        .. code-block:: none
+
+            clip(clip(X, p1), p2) -> clip(X, min(p1, p2))
+            clip(shift(X, sb, p1), p2) -> shift(X, sb, min(p1, p2))
+            shift(broadcast_mul(X, m), sb, p) -> cvm_requant(X, m, sb, p)
+
+        Only the nodes consumed by the requantization op exclusively
+            are fused. Adjacent shifts are not fused since the rounding
+            of the intermediate result is not equivalent.
+    """
+    logger = logging.getLogger('log.mrt.fuse_requant')
+    refs = {}
+    for op in topo_sort(symbol):
+        for c in sym_iter(op.get_children()) or []:
+            refs[c.attr('name')] = refs.get(c.attr('name'), 0) + 1
+    for op in symbol:
+        refs[op.attr('name')] = refs.get(op.attr('name'), 0) + 1
+
+    def _impl(op, params, graph):
+        name, attr = op.attr('name'), op.list_attr()
+        if op.attr('op_name') != 'Custom' or \
+                attr['op_type'] not in _REQUANT_OPS:
+            return op
+        X = sym_iter(op.get_children())[0]
+        mul, sb, prec = _requant_attr(op)
+        fused = False
+        while refs.get(X.attr('name'), 0) == 1:
+            xmul = _scalar_multiplier(X, params)
+            if mul == 1 and sb == 0 and X.attr('op_name') == 'Custom' \
+                    and X.list_attr()['op_type'] in _REQUANT_OPS:
+                mul, sb, xprec = _requant_attr(X)
+                prec = min(prec, xprec)
+            elif xmul is not None and mul * xmul < INT32_MAX:
+                mul *= xmul
+            else:
+                break
+            X, fused = sym_iter(X.get_children())[0], True
+        if not fused:
+            return op
+        if mul == 1:
+            return realize(X, sb, prec, name=name)
+        return mx.sym.Custom(X, precision=prec, multiplier=mul,
+                             shift_bit=sb, name=name,
+                             op_type='cvm_requant')
+
+    nsym, nparams = topo_visit_transformer(symbol, params, _impl)
+    nsym, nparams = params_unique(nsym, nparams)
+    logger.info("fuse requantization nodes %d -> %d",
+                len(topo_sort(symbol)), len(topo_sort(nsym)))
+    return nsym, nparams
+
 
 @N.register_nm("cvm")
 def to_cvm(symbol, params):
@@ -416,8 +511,6 @@ def fuse_constant(symbol, params):
 
         Fix the constant operator shape with respect to the infer shape.
     """
-    nparams = convert_params_dtype(params, dest_dtype="float32")
-
     def _impl(op, params, graph):
         name, op_name = op.attr('name'), op.attr('op_name')
         childs, attr = sym_iter(op.get_children()), op.list_attr()
@@ -428,16 +521,116 @@ def fuse_constant(symbol, params):
             attr = { 'precision': str(get_bit(params[name])) }
             op = mx.sym.var(name, shape=params[name].shape, attr=attr)
         elif all([is_params(c, params) for c in childs]):
-            in_params = [params[c.attr('name')] for c in childs]
+            # only the folded inputs are converted, instead of
+            # the whole params round trip into float32
+            in_params = [params[c.attr('name')].astype(
+                "float32", copy=False) for c in childs]
             params[name] = get_nd_op(op_name)(*in_params, **attr)
             attr = { 'precision': str(get_bit(params[name])) }
             op = mx.sym.var(name, shape=params[name].shape, attr=attr)
         return op
 
-    sym, params = topo_visit_transformer(symbol, nparams, _impl)
+    sym, params = topo_visit_transformer(symbol, params, _impl)
     params = convert_params_dtype(params, dest_dtype="float64")
     return sym, params
 
+def _eval_constants(outputs, params):
+    """ Evaluate the constant subgraphs in one executor call.
+
+        The NumPy executor is used if all the operators have registered
+            kernels supporting the attributes, or fallback to the MxNet
+            executor. The kernels check the attributes on forward.
+    """
+    group = mx.sym.Group(outputs)
+    try:
+        outs = NumpyExecutor(group, params).forward()
+    except NotImplementedError:
+        args = {k: params[k] for k in group.list_arguments()}
+        aux = {k: params[k] for k in group.list_auxiliary_states()}
+        exe = group.bind(mx.cpu(), args=args, aux_states=aux,
+                         grad_req='null')
+        return [o.astype("float64") for o in exe.forward()]
+    return [nd.array(o, dtype="float64") for o in outs]
+
+@N.register_nm("fold")
+def fold_constant(symbol, params):
+    """ Customized graph-level topo pass definition.
+
+        Constant folding and dead node elimination.
+
+        The maximal constant subgraphs, whose leaves are all parameters
+            or operators without inputs, are evaluated in one executor
+            call, and replaced with parameters. The parameters which
+            are no longer referenced by the graph are dropped.
+
+        Parameters
+        __________
+        symbol : mxnet.symbol
+            The graph symbols.
+        params : dict
+            The graph parameters dict.
+
+        Returns
+        _______
+        ret : tuple
+            The symbol-param tuple after folding.
+    """
+    logger = logging.getLogger('log.mrt.fold')
+    order = topo_sort(symbol)
+    const = {}
+    for op in order:
+        childs = sym_iter(op.get_children())
+        if is_var(op, params):
+            const[op.attr('name')] = is_params(op, params)
+        else:
+            const[op.attr('name')] = childs is None or \
+                all(const[c.attr('name')] for c in childs)
+
+    # constant entries consumed by the variant operators or outputs
+    folded = {}
+    consumers = [c for op in order if not const[op.attr('name')] \
+        for c in sym_iter(op.get_children()) or []] + list(symbol)
+    for c in consumers:
+        name = c.attr('name')
+        if const[name] and not is_var(c, params):
+            folded[(name, get_entry_id(c))] = c
+    if not folded:
+        _, nparams = params_unique(symbol, params)
+        return symbol, ParamStore(nparams)
+
+    keys = list(folded.keys())
+    values = _eval_constants([folded[k] for k in keys], params)
+    nparams, graph = ParamStore(params), {}
+    for (name, idx), value in zip(keys, values):
+        vname = name if idx == 0 else "%s_%d" % (name, idx)
+        nparams[vname] = value
+        attr = { 'precision': str(get_bit(value)) }
+        graph[(name, idx)] = mx.sym.var(vname, shape=value.shape, attr=attr)
+
+    nodes = {}
+    def _get(c):
+        key = (c.attr('name'), get_entry_id(c))
+        return graph[key] if key in graph else nodes[key[0]][key[1]]
+    for op in order:
+        name, op_name = op.attr('name'), op.attr('op_name')
+        if const[name] and not is_var(op, params):
+            continue
+        childs = sym_iter(op.get_children())
+        if childs is not None:
+            childs = [_get(c) for c in childs]
+            op = get_mxnet_op(op_name)(*childs, **op.list_attr(), name=name)
+        nodes[name] = op
+    outs = [_get(s) for s in symbol]
+    nsym = outs[0] if len(outs) == 1 else mx.sym.Group(outs)
+    _, nparams = params_unique(nsym, nparams)
+    nparams = ParamStore(nparams)
+
+    logger.info("fold %d constant subgraphs, nodes %d -> %d, " + \
+                "params %.2f MB -> %.2f MB", len(keys), len(order),
+                len(topo_sort(nsym)), ParamStore(params).nbytes / 2**20,
+                nparams.nbytes / 2**20)
+    return nsym, nparams
+
 @N.register_nm("ais")
 def attach_input_shape(symbol, params, input_shapes):
     """ Customized graph-level topo pass definition.
@@ -702,8 +895,9 @@ def _get_opt(out, lambd):
 
     opt = absmax
     if alpha < 0.95 * absmax:
-        print ("mean, std = [", mean, std, "]", "alpha=", alpha,
-               "absmax=", absmax)
+        logging.getLogger("log.mrt.calibrate").debug(
+            "mean, std = [%s %s] alpha=%s absmax=%s",
+            mean, std, alpha, absmax)
         opt = alpha
     #  if opt > 30:
         #  print ("mean, std = [", mean, std, "]", "alpha=", alpha,
@@ -736,8 +930,6 @@ def sym_calibrate(symbol, params, data, **kwargs):
     th_dict, out_cache = {}, {}
     ctx = kwargs.get('ctx', mx.cpu())
     logger.info("calibrate model outputs")
-    nparams = convert_params_dtype(params, src_dtypes="float64",
-            dest_dtype="float32")
     data = data.astype('float32')
 
     def _impl(op, params, graph, **kwargs):
@@ -746,7 +938,9 @@ def sym_calibrate(symbol, params, data, **kwargs):
         name, op_name = op.attr('name'), op.attr('op_name')
         childs, attr = sym_iter(op.get_children()), op.list_attr()
         if op_name == 'null':
-            out = data if is_inputs(op, params) else params[name]
+            # convert lazily, released with the out cache
+            out = data if is_inputs(op, params) else \
+                params[name].astype('float32', copy=False)
         elif childs is None:
             out = get_nd_op(op_name)(**attr)
         else:
@@ -770,11 +964,14 @@ def sym_calibrate(symbol, params, data, **kwargs):
             th_dict[name] = max(old_ths[name], opts)
         else:
             th_dict[name] = opts
-            p = logger.debug if opts < 30 else logger.warn
-            p("collect symbol %-40s out_shape=%-20s th_dict: (%s)",
+            level = logging.DEBUG if opts < 30 else logging.WARNING
+            # skip formatting the per-node line unless it's emitted
+            if logger.isEnabledFor(level):
+                logger.log(level,
+                    "collect symbol %-40s out_shape=%-20s th_dict: (%s)",
                     name, [o.shape for o in out], th_dict[name])
 
-    topo_visit_transformer(symbol, nparams, _impl, logger=logger,
+    topo_visit_transformer(symbol, params, _impl, logger=logger,
             deps=deps, data=data, **kwargs)
     out_cache.clear()
 
@@ -793,18 +990,14 @@ def convert_params_dtype(params, src_dtypes=["float32", "float64"],
 
         Returns
         _______
-        ret : int
-            The precision of the input.
+        ret : ParamStore
+            The parameters sharing the tensors needless to convert.
     """
-    if not params:
-        return {}
     if isinstance(src_dtypes, str):
         src_dtypes = [src_dtypes]
-    nparams = {}
+    nparams = ParamStore(params)
     for k, v in params.items():
         dtype = v.dtype.__name__
         if dtype != dest_dtype and dtype in src_dtypes:
             nparams[k] = v.astype(dest_dtype)
-        else:
-            nparams[k] = v
     return nparams
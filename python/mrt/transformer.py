@@ -9,6 +9,8 @@
 import logging
 import os
 from os import path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 import mxnet as mx
@@ -22,7 +24,7 @@ from . import cvm_op   # pylint: disable=unused-import
 from . import tfm_pass as tpass
 from .tfm_pass import OUT_KEY, convert_params_dtype
 from .tfm_pass import sym_calibrate, quantize, to_cvm
-from .tfm_pass import prepare_for_compile, fuse_constant
+from .tfm_pass import prepare_for_compile, fold_constant
 from .tfm_pass import calculate_ops, collect_op_names
 
 from . import sym_utils as sutils
@@ -43,6 +45,9 @@ __all__ = ["Model", "MRT", "ModelSpliter", "ModelMerger",
 class Model:
     """ Wrapper of Mxnet symbol and params, design
             with user-friendly model API.
+
+        The params is a :class:`mrt.param_store.ParamStore` sharing
+            the read-only tensors with the models derived by graph passes.
     """
     def __init__(self, symbol, params, dtype="float64"):
         self.symbol = symbol
@@ -63,11 +68,17 @@ class Model:
     def names(self):
         return self.output_names()
 
-    def to_graph(self, dtype="float32", ctx=mx.cpu()):
+    def to_graph(self, dtype="float32", ctx=mx.cpu(), native_ops=False):
         """ Convenient helper function to create model runtime,
                 returns gluon.nn.SymbolBlock.
+
+            The custom ops will be lowered into equivalent builtin
+                MxNet compositions if `native_ops` is set, which
+                avoids the python CustomOp callback in forward.
         """
-        graph = gluon.nn.SymbolBlock(self.symbol, \
+        symbol = cvm_op.lower_custom_ops(self.symbol) \
+            if native_ops else self.symbol
+        graph = gluon.nn.SymbolBlock(symbol, \
             [mx.sym.var(n) for n in self.input_names()])
         utils.load_parameters(graph, convert_params_dtype(
             self.params,
@@ -78,7 +89,7 @@ class Model:
         """ Model dump to disk. """
         with open(symbol_file, 'w') as fout:
             fout.write(self.symbol.tojson())
-        nd.save(params_file, self.params)
+        nd.save(params_file, dict(self.params))
 
     @staticmethod
     def load(symbol_file, params_file):
@@ -103,10 +114,14 @@ class Model:
 
     def to_cvm(self, model_name, datadir="/data/stdout",
                        input_shape=None, target="gpu",
-                       device_ids=None):
+                       device_ids=None, num_workers=None,
+                       blob_store=None, fuse_requant=False):
         return compile_to_cvm(self, model_name, datadir,
                               input_shape, target,
-                              device_ids=device_ids)
+                              device_ids=device_ids,
+                              num_workers=num_workers,
+                              blob_store=blob_store,
+                              fuse_requant=fuse_requant)
 
     def fix_original_model(self, model_dir, model_name):
         # unify graph names and check graph params
@@ -116,7 +131,7 @@ class Model:
         sym_file, prm_file = utils.extend_fname(model_prefix)
         with open(sym_file, "w") as f:
             f.write(self.symbol.tojson())
-        nd.save(prm_file, self.params)
+        nd.save(prm_file, dict(self.params))
 
 def init(model, input_shape=None):
     logger = logging.getLogger("mrt.prepare")
@@ -137,11 +152,10 @@ def init(model, input_shape=None):
     tpass.infer_shape(_sym, _prm) # check infer_shape is correct
 
     _sym, _prm = tpass.fuse_multiple_outputs(_sym, _prm)
-    _sym, _prm = tpass.fuse_constant(_sym, _prm)
-    _sym, _prm = tpass.fuse_transpose(_sym, _prm)
-    _sym, _prm = tpass.rewrite(_sym, _prm)
-    _sym, _prm = tpass.fuse_constant(_sym, _prm)
-    _sym, _prm = tpass.params_unique(_sym, _prm)
+    _sym, _prm = tpass.fold_constant(_sym, _prm)
+    _sym, _prm = tpass.PassPipeline(
+        ["fuse_transpose", "rewrite"], name="prepare")(_sym, _prm)
+    _sym, _prm = tpass.fold_constant(_sym, _prm)
 
     return Model(_sym, _prm)
 
@@ -151,7 +165,7 @@ class MRT:
 
         **Quantization Procedures**
 
-        1. prepare: initial of model graph, such as fuse_constant, rewrite, validate, ...etc;
+        1. prepare: initial of model graph, such as fold_constant, rewrite, validate, ...etc;
 
         2. calibration: caculate the internal thresholds of layers;
 
@@ -438,27 +452,94 @@ class ModelMerger:
         return [1 if v=="None" else base_oscales[name_idx[v]] \
             for k, v in maps.items()]
 
-def reduce_graph(model, input_shapes):
+def reduce_graph(model, input_shapes, fuse_requant=False):
     _sym, _prm = model.symbol, model.params
     _sym, _prm = tpass.attach_input_shape(
         _sym, _prm, input_shapes)
 
     _sym, _prm = prepare_for_compile(_sym, _prm)
-    _sym, _prm = fuse_constant(_sym, _prm)
+    _sym, _prm = fold_constant(_sym, _prm)
+    if fuse_requant:
+        _sym, _prm = tpass.fuse_requant(_sym, _prm)
     return Model(_sym, _prm)
 
+def _lower_param(name, value, precision, chunk_size=1 << 22):
+    """ Validate and narrow the parameter into deploy integer type.
+
+        The range is checked via reductions and the exactness is
+        checked chunk by chunk, which avoids full-array temporaries.
+    """
+    dtype, bound = (sutils.INT32_TYPE, sutils.INT32_MAX) \
+        if precision > 8 else (sutils.INT8_TYPE, sutils.INT8_MAX)
+    flat = value.asnumpy() if hasattr(value, "asnumpy") \
+        else np.asarray(value)
+    assert flat.size == 0 or \
+        (flat.min() >= -bound and flat.max() <= bound), \
+        "key: {}\nvalue out of {} range: {}".format(name, dtype, flat)
+    out = np.empty(flat.shape, dtype=dtype)
+    np.copyto(out, flat, casting="unsafe")
+    src, dst = flat.reshape(-1), out.reshape(-1)
+    for start in range(0, src.size, chunk_size):
+        end = start + chunk_size
+        assert np.array_equal(src[start:end], dst[start:end]), \
+            "key: {}\nvalue is not integer: {}".format(name, flat)
+    return out
+
+def _lower_params(params, precisions, num_workers=None):
+    """ Lower parameters concurrently, yielding in order.
+
+        At most `2 * num_workers` tensors are in flight, so the peak
+        memory is bounded by the largest tensors instead of the model.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    names = list(precisions.keys())
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = deque()
+        for name in names:
+            futures.append(executor.submit(
+                _lower_param, name, params[name], precisions[name]))
+            if len(futures) >= 2 * num_workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
 def compile_to_cvm(model, model_name, datadir="/data/std_out",
                    input_shape=None, target="gpu",
-                   device_ids=None):
+                   device_ids=None, num_workers=None, blob_store=None,
+                   fuse_requant=False):
     """ Compile Mxnet model into CVM Accept-JSON&BIN-Format
+
+        Parameters are validated and narrowed into int8/int32 in a
+        single pass over a thread pool, and streamed into the params
+        file directly.
+
+        If `blob_store` directory is specified, the parameters are
+        saved as content-hashed blobs deduplicated across models
+        instead, referred by the `params.blobs` manifest, see
+        :mod:`cvm.blobs`.
+
+        If `fuse_requant` is set, the requantization chains are fused
+        into `cvm_requant` operators, see :func:`mrt.tfm_pass.fuse_requant`.
+        The compiled model can only be loaded by the runtime supporting
+        `cvm_requant`, so it is disabled by default.
+
+        The `target` and `device_ids` are ignored since the parameters
+        are lowered on host, and kept for the compatibility of callers.
+
+        Returns
+        _______
+        ret : tuple
+            The deploy graph and the in-memory
+            :class:`cvm.params.ParamArena` of dumped parameters, which
+            holds no file open.
     """
     logger = logging.getLogger("mrt.compile")
     datadir = path.join(datadir, model_name)
     os.makedirs(datadir, exist_ok=True)
 
     if input_shape is None:
-        for sym in topo_sort(symbol):
-            if sutils.is_inputs(sym, params):
+        for sym in topo_sort(model.symbol):
+            if sutils.is_inputs(sym, model.params):
                 _, oshp, _ = sym.infer_shape()
                 input_shape = oshp[0]
                 break
@@ -466,45 +547,42 @@ def compile_to_cvm(model, model_name, datadir="/data/std_out",
 
     # transform from mxnet symbol to cvm
     logger.info("Transform Mxnet symbol into CVM")
-    model = reduce_graph(model, input_shapes)
+    model = reduce_graph(model, input_shapes, fuse_requant)
     symbol, params = model.symbol, model.params
     cvm_sym, params = to_cvm(symbol, params)
     logger.info("Transform Mxnet symbol into CVM finished")
 
-    dtype, cvm_params = "int32", {}
-    cvm_ctx = cvm.context(target, dev_id=device_ids)
+    shapes, precisions = dict(input_shapes), {}
     for sym in topo_sort(cvm_sym):
         if sutils.is_params(sym, params):
-            key, value = sym.attr('name'), params[sym.attr('name')]
-            flat = value.asnumpy()
-            assert np.abs(flat).max() <= sutils.INT32_MAX, \
-                "key: {}\nvalue: {}".format(key, value)
-            assert (flat.astype(dtype).astype("float64") == flat).all(), \
-                "key: {}\nvalue: {}".format(key, value)
-            cvm_params[key] = cvm.nd.array(flat.astype(dtype), ctx=cvm_ctx)
+            name, attr = sym.attr('name'), sym.list_attr()
+            precisions[name] = sutils.get_attr(attr, "precision")
+            shapes[name] = params[name].shape
         elif sutils.is_inputs(sym, params):
             assert sym.attr('name') == 'data'
 
     # compile to JSON&Bytes format
     logger.info("Compile into CVM graph")
-    deploy_graph, cvm_params = cvm.graph.build(
-        cvm_sym, cvm_params, shape=input_shapes)
-
-    # cvm parameters reduce
-    logger.info("Parameters precision reduce")
-    for sym in topo_sort(cvm_sym):
-        if sutils.is_params(sym, cvm_params):
-            name, attr = sym.attr('name'), sym.list_attr()
-            precision = sutils.get_attr(attr, "precision")
-            dtype = "int32" if precision > 8 else "int8"
-            cvm_params[name] = cvm.nd.array(
-                params[name].asnumpy().astype(dtype), ctx=cvm_ctx)
+    deploy_graph, _ = cvm.graph.build(cvm_sym, None, shape=shapes)
 
     # dump
     logger.info("CVM Json&Params dump")
     with open(path.join(datadir, "symbol"), "w") as fout:
         fout.write(deploy_graph.json())
-    param_bytes = cvm.nd.save_param_dict(cvm_params)
-    with open(path.join(datadir, "params"), "wb") as fout:
-        fout.write(param_bytes)
-    return deploy_graph, cvm_params
+    params_file = path.join(datadir, "params")
+    manifest_file = path.join(datadir, cvm.blobs.MANIFEST_NAME)
+    if blob_store is not None:
+        store = cvm.blobs.BlobStore(blob_store)
+        entries = store.put_params(list(precisions.keys()),
+            _lower_params(params, precisions, num_workers))
+        cvm.blobs.save_manifest(manifest_file, store, entries)
+        if path.exists(params_file):
+            os.remove(params_file)
+        return deploy_graph, cvm.params.load_params(store.assemble(entries))
+
+    with open(params_file, "wb") as fout:
+        cvm.params.write_params(fout, list(precisions.keys()),
+            _lower_params(params, precisions, num_workers))
+    if path.exists(manifest_file):
+        os.remove(manifest_file)
+    return deploy_graph, cvm.params.load_params(params_file, use_mmap=False)
@@ -0,0 +1,47 @@
+from _base import *
+from cost_model import parse_cvm_profile, calibrate
+
+# the runtime prints the running totals after each of the two runs
+PROFILE_LOG = """
+-------------op time metrix--------------
+conv2d               : \t0.0300s\t75.0000%
+relu                 : \t0.0100s\t25.0000%
+#####total time = 0.040s
+-------------op time metrix-----------------
+
+-------------op time metrix--------------
+conv2d               : \t0.0600s\t150.0000%
+relu                 : \t0.0200s\t50.0000%
+#####total time = 0.040s
+-------------op time metrix-----------------
+
+"""
+
+class TestCostModel(unittest.TestCase):
+    def test_parse_profile(self):
+        times = parse_cvm_profile(PROFILE_LOG)
+        self.assertEqual(times, {"conv2d": 0.06, "relu": 0.02})
+        # the incomplete table at the end is ignored
+        times = parse_cvm_profile(
+            PROFILE_LOG + PROFILE_LOG.split("#####")[0])
+        self.assertEqual(times, {"conv2d": 0.06, "relu": 0.02})
+
+    def test_calibrate(self):
+        rows = [
+            {"op_name": "Convolution", "predicted_ms": 10.},
+            {"op_name": "Convolution", "predicted_ms": 5.},
+            {"op_name": "relu", "predicted_ms": 20.},
+            {"op_name": "Pooling", "predicted_ms": 4.},
+        ]
+        factors = calibrate(rows, parse_cvm_profile(PROFILE_LOG), runs=2)
+        self.assertAlmostEqual(factors["conv2d"], 2.)
+        self.assertAlmostEqual(factors["relu"], 0.5)
+        self.assertEqual(len(factors), 2)
+        self.assertAlmostEqual(rows[0]["calibrated_ms"], 20.)
+        self.assertAlmostEqual(rows[2]["calibrated_ms"], 10.)
+        # not measured, scaled by the overall factor 40ms / 35ms
+        self.assertAlmostEqual(rows[3]["calibrated_ms"], 4. * 40 / 35)
+
+if __name__ == "__main__":
+    import sys
+    unittest.main(argv=sys.argv, verbosity=5)
@@ -0,0 +1,82 @@
+import numpy as np
+
+from _base import *
+import cvm_op # pylint: disable=unused-import
+from np_executor import NumpyExecutor
+from layer_compare import compare_streams, iter_nd_outputs
+
+class TestNumpyExecutor(TfmTest):
+    def _assert_forward(self, op, data_shape):
+        params = {k: mx.nd.round(v * 127) \
+            for k, v in self._collect_params(op).items() if k != 'data'}
+        data = mx.nd.round(mx.nd.uniform(-127, 127, data_shape))
+        exe = op.bind(mx.cpu(), {'data': data, **params})
+        des = exe.forward()[0].asnumpy()
+        executor = NumpyExecutor(op, params)
+        for _ in range(2):
+            out = executor(data=data)
+            self.assertTrue(np.array_equal(out, des))
+
+    def test_requant(self):
+        data = mx.sym.var('data', shape=(2, 3, 8, 8))
+        op = mx.sym.Convolution(data, kernel=(3, 3), pad=(1, 1),
+                                num_filter=4, name='conv')
+        op = mx.sym.Custom(op, precision=8, shift_bit=5,
+                           op_type='cvm_right_shift')
+        op = mx.sym.relu(op)
+        op = mx.sym.Custom(op, precision=6, op_type='cvm_clip')
+        op = mx.sym.Pooling(op, kernel=(2, 2), stride=(2, 2),
+                            pool_type='max')
+        op = mx.sym.flatten(op)
+        op = mx.sym.FullyConnected(op, num_hidden=5, name='fc')
+        self._assert_forward(op, (2, 3, 8, 8))
+
+    def test_pad(self):
+        for padding in ["((0, 0), (0, 0), (1, 1), (2, 0))",
+                        "((1, 0), (0, 2), (0, 0), (1, 1))"]:
+            data = mx.sym.var('data', shape=(2, 3, 4, 4))
+            op = mx.sym.Custom(data, padding=padding, op_type='cvm_pad')
+            op = mx.sym.relu(op)
+            data = mx.nd.round(mx.nd.uniform(-127, 127, (2, 3, 4, 4)))
+            exe = cvm_op.lower_custom_ops(op).bind(mx.cpu(), {'data': data})
+            des = exe.forward()[0].asnumpy()
+            executor = NumpyExecutor(op, {})
+            for _ in range(2):
+                out = executor(data=data)
+                self.assertEqual(out.shape, des.shape)
+                self.assertTrue(np.array_equal(out, des))
+
+class TestLayerCompare(TfmTest):
+    def test_lockstep(self):
+        data = mx.sym.var('data', shape=(2, 3, 8, 8))
+        op = mx.sym.Convolution(data, kernel=(3, 3), pad=(1, 1),
+                                num_filter=4, no_bias=True, name='conv')
+        op = mx.sym.relu(op, name='relu')
+        op = mx.sym.flatten(op, name='flatten')
+        params = {k: mx.nd.round(v * 127) \
+            for k, v in self._collect_params(op).items() if k != 'data'}
+        inputs = {'data': mx.nd.round(mx.nd.uniform(-127, 127, (2, 3, 8, 8)))}
+        names = {'conv', 'relu', 'flatten'}
+
+        diffs = list(compare_streams(
+            iter_nd_outputs(op, params, inputs),
+            NumpyExecutor(op, params).iter_outputs(**inputs), names))
+        self.assertEqual([d.name for d in diffs],
+                         ['conv', 'relu', 'flatten'])
+        for d in diffs:
+            self.assertEqual(d.max_abs, 0)
+            self.assertAlmostEqual(d.cosine, 1)
+
+        scaled = {'data': inputs['data'] * 2}
+        diffs = list(compare_streams(
+            iter_nd_outputs(op, params, inputs),
+            iter_nd_outputs(op, params, scaled), names,
+            scales={'conv': 2, 'relu': 2}, tolerance=0.1))
+        # flatten is not rescaled, which stops the comparison
+        self.assertEqual(diffs[-1].name, 'flatten')
+        self.assertAlmostEqual(diffs[0].rel_l2, 0)
+        self.assertGreater(diffs[-1].rel_l2, 0.1)
+
+if __name__ == "__main__":
+    import sys
+    unittest.main(argv=sys.argv, verbosity=5)
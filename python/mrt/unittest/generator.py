@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import numpy as np
+
+from _base import *
+import ops_generator as opg
+
+def _read_tree(datadir):
+    tree = {}
+    for root, _, files in os.walk(datadir):
+        for fname in files:
+            fpath = os.path.join(root, fname)
+            with open(fpath, "r") as fin:
+                tree[os.path.relpath(fpath, datadir)] = fin.read()
+    return tree
+
+class TestOpCorpus(unittest.TestCase):
+    def _op_units(self):
+        data = opg.ConcatIter(
+            opg.ConstantIter(opg.iter_constraint(6), shape=(2, 3)),
+            opg.ConstantIter(opg.iter_constraint(6), shape=(3, 2)))
+        axis = opg.IntIter(opg.list_constraint([-3, 0, 1]), name="axis")
+        return opg.OpUnitIter([data, axis], 1)
+
+    @staticmethod
+    def _sum(data, axis):
+        return [np.sum(np.array(data, dtype="int32"), axis=axis)]
+
+    def test_generate(self):
+        op_units = self._op_units()
+        with tempfile.TemporaryDirectory() as datadir:
+            corpus_dir = os.path.join(datadir, "corpus")
+            stats = op_units.generate("sum", self._sum, datadir=corpus_dir,
+                                      num_workers=2, shard_size=2)
+            self.assertEqual(stats["total"], 6)
+            self.assertEqual(stats["computed"], 6)
+            # axis -3 is out of range for 2-D data
+            self.assertEqual(stats["errors"], 2)
+
+            stats = op_units.generate("sum", self._sum, datadir=corpus_dir,
+                                      num_workers=2, shard_size=2)
+            self.assertEqual(stats["computed"], 0)
+            self.assertEqual(stats["skipped"], 6)
+
+            txt_dir = os.path.join(datadir, "txt")
+            dump_dir = os.path.join(datadir, "dump")
+            opg.OpCorpus(corpus_dir).export_txt("sum", txt_dir)
+            op_units.eval_data("sum", self._sum, is_dump=True,
+                               datadir=dump_dir)
+            tree = _read_tree(txt_dir)
+            self.assertTrue(tree)
+            self.assertEqual(tree, _read_tree(dump_dir))
+
+    def test_generate_version(self):
+        op_units = self._op_units()
+        with tempfile.TemporaryDirectory() as datadir:
+            op_units.generate("sum", self._sum, datadir=datadir,
+                              num_workers=1, version="1")
+            stats = op_units.generate("sum", self._sum, datadir=datadir,
+                                      num_workers=1, version="2", prune=True)
+            self.assertEqual(stats["computed"], 6)
+            index = opg.OpCorpus(datadir).load_index("sum")
+            self.assertEqual(len(index["cases"]), 6)
+            self.assertEqual(
+                {c["fingerprint"] for c in index["cases"].values()}, {"2"})
+
+if __name__ == "__main__":
+    import sys
+    unittest.main(argv=sys.argv, verbosity=5)
@@ -1,6 +1,9 @@
 import sys
 from ops import *
 from passes import *
+from executor import *
+from generator import *
+from costs import *
 
 if __name__ == "__main__":
     unittest.main(argv=sys.argv, verbosity=5)
@@ -1,5 +1,17 @@
+import tempfile
+from os import path
+
+import numpy as np
+
+import cvm
+from cvm import runtime
+
 from _base import *
+import cvm_op # pylint: disable=unused-import
 from transformer import transfer_multiple_inputs
+from tfm_pass import fuse_requant, fold_constant
+from tfm_base import PassPipeline
+from np_executor import NumpyExecutor
 
 class TestFuseMultiplyInputs(TfmTest):
     def test_fmi(self):
@@ -20,6 +32,148 @@ class TestFuseMultiplyInputs(TfmTest):
 
         self._assert_equal(sym, des)
 
+class TestFuseRequant(TfmTest):
+    def _requant_graph(self):
+        data = mx.sym.var('data', shape=(2, 3, 8, 8),
+                          attr={'precision': '8'})
+        weight = mx.sym.var('conv_weight', shape=(4, 3, 3, 3),
+                            attr={'precision': '8'})
+        scale = mx.sym.var('const_var_37', shape=(1,),
+                           attr={'precision': '7'})
+        params = {
+            'conv_weight': mx.nd.round(mx.nd.uniform(-127, 127, (4, 3, 3, 3))),
+            'const_var_37': mx.nd.array([37]),
+        }
+        op = mx.sym.Convolution(data, weight, kernel=(3, 3), pad=(1, 1),
+                                num_filter=4, no_bias=True, name='conv')
+        op = mx.sym.broadcast_mul(op, scale)
+        op = mx.sym.Custom(op, precision=8, shift_bit=16,
+                           op_type='cvm_right_shift')
+        op = mx.sym.Custom(op, precision=6, op_type='cvm_clip')
+        return op, params
+
+    def test_fuse_requant(self):
+        op, params = self._requant_graph()
+        sym, nparams = fuse_requant(op, params)
+
+        self.assertEqual(sym.attr('op_type'), 'cvm_requant')
+        self.assertEqual(sym.list_attr()['multiplier'], '37')
+        self.assertEqual(sym.list_attr()['precision'], '6')
+        self.assertNotIn('const_var_37', nparams)
+
+        x = mx.nd.round(mx.nd.uniform(-127, 127, (2, 3, 8, 8)))
+        des = NumpyExecutor(op, params)(data=x)
+        out = NumpyExecutor(sym, nparams)(data=x)
+        self.assertTrue(np.array_equal(out, des))
+
+    def test_fuse_requant_runtime(self):
+        op, params = self._requant_graph()
+        model = tfm.Model(op, params)
+        x = np.random.randint(-127, 128, (2, 3, 8, 8)).astype('int8')
+        outs = {}
+        with tempfile.TemporaryDirectory() as datadir:
+            for fuse in [False, True]:
+                model_name = "fused" if fuse else "unfused"
+                model.to_cvm(model_name, datadir=datadir,
+                             input_shape=(2, 3, 8, 8), fuse_requant=fuse)
+                json_str, param_bytes = runtime.read_model_dir(
+                    path.join(datadir, model_name))
+                self.assertEqual(b'cvm_requant' in json_str, fuse)
+                for ctx in [cvm.cpu(), cvm.formal()]:
+                    net = runtime.CVMAPILoadModel(json_str, param_bytes, ctx)
+                    try:
+                        outs[fuse, str(ctx)] = runtime.CVMAPIInference(
+                            net, x.tobytes())
+                    finally:
+                        runtime.CVMAPIFreeModel(net)
+        des = outs[False, str(cvm.cpu())]
+        for key, out in outs.items():
+            self.assertEqual(out, des, key)
+
+class TestPassPipeline(TfmTest):
+    def test_pipeline(self):
+        data = mx.sym.var('data', shape=(2, 3, 8, 8))
+        weight = mx.sym.var('conv_weight', shape=(4, 3, 3, 3))
+        params = {'conv_weight': mx.nd.uniform(-1, 1, (4, 3, 3, 3))}
+        op = mx.sym.transpose(data, axes=(0, 2, 3, 1))
+        op = mx.sym.relu(op)
+        op = mx.sym.transpose(op, axes=(0, 3, 1, 2))
+        op = mx.sym.Convolution(op, weight, kernel=(3, 3), pad=(1, 1),
+                                num_filter=4, no_bias=True, name='conv')
+        pipeline = PassPipeline(["fuse_transpose", "rewrite"])
+        sym, nparams = pipeline(op, params)
+        self.assertEqual(list(pipeline.timings)[-2:],
+                         ["fuse_transpose", "rewrite"])
+
+        x = mx.nd.uniform(-1, 1, (2, 3, 8, 8))
+        des = NumpyExecutor(op, params)(data=x)
+        out = NumpyExecutor(sym, nparams)(data=x)
+        self.assertTrue(np.allclose(out, des))
+
+    def test_pipeline_reused_name(self):
+        # Concat.fuse_transpose rebuilds the concat under its own name
+        # with the shape before transpose.
+        data = mx.sym.var('data', shape=(2, 3, 8, 8))
+        weight = mx.sym.var('conv_weight', shape=(4, 6, 3, 3))
+        params = {'conv_weight': mx.nd.uniform(-1, 1, (4, 6, 3, 3))}
+        t1 = mx.sym.transpose(data, axes=(0, 2, 3, 1))
+        t2 = mx.sym.transpose(mx.sym.relu(data), axes=(0, 2, 3, 1))
+        op = mx.sym.concat(t1, t2, dim=3, name='concat')
+        op = mx.sym.relu(op)
+        op = mx.sym.transpose(op, axes=(0, 3, 1, 2))
+        op = mx.sym.Convolution(op, weight, kernel=(3, 3), pad=(1, 1),
+                                num_filter=4, no_bias=True, name='conv')
+        pipeline = PassPipeline(["fuse_transpose", "rewrite"])
+        sym, nparams = pipeline(op, params)
+        _, oshp, _ = sym.get_internals()['concat_output'].infer_shape()
+        self.assertEqual(oshp[0], (2, 6, 8, 8))
+
+        x = mx.nd.uniform(-1, 1, (2, 3, 8, 8))
+        des = NumpyExecutor(op, params)(data=x)
+        out = NumpyExecutor(sym, nparams)(data=x)
+        self.assertTrue(np.allclose(out, des))
+
+class TestFoldConstant(TfmTest):
+    def test_fold_constant(self):
+        data = mx.sym.var('data', shape=(2, 8))
+        weight = mx.sym.var('fc_weight', shape=(4, 8))
+        bias = mx.sym.var('fc_bias', shape=(4,))
+        params = {
+            'fc_weight': mx.nd.uniform(-1, 1, (4, 8), dtype='float64'),
+            'fc_bias': mx.nd.uniform(-1, 1, (4,), dtype='float64'),
+            'unused': mx.nd.zeros((1024,), dtype='float64'),
+        }
+        w = mx.sym.transpose(mx.sym.transpose(weight) * 2, name='w')
+        b = mx.sym.broadcast_add(bias, mx.sym.ones((4,)), name='b')
+        op = mx.sym.FullyConnected(data, w, b, num_hidden=4, name='fc')
+        sym, nparams = fold_constant(op, params)
+
+        self.assertEqual(sorted(nparams.keys()), ['b', 'w'])
+        self.assertEqual(len(sutils.topo_sort(sym)), 4)
+        x = mx.nd.uniform(-1, 1, (2, 8), dtype='float64')
+        des = NumpyExecutor(op, params)(data=x)
+        out = NumpyExecutor(sym, nparams)(data=x)
+        self.assertTrue(np.allclose(out, des))
+
+    def test_fold_constant_fallback(self):
+        # the special values of Reshape are not supported by NumpyExecutor
+        data = mx.sym.var('data', shape=(2, 4))
+        weight = mx.sym.var('fc_weight', shape=(2, 3, 4))
+        params = {
+            'fc_weight': mx.nd.uniform(-1, 1, (2, 3, 4), dtype='float64'),
+        }
+        w = mx.sym.Reshape(weight, shape=(-3, 0), name='w')
+        op = mx.sym.FullyConnected(data, w, num_hidden=6,
+                                   no_bias=True, name='fc')
+        sym, nparams = fold_constant(op, params)
+
+        self.assertEqual(list(nparams.keys()), ['w'])
+        self.assertEqual(nparams['w'].shape, (6, 4))
+        x = mx.nd.uniform(-1, 1, (2, 4), dtype='float64')
+        des = op.eval(mx.cpu(), data=x, **params)[0]
+        out = sym.eval(mx.cpu(), data=x, **nparams)[0]
+        self.assertTrue(np.allclose(out.asnumpy(), des.asnumpy()))
+
 if __name__ == "__main__":
     import sys
     unittest.main(argv=sys.argv, verbosity=5)
@@ -141,14 +141,45 @@ class MinMaxCalibrater(CalibraterBase):
     def clear_collected_data(self):
         self.intermediate_outputs = []
 
+    def _range_outputs(self):
+        output_names = [output.name for output in self.infer_session.get_outputs()]
+        return output_names[self.num_model_outputs:]
+
+    def update_range(self, range_outputs, range_output_names=None):
+        """ Fold the ReduceMin/ReduceMax outputs of one batch into the
+            running per-tensor range, so that memory stays constant in
+            the number of calibration batches.
+        """
+        if range_output_names is None:
+            range_output_names = self._range_outputs()
+        if self.calibrate_tensors_range is None:
+            self.calibrate_tensors_range = {}
+        tensors_range = self.calibrate_tensors_range
+
+        for i in range(0, len(range_output_names), 2):
+            tensor_name = range_output_names[i].rpartition('_')[0]
+            min_value_array, max_value_array = range_outputs[i], range_outputs[i + 1]
+            min_value = float(np.min(min_value_array)) if np.size(min_value_array) > 0 else 0
+            max_value = float(np.max(max_value_array)) if np.size(max_value_array) > 0 else 0
+            if tensor_name in tensors_range:
+                old_min, old_max = tensors_range[tensor_name]
+                min_value, max_value = min(old_min, min_value), max(old_max, max_value)
+            tensors_range[tensor_name] = (min_value, max_value)
+
+        return tensors_range
+
     def collect_data(self, data_reader: CalibrationDataReader):
+        # only fetch the range outputs, and fold every batch on arrival
+        range_output_names = self._range_outputs()
+        num_batches = 0
         while True:
             inputs = data_reader.get_next()
             if not inputs:
                 break
-            self.intermediate_outputs.append(self.infer_session.run(None, inputs))
+            self.update_range(self.infer_session.run(range_output_names, inputs), range_output_names)
+            num_batches += 1
 
-        if len(self.intermediate_outputs) == 0:
+        if num_batches == 0:
             raise ValueError("No data is collected.")
 
         self.compute_range()
@@ -166,45 +197,10 @@ class MinMaxCalibrater(CalibraterBase):
         return new_range
 
     def compute_range(self):
-
-        if len(self.intermediate_outputs) == 0:
-            return self.calibrate_tensors_range
-
-        output_names = [self.infer_session.get_outputs()[i].name for i in range(len(self.intermediate_outputs[0]))]
-        output_dicts_list = [
-            dict(zip(output_names, intermediate_output)) for intermediate_output in self.intermediate_outputs
-        ]
-
-        merged_output_dict = {}
-        for d in output_dicts_list:
-            for k, v in d.items():
-                merged_output_dict.setdefault(k, []).append(v)
-        added_output_names = output_names[self.num_model_outputs:]
-        calibrate_tensor_names = [
-            added_output_names[i].rpartition('_')[0] for i in range(0, len(added_output_names), 2)
-        ]  #output names
-
-        merged_added_output_dict = dict(
-            (i, merged_output_dict[i]) for i in merged_output_dict if i not in self.model_original_outputs)
-
-        pairs = []
-        for i in range(0, len(added_output_names), 2):
-            min_value = 0
-            max_value = 0
-            min_value_array = min(merged_added_output_dict[added_output_names[i]])
-            max_value_array = max(merged_added_output_dict[added_output_names[i + 1]])
-            if type(min_value_array) == int or min_value_array.size > 0:
-                min_value = float(min_value_array)
-            if type(max_value_array) == int or max_value_array.size > 0:
-                max_value = float(max_value_array)
-
-            pairs.append(tuple([min_value, max_value]))
-
-        new_calibrate_tensors_range = dict(zip(calibrate_tensor_names, pairs))
-        if self.calibrate_tensors_range:
-            self.calibrate_tensors_range = self.merge_range(self.calibrate_tensors_range, new_calibrate_tensors_range)
-        else:
-            self.calibrate_tensors_range = new_calibrate_tensors_range
+        # fold the full outputs appended to intermediate_outputs, if any
+        for intermediate_output in self.intermediate_outputs:
+            self.update_range(intermediate_output[self.num_model_outputs:])
+        self.clear_collected_data()
 
         return self.calibrate_tensors_range
 
@@ -215,7 +211,9 @@ class HistogramCalibrater(CalibraterBase):
                  augmented_model_path='augmented_model.onnx',
                  method='percentile',
                  num_quantized_bins=128,
-                 percentile=99.99):
+                 percentile=99.99,
+                 max_num_bins=None,
+                 max_samples=None):
         super(HistogramCalibrater, self).__init__(model, op_types_to_calibrate, augmented_model_path)
         self.intermediate_outputs = []
         self.calibrate_tensors_range = None
@@ -225,6 +223,8 @@ class HistogramCalibrater(CalibraterBase):
         self.method = method
         self.num_quantized_bins = num_quantized_bins
         self.percentile = percentile
+        self.max_num_bins = max_num_bins
+        self.max_samples = max_samples
 
     def augment_graph(self):
         model = onnx_proto.ModelProto()
@@ -247,34 +247,29 @@ class HistogramCalibrater(CalibraterBase):
         self.intermediate_outputs = []
 
     def collect_data(self, data_reader: CalibrationDataReader):
+        # every batch is merged into the bounded histograms on arrival
+        output_names = [output.name for output in self.infer_session.get_outputs()]
+        collect_names = [name for name in output_names if name not in self.model_original_outputs]
+
+        if not self.collector:
+            self.collector = HistogramCollector(method=self.method,
+                                                num_quantized_bins=self.num_quantized_bins,
+                                                percentile=self.percentile,
+                                                max_num_bins=self.max_num_bins,
+                                                max_samples=self.max_samples)
+
+        num_batches = 0
         while True:
             inputs = data_reader.get_next()
             if not inputs:
                 break
-            self.intermediate_outputs.append(self.infer_session.run(None, inputs))
+            outputs = self.infer_session.run(collect_names, inputs)
+            self.collector.collect(dict(zip(collect_names, outputs)))
+            num_batches += 1
 
-
-        if len(self.intermediate_outputs) == 0:
+        if num_batches == 0:
             raise ValueError("No data is collected.")
 
-        output_names = [self.infer_session.get_outputs()[i].name for i in range(len(self.intermediate_outputs[0]))]
-        output_dicts_list = [
-            dict(zip(output_names, intermediate_output)) for intermediate_output in self.intermediate_outputs
-        ]
-
-        merged_dict = {}
-        for d in output_dicts_list:
-            for k, v in d.items():
-                merged_dict.setdefault(k, []).append(v)
-
-        clean_merged_dict = dict((i, merged_dict[i]) for i in merged_dict if i not in self.model_original_outputs)
-
-        if not self.collector:
-            self.collector = HistogramCollector(method=self.method,
-                                                num_quantized_bins=self.num_quantized_bins,
-                                                percentile=self.percentile)
-        self.collector.collect(clean_merged_dict)
-
         self.clear_collected_data()
 
     def compute_range(self):
@@ -315,13 +310,34 @@ class CalibrationDataCollector(metaclass=abc.ABCMeta):
     def compute_collection_result(self):
         raise NotImplementedError
 
-class HistogramCollector(CalibrationDataCollector):
+def _halve_bins(hist):
+    # merge adjacent bin pairs, padding an empty bin at the end if odd
+    if hist.size % 2:
+        hist = np.append(hist, 0)
+    return hist.reshape(-1, 2).sum(axis=1)
 
-    def __init__(self, method, num_quantized_bins, percentile):
+class HistogramCollector(CalibrationDataCollector):
+    """ Histograms of tensors with bounded memory.
+
+        Each tensor owns a fixed-range histogram which is widened with
+        the same bin width when the range grows, and adjacent bins are
+        merged whenever the bin count would exceed `max_num_bins`. The
+        bins of new data are counted with `np.bincount` chunk by chunk,
+        and tensors larger than `max_samples` are evenly subsampled with
+        the counts scaled back, while min/max still cover every value.
+    """
+
+    def __init__(self, method, num_quantized_bins, percentile,
+                 max_num_bins=None, max_samples=None, chunk_size=1 << 20):
         self.histogram_dict = {}
         self.method = method
         self.num_quantized_bins= num_quantized_bins
         self.percentile = percentile
+        self.max_num_bins = max_num_bins or 16 * num_quantized_bins
+        self.max_samples = max_samples
+        self.chunk_size = chunk_size
+        if method == 'entropy' and self.max_num_bins < 4 * num_quantized_bins:
+            raise ValueError('max_num_bins should be at least 4 times of num_quantized_bins')
 
     def get_histogram_dict(self):
         return self.histogram_dict
@@ -334,70 +350,127 @@ class HistogramCollector(CalibrationDataCollector):
         else:
             raise ValueError('Only \'entropy\' or \'percentile\' method are supported')
 
+    def _iter_arrays(self, data_arr):
+        # a tensor is mapped to either an array or a list of batch arrays
+        if isinstance(data_arr, (list, tuple)):
+            for arr in data_arr:
+                yield np.asarray(arr).ravel()
+        else:
+            yield np.asarray(data_arr).ravel()
+
+    def bincount(self, data_arr, low, stride, num_bins, absolute=False):
+        """ Count `data_arr` into `num_bins` bins of width `stride` from `low`,
+            values out of range are clipped into the boundary bins.
+        """
+        step = 1
+        if self.max_samples and data_arr.size > self.max_samples:
+            step = -(-data_arr.size // self.max_samples)
+            data_arr = data_arr[::step]
+
+        hist = np.zeros(num_bins, dtype=np.int64)
+        for start in range(0, data_arr.size, self.chunk_size):
+            chunk = data_arr[start:start + self.chunk_size].astype(np.float64)
+            if absolute:
+                np.absolute(chunk, out=chunk)
+            chunk -= low
+            chunk /= stride
+            np.clip(chunk, 0, num_bins - 1, out=chunk)
+            hist += np.bincount(chunk.astype(np.int64), minlength=num_bins)
+        return hist * step if step > 1 else hist
+
     def collect_for_entropy(self, name_to_arr):
-        for tensor, data_arr in name_to_arr.items():
-            data_arr = np.asarray(data_arr)
-            data_arr = data_arr.flatten()
-
-            if data_arr.size > 0:
-                min_value = np.min(data_arr)
-                max_value = np.max(data_arr)
-            else:
-                min_value = 0
-                max_value = 0
-
-            threshold = max(abs(min_value), abs(max_value))
-
-            if tensor in self.histogram_dict:
-                old_histogram = self.histogram_dict[tensor]
-                self.histogram_dict[tensor] = self.merge_histogram(old_histogram, data_arr, min_value, max_value, threshold)
-            else:
-                hist, hist_edges = np.histogram(data_arr, self.num_quantized_bins, range=(-threshold, threshold))
-                self.histogram_dict[tensor] = (hist, hist_edges, min_value, max_value, threshold)
+        for tensor, data_arrs in name_to_arr.items():
+            for data_arr in self._iter_arrays(data_arrs):
+                if data_arr.size > 0:
+                    min_value = float(np.min(data_arr))
+                    max_value = float(np.max(data_arr))
+                else:
+                    min_value = 0
+                    max_value = 0
+
+                threshold = max(abs(min_value), abs(max_value))
+
+                if tensor in self.histogram_dict:
+                    old_histogram = self.histogram_dict[tensor]
+                    self.histogram_dict[tensor] = self.merge_histogram(old_histogram, data_arr, min_value, max_value, threshold)
+                else:
+                    num_bins = self.num_quantized_bins + self.num_quantized_bins % 2
+                    hist = np.zeros(num_bins, dtype=np.int64)
+                    self.histogram_dict[tensor] = self.merge_histogram(
+                        (hist, None, min_value, max_value, 0), data_arr, min_value, max_value, threshold)
 
     def collect_for_percentile(self, name_to_arr):
-        for tensor, data_arr in name_to_arr.items():
-            data_arr = np.asarray(data_arr)
-            data_arr = data_arr.flatten()
-            data_arr = np.absolute(data_arr) # only consider absolute value
-
-            if tensor not in self.histogram_dict:
-                # first time it uses num_quantized_bins to compute histogram.
-                hist, hist_edges = np.histogram(data_arr, bins=self.num_quantized_bins)
-                self.histogram_dict[tensor] = (hist, hist_edges)
-            else:
-                old_histogram = self.histogram_dict[tensor]
-                old_hist = old_histogram[0]
-                old_hist_edges = old_histogram[1]
-                temp_amax = np.max(data_arr)
-                if temp_amax > old_hist_edges[-1]:
-                    width = old_hist_edges[1] - old_hist_edges[0]
-                    new_bin_edges = np.arange(old_hist_edges[-1] + width, temp_amax + width, width)
-                    old_hist_edges = np.hstack((old_hist_edges, new_bin_edges))
-                hist, hist_edges = np.histogram(data_arr, bins=old_hist_edges)
-                hist[:len(old_hist)] += old_hist
-                self.histogram_dict[tensor] = (hist, hist_edges)
+        for tensor, data_arrs in name_to_arr.items():
+            for data_arr in self._iter_arrays(data_arrs):
+                if data_arr.size == 0:
+                    continue
+                # only consider absolute value
+                amax = max(abs(float(np.min(data_arr))), abs(float(np.max(data_arr))))
+
+                if tensor not in self.histogram_dict:
+                    # first time it uses num_quantized_bins to compute histogram.
+                    hist = np.zeros(self.num_quantized_bins, dtype=np.int64)
+                    upper = 0
+                else:
+                    hist, hist_edges = self.histogram_dict[tensor]
+                    upper = float(hist_edges[-1])
+
+                if upper == 0:
+                    # no width yet, all the collected values are zero.
+                    zeros = hist.sum()
+                    hist = np.zeros(hist.size, dtype=np.int64)
+                    hist[0] = zeros
+                    upper = amax
+                elif amax > upper:
+                    width = upper / hist.size
+                    increased_bins = int(np.ceil((amax - upper) / width))
+                    while hist.size + increased_bins > self.max_num_bins:
+                        hist = _halve_bins(hist)
+                        upper = 2 * width * hist.size
+                        width = upper / hist.size
+                        increased_bins = max(int(np.ceil((amax - upper) / width)), 0)
+                    hist = np.pad(hist, (0, increased_bins))
+                    upper += increased_bins * width
+
+                if upper > 0:
+                    hist += self.bincount(data_arr, 0, upper / hist.size, hist.size, absolute=True)
+                else:
+                    hist[0] += data_arr.size
+                self.histogram_dict[tensor] = (hist, np.linspace(0, upper, hist.size + 1))
 
     def merge_histogram(self, old_histogram, data_arr, new_min, new_max, new_threshold):
 
         (old_hist, old_hist_edges, old_min, old_max, old_threshold) = old_histogram
 
-        if new_threshold <= old_threshold:
-            new_hist, _ = np.histogram(data_arr, len(old_hist), range=(-old_threshold, old_threshold))
-            return (new_hist + old_hist, old_hist_edges, min(old_min, new_min), max(old_max, new_max), old_threshold)
+        hist, threshold = old_hist, old_threshold
+        if new_threshold > old_threshold and old_threshold == 0:
+            # no width yet, all the collected values are zero.
+            zeros = hist.sum()
+            hist = np.zeros(hist.size, dtype=np.int64)
+            hist[hist.size // 2] = zeros
+            threshold = new_threshold
+        elif new_threshold > old_threshold:
+            stride = 2 * threshold / hist.size
+            half_increased_bins = int((new_threshold - threshold) // stride + 1)
+            while hist.size + 2 * half_increased_bins > self.max_num_bins:
+                # keep bins symmetric around zero after merging pairs
+                if (hist.size // 2) % 2:
+                    hist = np.pad(hist, 1)
+                    threshold += stride
+                hist = _halve_bins(hist)
+                stride *= 2
+                half_increased_bins = max(int((new_threshold - threshold) // stride + 1), 0)
+            hist = np.pad(hist, half_increased_bins)
+            threshold += half_increased_bins * stride
+
+        if threshold > 0:
+            hist = hist + self.bincount(data_arr, -threshold, 2 * threshold / hist.size, hist.size)
+            hist_edges = np.linspace(-threshold, threshold, hist.size + 1)
         else:
-            if old_threshold == 0:
-                hist, hist_edges = np.histogram(data_arr, len(old_hist), range=(-new_threshold, new_threshold))
-                hist += old_hist
-            else:
-                old_num_bins = len(old_hist)
-                old_stride = 2 * old_threshold / old_num_bins
-                half_increased_bins = int((new_threshold - old_threshold) // old_stride + 1)
-                new_num_bins = old_num_bins + 2 * half_increased_bins
-                new_threshold = half_increased_bins * old_stride + old_threshold
-                hist, hist_edges = np.histogram(data_arr, new_num_bins, range=(-new_threshold, new_threshold))
-                hist[half_increased_bins:new_num_bins-half_increased_bins] += old_hist
-            return (hist, hist_edges, min(old_min, new_min), max(old_max, new_max), new_threshold)
+            hist = hist.copy()
+            hist[hist.size // 2] += data_arr.size
+            hist_edges = np.linspace(-0.5, 0.5, hist.size + 1)
+        return (hist, hist_edges, min(old_min, new_min), max(old_max, new_max), threshold)
 
     def compute_collection_result(self):
         if not self.histogram_dict or len(self.histogram_dict) == 0:
@@ -441,65 +514,94 @@ class HistogramCollector(CalibrationDataCollector):
 
         return thresholds_dict
 
-    def get_entropy_threshold(self, histogram, num_quantized_bins):
-        from scipy.stats import entropy
-        import copy
-
+    def get_entropy_threshold(self, histogram, num_quantized_bins, eps=0.0001, block_size=1 << 16):
+        """ Search the threshold of minimal KL divergence between the sliced
+            distribution and its quantized distribution.
+
+            Every candidate window is evaluated at once: the quantized bins
+            and the nonzero counts are differences of cumulative sums, and
+            the distributions are laid out as a (candidates, bins) matrix
+            processed by blocks of `block_size` elements, following the
+            same semantics as the per-candidate loop, see `smooth_distribution`.
+
+            The smoothing and KL divergence are accumulated in float64,
+            while `smooth_distribution` smoothed in float32. For near-tied
+            candidates the float32 rounding could pick another window, so
+            the threshold may differ from the previous loop by a few bins.
+        """
         hist, hist_edges, _, _, _ = histogram
+        hist = np.asarray(hist, dtype=np.int64)
         num_bins = hist.size
         zero_bin_index = num_bins // 2
         num_half_quantized_bin = num_quantized_bins // 2
 
-        kl_divergence = np.zeros(zero_bin_index - num_half_quantized_bin + 1)
-        thresholds = [(0, 0) for i in range(kl_divergence.size)]
-
-        for i in range(num_half_quantized_bin, zero_bin_index + 1, 1):
-            start_index = zero_bin_index - i
-            end_index = zero_bin_index + i + 1 if (zero_bin_index + i + 1) <= num_bins else num_bins
-
-            thresholds[i - num_half_quantized_bin] = (float(hist_edges[start_index]), float(hist_edges[end_index]))
-
-            sliced_distribution = copy.deepcopy(hist[start_index:end_index])
-
-            p = sliced_distribution.copy()
-            left_outliers_count = sum(hist[:start_index])
-            right_outliers_count = sum(hist[end_index:])
-            p[0] += left_outliers_count
-            p[-1] += right_outliers_count
-
-            nonzeros = (p != 0).astype(np.int64)
-
-            quantized_bins = np.zeros(num_quantized_bins, dtype=np.int64)
-            num_merged_bins = sliced_distribution.size // num_quantized_bins
-
-            for index in range(num_quantized_bins):
-                start = index * num_merged_bins
-                end = start + num_merged_bins
-                quantized_bins[index] = sum(sliced_distribution[start:end])
-            quantized_bins[-1] += sum(sliced_distribution[num_quantized_bins * num_merged_bins:])
-
-            q = np.zeros(p.size, dtype=np.int64)
-            for index in range(num_quantized_bins):
-                start = index * num_merged_bins
-                end = start + num_merged_bins
-
-                norm = sum(nonzeros[start:end])
-                if norm != 0:
-                    q[start:end] = float(quantized_bins[index]) / float(norm)
-
-            p = smooth_distribution(p)
-            q = smooth_distribution(q)
-
-            if isinstance(q, np.ndarray):
-                kl_divergence[i - num_half_quantized_bin] = entropy(p, q)
-            else:
-                kl_divergence[i - num_half_quantized_bin] = float('inf')
+        candidates = np.arange(num_half_quantized_bin, zero_bin_index + 1)
+        start_index = zero_bin_index - candidates
+        end_index = np.minimum(zero_bin_index + candidates + 1, num_bins)
+        length = end_index - start_index
+        num_merged_bins = length // num_quantized_bins
+        hist_cumsum = np.concatenate(([0], np.cumsum(hist)))
+        nonzeros_cumsum = np.concatenate(([0], np.cumsum(hist != 0)))
+
+        # quantized bins and nonzero counts of every candidate window
+        merged_start = start_index[:, None] + np.arange(num_quantized_bins) * num_merged_bins[:, None]
+        merged_end = merged_start + num_merged_bins[:, None]
+        quantized_bins = hist_cumsum[merged_end] - hist_cumsum[merged_start]
+        quantized_bins[:, -1] += hist_cumsum[end_index] - hist_cumsum[merged_end[:, -1]]
+        norm = nonzeros_cumsum[merged_end] - nonzeros_cumsum[merged_start]
+
+        left_outliers_count = hist_cumsum[start_index]
+        right_outliers_count = hist_cumsum[-1] - hist_cumsum[end_index]
+        # the window ends are nonzero once outliers are folded into them
+        norm[:, 0] += (hist[start_index] + left_outliers_count != 0) & (hist[start_index] == 0)
+        last = length - 1
+        covered = np.flatnonzero(last < num_quantized_bins * num_merged_bins)
+        norm[covered, last[covered] // num_merged_bins[covered]] += \
+            (hist[end_index - 1] + right_outliers_count != 0)[covered] & (hist[end_index - 1] == 0)[covered]
+        quantized_values = np.where(norm != 0, quantized_bins // np.maximum(norm, 1), 0)
+
+        max_length = int(length.max())
+        position = np.arange(max_length)
+        kl_divergence = np.empty(candidates.size)
+        step = max(1, block_size // max_length)
+        for lo in range(0, candidates.size, step):
+            rows = slice(lo, lo + step)
+            block = np.arange(min(step, candidates.size - lo))
+            valid = position < length[rows, None]
+
+            p = hist[np.minimum(start_index[rows, None] + position, num_bins - 1)] * valid
+            p[:, 0] += left_outliers_count[rows]
+            p[block, last[rows]] += right_outliers_count[rows]
+
+            chunk = position // num_merged_bins[rows, None]
+            q = np.take_along_axis(quantized_values[rows], np.minimum(chunk, num_quantized_bins - 1), axis=1)
+            q = q * (valid & (chunk < num_quantized_bins))
+
+            ps, p_valid = self._smooth_distributions(p, valid, eps)
+            qs, q_valid = self._smooth_distributions(q, valid, eps)
+            ps /= ps.sum(axis=1, keepdims=True)
+            qs /= qs.sum(axis=1, keepdims=True)
+            ratio = np.where(valid, ps / np.where(valid, qs, 1), 1)
+            kl = (ps * np.log(ratio)).sum(axis=1)
+            kl[~(p_valid & q_valid)] = float('inf')
+            kl_divergence[rows] = kl
 
         min_kl_divergence_idx = np.argmin(kl_divergence)
-        optimal_threshold = thresholds[min_kl_divergence_idx]
+        optimal_threshold = (float(hist_edges[start_index[min_kl_divergence_idx]]),
+                             float(hist_edges[end_index[min_kl_divergence_idx]]))
 
         return optimal_threshold
 
+    @staticmethod
+    def _smooth_distributions(dists, valid, eps):
+        # row-wise smooth_distribution within the valid entries
+        is_zeros = (dists == 0) & valid
+        is_nonzeros = dists != 0
+        n_nonzeros = is_nonzeros.sum(axis=1)
+        eps1 = eps * is_zeros.sum(axis=1) / np.maximum(n_nonzeros, 1)
+        smoothed = dists + eps * is_zeros - eps1[:, None] * is_nonzeros
+        return smoothed, n_nonzeros > 0
+
 
 def get_calibrator(model,
                     op_types_to_calibrate=[],
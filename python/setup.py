@@ -1,5 +1,4 @@
 from setuptools import setup, find_packages, Extension
-from Cython.Build import cythonize
 import os
 
 CURRENT_DIR = os.path.dirname(__file__)
@@ -25,17 +24,22 @@ def get_lib_path():
     return libs, version
 
 LIB_LIST, VERSION = get_lib_path()
+# The cython extension is optional, since the runtime falls back to the
+# ctypes wrapper. Build it with `CVM_ENABLE_CYTHON=1`.
+USE_CYTHON = os.environ.get("CVM_ENABLE_CYTHON", "0") != "0"
 
 def config_cython():
+    from Cython.Build import cythonize
     ret = []
     python_dir = os.path.dirname(os.path.abspath(__file__))
     root_dir = os.path.dirname(python_dir)
     path = "cvm/_cython"
 
-    # library_dirs = [os.path.join(root_dir, "build")]
-    # libraries = ["cvm"]
-    library_dirs = None
-    libraries = None
+    # link against the same libcvm loaded by the ctypes wrapper,
+    # so that model handles are interchangeable between the two.
+    library_dirs = list({os.path.dirname(os.path.join(python_dir, p)) \
+                         for p in LIB_LIST or []}) or None
+    libraries = ["cvm"] if library_dirs else None
 
     for fn in os.listdir(path):
         if not fn.endswith(".pyx"):
@@ -45,9 +49,14 @@ def config_cython():
             [os.path.join(path, fn)],
             include_dirs=[os.path.join(root_dir, "include")],
             library_dirs=library_dirs,
+            runtime_library_dirs=library_dirs,
             libraries=libraries,
             language="c"))
-    return cythonize(ret, compiler_directives={"language_level": 3})
+    ret = cythonize(ret, compiler_directives={"language_level": 3})
+    for ext in ret:
+        # compile errors are reported as warnings
+        ext.optional = True
+    return ret
 
 setup_kwargs = {}
 curr_path = os.path.dirname(
@@ -65,5 +74,5 @@ setup(name='cvm',
     url="https://github.com/CortexFoundation/cvm-runtime.git",
     packages=find_packages(),
     author="CortexLabs Foundation",
-    # ext_modules = config_cython(),
+    ext_modules = config_cython() if USE_CYTHON else [],
     **setup_kwargs)
@@ -191,5 +191,37 @@ CVM_REGISTER_GLOBAL("cvm.runtime.cpu.cvm_left_shift")
       c_data[i] = std::max(std::min(shift_a, max), min);
     }
 });
+
+CVM_REGISTER_GLOBAL("cvm.runtime.cpu.cvm_requant")
+.set_body([](CVMArgs args, CVMRetValue *ret){
+    DLTensor *a = args[0];
+    DLTensor *c = args[1];
+    void *_attr = args[2];
+    auto *attr = static_cast<cvm::NodeAttrs*>(_attr);
+    auto &param = cvm::get<cvm::top::CVMRequantParam>(attr->parsed);
+    int64_t m = param.multiplier;
+    int32_t b = param.shift_bit;
+    int32_t* a_data = static_cast<int32_t*>(a->data);
+    int32_t* c_data = static_cast<int32_t*>(c->data);
+    int64_t min = -(((int64_t)1 << (param.precision-1)) - 1);
+    int64_t max = -min;
+    auto size = getSize(a);
+
+    // one memory pass instead of mul, shift and clip separately,
+    // the product is kept in int64 which cannot overflow since the
+    // precision inference bounds it within 32 bits.
+    if (b > 0) {
+      for (uint64_t i = 0; i < size; ++i) {
+        int64_t t = ((a_data[i] * m >> (b - 1)) + 1) >> 1;
+        c_data[i] = std::max(std::min(t, max), min);
+      }
+    } else {
+      for (uint64_t i = 0; i < size; ++i) {
+        int64_t t = (a_data[i] * m) << (-b);
+        c_data[i] = std::max(std::min(t, max), min);
+      }
+    }
+  print_to_file(c, "cvm_requant.txt");
+});
 }
 }
@@ -174,5 +174,26 @@ const char* cuda_cvm_left_shift(const int32_t *a, const int32_t b, const int32_t
   }
   return check_cuda_error(error);
 }
+
+__global__ void kernel_cvm_requant(const int32_t *a, const int64_t m, const int32_t b, const int32_t precision, int32_t *c, const uint64_t n){
+  int tid = threadIdx.x + blockDim.x * blockIdx.x;
+  const int64_t minV = -(((int64_t)1 << (precision - 1)) - 1);
+  const int64_t maxV = -minV;
+  for(uint64_t i = tid; i < n; i += gridDim.x*blockDim.x){
+    int64_t t = a[i] * m;
+    t = b > 0 ? ((t >> (b - 1)) + 1) >> 1 : t << (-b);
+    c[i] = max(min(t, maxV), minV);
+  }
+}
+const char* cuda_cvm_requant(const int32_t *a, const int32_t m, const int32_t b, const int32_t precision, int32_t *c, const uint64_t n, int& error_code){
+  int bSize = 256;
+  int gSize = getGridSize(n, bSize);
+  kernel_cvm_requant<<<gSize, bSize>>>(a, m, b, precision, c, n);
+  cudaError_t error = cudaGetLastError();
+  if(cudaSuccess != error){
+    error_code = ERROR_KERNEL;
+  }
+  return check_cuda_error(error);
+}
 }
 }
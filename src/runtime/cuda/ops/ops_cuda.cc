@@ -574,6 +574,34 @@ CVM_REGISTER_GLOBAL("cvm.runtime.gpu.cvm_left_shift")
       deal_error(error_code, errorStr);
   });
 
+/*
+ * a, input data
+ * c, output data
+ * precision, clip precision
+ * m, multiplier
+ * b, right shift b if positive else left shift -b
+ * */
+CVM_REGISTER_GLOBAL("cvm.runtime.gpu.cvm_requant")
+  .set_body([](CVMArgs args, CVMRetValue *ret){
+      DLTensor *a = args[0];
+      DLTensor *c = args[1];
+      void *_attr = args[2];
+      auto *attr = static_cast<cvm::NodeAttrs*>(_attr);
+      auto &param = cvm::get<cvm::top::CVMRequantParam>(attr->parsed);
+      int32_t* a_data = static_cast<int32_t*>(a->data);
+      int32_t* c_data = static_cast<int32_t*>(c->data);
+      int error_code = NON_ERROR;
+      const char* errorStr = cuda_cvm_requant(
+          a_data,
+          param.multiplier,
+          param.shift_bit,
+          param.precision,
+          c_data,
+          getSize(a),
+          error_code);
+      deal_error(error_code, errorStr);
+  });
+
 CVM_REGISTER_GLOBAL("cvm.runtime.gpu.cvm_precision")
   .set_body([](CVMArgs args, CVMRetValue *ret){
       DLTensor *dlx = args[0];
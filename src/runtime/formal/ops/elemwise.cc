@@ -198,6 +198,42 @@ CVM_REGISTER_GLOBAL("cvm.runtime.formal.cvm_left_shift")
     }
 });
 
+CVM_REGISTER_GLOBAL("cvm.runtime.formal.cvm_requant")
+.set_body([](CVMArgs args, CVMRetValue *ret){
+    auto x_data = CVMArg2Data<int32_t>(args[0]); 
+    auto y_data = CVMArg2Data<int32_t>(args[1]); 
+    auto params = CVMArg2Attr<cvm::top::CVMRequantParam>(args[2]);
+    int32_t precision = params.precision;
+    // alpha = 2^(precision-1) - 1
+    int64_t alpha =  (((int64_t)1 << (precision-1))-1);
+    int64_t a_min = -alpha;
+    int64_t a_max = alpha;
+    int32_t b = params.shift_bit;
+    auto size = CVMArgSize(args[0]);
+    // T = X * multiplier
+    // T = floor((floor(T >> (shift_bit - 1)) + 1) >> 1), shift_bit > 0
+    // T = T << -shift_bit, shift_bit <= 0
+    // Y = clip(T, -alpha, alpha)
+    for (uint32_t i = 0; i < size; i++) {
+      int64_t T = (int64_t)x_data[i] * params.multiplier;
+      if (b > 0) {
+        T = ((T >> (b - 1)) + 1) >> 1;
+      } else {
+        T = T << (-b);
+      }
+      // y = a_max, T >= a_max
+      if (T >= a_max){
+        y_data[i] = a_max;
+        // y = a_min, T <= a_min
+      } else if (T <= a_min) {
+        y_data[i] = a_min;
+      } else {
+        // y = T, a_min < T < a_max
+        y_data[i] = T;
+      }
+    }
+});
+
 void FlattenX(int32_t *x, int32_t *y, int Size){
     memcpy(y, x, Size*sizeof(int32_t));
 }
@@ -154,6 +154,7 @@ void CvmRuntime::PrepareGraphWithVersion() {
     "elemwise_add", "elemwise_sub",
     "nagetive", "clip", 
     "cvm_clip", "cvm_right_shift", "cvm_left_shift",
+    "cvm_requant",
   };
   for (size_t nid = 0; nid < nodes_.size(); ++nid) {
     Node &node = nodes_[nid];
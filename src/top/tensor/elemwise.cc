@@ -232,6 +232,50 @@ which means to implement via tricky equation.
 .add_arguments(CVMRightShiftParam::__FIELDS__())
 .set_support_level(4);
 
+// cvm_requant
+CVMUTIL_REGISTER_PARAMETER(CVMRequantParam);
+
+CVM_REGISTER_OP(cvm_requant)
+.describe(R"code(CVM fused requantization, equivalent to the chain of
+broadcast_mul with scalar constant, cvm_right_shift or cvm_left_shift
+and cvm_clip.
+
+.. math::
+  assert multiplier > 0
+  tmp = X * multiplier
+  tmp = shift_bit > 0 ? ((tmp >> (shift_bit - 1)) + 1) >> 1
+      : tmp << (-shift_bit)
+  Y = cvm_clip(tmp, precision)
+)code" CVM_ADD_FILELINE)
+.set_num_inputs(1)
+.set_num_outputs(1)
+.set_attr_parser(ParamParser<CVMRequantParam>)
+.set_attr<FGetAttrDict>("FGetAttrDict", ParamGetAttrDict<CVMRequantParam>)
+.set_attr<cvm::FInferShape>("FInferShape", ElemwiseShape<1, 1>)
+.set_attr<cvm::FInferType>("FInferType", ElemwiseType<1, 1>)
+.set_attr<cvm::FCorrectLayout>("FCorrectLayout", ElemwiseFixedLayoutUnknownOut<1, 1>)
+.set_attr<FInferPrecision>("FInferPrecision",
+  [](const NodeAttrs& attrs,
+     std::vector<TShape>* shapes,
+     std::vector<int>* iattr,
+     std::vector<int>* oattr) -> bool {
+  IN_PREC_CHECK(iattr, attrs.name);
+  auto& param = cvm::get<CVMRequantParam>(attrs.parsed);
+  int32_t r = ((int64_t)1<<31) - 1;
+  VerifyAttrRange(param.precision, "cvm_requant.precision", 1, 32);
+  VerifyAttrRange(param.multiplier, "cvm_requant.multiplier", 1, r);
+  VerifyAttrRange(param.shift_bit, "cvm_requant.shift_bit", -32, 32);
+  // keep the same precision constraint as the unfused broadcast_mul
+  int prec = iattr->at(0) + GetNumberPrecision(param.multiplier);
+  if (param.shift_bit < 0) prec -= param.shift_bit;
+  if (prec > 32) return false;
+  (*oattr)[0] = param.precision;
+  return true;
+})
+.add_argument("data", "Tensor", "input")
+.add_arguments(CVMRequantParam::__FIELDS__())
+.set_support_level(4);
+
 
 
 }  // namespace top
@@ -18,6 +18,13 @@ import utils
 
 INT32 = "int32"
 
+def generate(op_units, op_name, op_func):
+    """ Generate the operator corpus in parallel, and export the cases
+            into the text layout read by `test_op.cc`.
+    """
+    op_units.generate(op_name, op_func)
+    opg.OpCorpus().export_txt(op_name)
+
 # ====== transform ======
 
 def verify_expand_dims():
@@ -55,7 +62,7 @@ def verify_transpose():
     data = ConcatIter(*datas)
     axes = ConcatIter([[1, 2, 0]], name="axes")
     op_units = opg.OpUnitIter([data, axes], attr_index=1)
-    op_units.eval_data("transpose", transpose, is_dump=True)
+    generate(op_units, "transpose", transpose)
 
 def verify_reshape():
     pass
@@ -80,15 +87,14 @@ def verify_concatenate():
             return True
         return False
 
-    is_dump = True
     op_units = opg.OpUnitIter([data, axis], 1, [cstr_func])
-    op_units.eval_data("concatenate", concatenate, is_dump)
+    generate(op_units, "concatenate", concatenate)
 
     op_units = opg.OpUnitIter([data, data, axis], 2, [cstr_func])
-    op_units.eval_data("concatenate", concatenate, is_dump)
+    generate(op_units, "concatenate", concatenate)
 
     op_units = opg.OpUnitIter([data, data, data, axis], 3, [cstr_func])
-    op_units.eval_data("concatenate", concatenate, is_dump)
+    generate(op_units, "concatenate", concatenate)
 
 def verify_take():
     def take(data, indices, axis):
@@ -124,7 +130,7 @@ def verify_take():
     axis = opg.IntIter(opg.range_constraint(-2, 2), opg.gen_non_constraint(),
             name="axis")
     op_units = opg.OpUnitIter([data, indices, axis], 2)
-    op_units.eval_data("take", take, is_dump=True)
+    generate(op_units, "take", take)
 
 def verify_strided_slice():
     dshp = (2, 2)
@@ -193,7 +199,7 @@ def verify_strided_slice():
         return [out_npy]
 
     op_units = opg.OpUnitIter([data, begin, end, strides], 1, [cstr_func])
-    op_units.eval_data("strided_slice", strided_slice, is_dump=True)
+    generate(op_units, "strided_slice", strided_slice)
 
     dshp = (10, 10)
     data = ConstantIter(iter_constraint(100), shape=dshp)
@@ -204,7 +210,7 @@ def verify_strided_slice():
                  [9, -9], [10, -10], [20, -20]],
                 name="stride")
     op_units = opg.OpUnitIter([data, begin, end, strides], 1)
-    op_units.eval_data("strided_slice", strided_slice, is_dump=True)
+    generate(op_units, "strided_slice", strided_slice)
 
 def verify_repeat():
     dshp = (1, 2, 3, 4)
@@ -219,7 +225,7 @@ def verify_repeat():
         return [out_npy]
 
     op_units = opg.OpUnitIter([data, repeats, axis], 1)
-    op_units.eval_data("repeat", repeat, is_dump=True)
+    generate(op_units, "repeat", repeat)
 
 def verify_tile():
     dshp = (1, 2, 3)
@@ -243,7 +249,7 @@ def verify_tile():
         return [out_npy]
 
     op_units = opg.OpUnitIter([data, reps], 1)
-    op_units.eval_data("tile", tile, is_dump=True)
+    generate(op_units, "tile", tile)
 
 def verify_slice_like():
     dshp = (1, 2, 3)
@@ -262,7 +268,7 @@ def verify_slice_like():
         return [out]
 
     op_units = opg.OpUnitIter([data, sdata, axis], 2)
-    op_units.eval_data("slice_like", slice_like, is_dump=True)
+    generate(op_units, "slice_like", slice_like)
 
     sdata = ConcatIter(
             ConstantIter(iter_constraint(1), shape=(1,1,1)),
@@ -275,7 +281,7 @@ def verify_slice_like():
             )
     axis = VectorIter(iattr, 0, name="axis")
     op_units = opg.OpUnitIter([data, sdata, axis], 2)
-    op_units.eval_data("slice_like", slice_like, is_dump=True)
+    generate(op_units, "slice_like", slice_like)
 
 # ====== reduce ======
 
@@ -296,7 +302,7 @@ def verify_reduce(op_name):
         return [out_nd]
 
     op_units = opg.OpUnitIter([data, axis, keepdims, exclude], 1)
-    op_units.eval_data(op_name, _reduce, is_dump=True)
+    generate(op_units, op_name, _reduce)
 
 def verify_max():
     verify_reduce("max")
@@ -520,7 +526,7 @@ def verify_max_pool2d():
 
     op_units = opg.OpUnitIter(
             [data, pool_size, strides, padding, ceil_mode], 1)
-    op_units.eval_data("max_pool2d", max_pool2d, is_dump=True)
+    generate(op_units, "max_pool2d", max_pool2d)
 
 def verify_upsampling():
     batch = IntIter(list_constraint([1, 4, 8, 16]))
@@ -545,7 +551,7 @@ def verify_upsampling():
         return [b_np]
 
     op_units = opg.OpUnitIter([data, scale], 1)
-    op_units.eval_data("upsampling", upsampling, is_dump=True)
+    generate(op_units, "upsampling", upsampling)
 
 # ====== broadcast ======
 def verify_broadcast(op_name="broadcast_add"):
@@ -670,7 +676,7 @@ def verify_get_valid_counts():
         return [np_out1, np_out2]
 
     op_units = opg.OpUnitIter([data, score], 1)
-    op_units.eval_data("get_valid_counts", get_valid_counts, is_dump=True)
+    generate(op_units, "get_valid_counts", get_valid_counts)
 
 def verify_non_max_suppression():
         # batch = np.random.randint(low=1, high=10)
@@ -773,7 +779,7 @@ def verify_non_max_suppression():
         f(data_nd, valid_count_nd, out_nd)
         return [out_nd.asnumpy()]
 
-    op_units.eval_data("non_max_suppression", non_max_suppression, True)
+    generate(op_units, "non_max_suppression", non_max_suppression)
 
 # ====== test ======
 def test_load(op_name, hsh, datadir="/data/ops_generator"):
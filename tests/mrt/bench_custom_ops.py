@@ -0,0 +1,75 @@
+""" Micro-benchmark of quantized model forward latency with the
+    python CustomOp implementations versus the native lowering
+    via `cvm_op.lower_custom_ops`.
+
+    Synthesize a conv stack with requantization chains by default,
+    or benchmark a quantized model given by --model-prefix, which
+    should point to `<prefix>.json` and `<prefix>.params`.
+"""
+import argparse
+import time
+
+import numpy as np
+import mxnet as mx
+from mxnet import ndarray as nd
+
+from mrt.transformer import Model
+from mrt import cvm_op
+
+parser = argparse.ArgumentParser("custom op benchmark")
+parser.add_argument("--model-prefix", type=str, default=None)
+parser.add_argument("--input-shape", type=int, nargs="+",
+                    default=[16, 3, 32, 32])
+parser.add_argument("--layers", type=int, default=20)
+parser.add_argument("--repeats", type=int, default=20)
+parser.add_argument("--device-type", type=str, default="cpu")
+
+def synthesize(input_shape, layers):
+    op = data = mx.sym.var("data", shape=input_shape)
+    params, channels = {}, input_shape[1]
+    for i in range(layers):
+        weight = mx.sym.var("conv%d_weight" % i, shape=(16, channels, 3, 3))
+        params[weight.attr("name")] = nd.round(
+            nd.uniform(-127, 127, (16, channels, 3, 3)))
+        op = mx.sym.Convolution(op, weight, kernel=(3, 3), pad=(1, 1),
+                                num_filter=16, no_bias=True,
+                                name="conv%d" % i)
+        op = mx.sym.Custom(op, precision=8, shift_bit=12,
+                           op_type="cvm_right_shift")
+        op = mx.sym.relu(op)
+        op = mx.sym.Custom(op, precision=8, op_type="cvm_clip")
+        channels = 16
+    return Model(op, params)
+
+def bench(graph, data, repeats):
+    graph(data) # warm up
+    nd.waitall()
+    start = time.time()
+    for _ in range(repeats):
+        outs = graph(data)
+    nd.waitall()
+    return (time.time() - start) / repeats, outs
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    ctx = mx.cpu() if args.device_type == "cpu" else mx.gpu()
+    if args.model_prefix is None:
+        model = synthesize(args.input_shape, args.layers)
+    else:
+        model = Model.load(args.model_prefix + ".json",
+                           args.model_prefix + ".params")
+    data = nd.round(nd.uniform(-127, 127, args.input_shape, ctx=ctx))
+
+    custom_t, custom_outs = bench(
+        model.to_graph(ctx=ctx), data, args.repeats)
+    native_t, native_outs = bench(
+        model.to_graph(ctx=ctx, native_ops=True), data, args.repeats)
+    if not isinstance(custom_outs, (list, tuple)):
+        custom_outs, native_outs = [custom_outs], [native_outs]
+    for c, n in zip(custom_outs, native_outs):
+        assert np.array_equal(c.asnumpy(), n.asnumpy()), \
+            "native lowering is not equivalent"
+
+    print("custom op forward: %8.3f ms" % (custom_t * 1e3))
+    print("native op forward: %8.3f ms" % (native_t * 1e3))
+    print("speedup: %.2fx" % (custom_t / native_t))
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import numpy as np
+
+import cvm
+
+
+def _variants():
+    backbone = np.random.randint(-127, 128, size=(64, 3, 7, 7)).astype('int8')
+    return [
+        {'conv0_weight': backbone, 'head_weight': np.ones((10, 64), 'int8')},
+        {'conv0_weight': backbone, 'head_weight': np.zeros((5, 64), 'int8')},
+    ]
+
+def test_dedup_assemble():
+    root = tempfile.mkdtemp()
+    store = cvm.blobs.BlobStore(os.path.join(root, "store"))
+    for i, params in enumerate(_variants()):
+        model_dir = os.path.join(root, "model%d" % i)
+        os.makedirs(model_dir)
+        with open(os.path.join(model_dir, "symbol"), "w") as fout:
+            fout.write("{}")
+        entries = store.put_params(list(params), params.values())
+        cvm.blobs.save_manifest(
+            os.path.join(model_dir, cvm.blobs.MANIFEST_NAME), store, entries)
+        _, param_bytes = cvm.runtime.read_model_dir(model_dir)
+        assert param_bytes == cvm.params.save_params(params)
+        for name, view in store.load(entries).items():
+            assert (view == params[name]).all()
+    assert len(store.digests()) == 3
+
+if __name__ == "__main__":
+    test_dedup_assemble()
@@ -0,0 +1,66 @@
+import os
+import json
+import tempfile
+
+import numpy as np
+
+import cvm
+
+
+_GRAPH = {
+    "nodes": [{"op": "null", "name": "data", "inputs": []},
+              {"op": "null", "name": "w", "inputs": []},
+              {"op": "dense", "name": "fc", "attrs": {"units": "3"},
+               "inputs": [[0, 0, 0], [1, 0, 0]]}],
+    "arg_nodes": [0, 1], "node_row_ptr": [0, 1, 2, 3],
+    "heads": [[2, 0, 0]],
+    "attrs": {"shape": ["list_shape", [[1, 4], [3, 4], [1, 3]]],
+              "precision": ["list_int", [8, 8, 20]],
+              "storage_id": ["list_int", [0, 1, 2]]},
+}
+
+def _model_dir():
+    model_dir = os.path.join(tempfile.mkdtemp(), "model")
+    os.makedirs(model_dir)
+    with open(os.path.join(model_dir, "symbol"), "w") as fout:
+        json.dump(_GRAPH, fout)
+    weight = np.random.randint(-127, 128, size=(3, 4)).astype("int8")
+    cvm.params.save_params({"w": weight}, os.path.join(model_dir, "params"))
+    with open(os.path.join(model_dir, "ext"), "w") as fout:
+        json.dump({"inputs_ext": {"data": {"scale": 2.0, "target_bit": 8}},
+                   "oscales": [0.5], "input_shapes": [1, 4]}, fout)
+        fout.write("\n")
+    np.save(os.path.join(model_dir, "data.npy"), np.ones((1, 4), "int8"))
+    return model_dir, weight
+
+def test_pack_load():
+    model_dir, weight = _model_dir()
+    fname = cvm.bundle.pack_model_dir(model_dir)
+    assert cvm.bundle.is_bundle(fname)
+    with cvm.bundle.load_bundle(fname) as bundle:
+        assert bundle.meta["inputs"][0]["shape"] == [1, 4]
+        assert bundle.meta["outputs"][0]["precision"] == 20
+        assert bundle.meta["oscales"] == [0.5]
+        assert (bundle.params()["w"] == weight).all()
+        assert (bundle.data() == 1).all()
+    json_str, param_bytes = cvm.utils.load_model(fname)
+    with open(os.path.join(model_dir, "params"), "rb") as fin:
+        assert param_bytes == fin.read()
+    assert json.loads(json_str) == _GRAPH
+
+def test_checksum():
+    model_dir, _ = _model_dir()
+    fname = cvm.bundle.pack_model_dir(model_dir)
+    with open(fname, "rb") as fin:
+        buf = bytearray(fin.read())
+    buf[-1] ^= 1
+    try:
+        cvm.bundle.Bundle(bytes(buf))
+    except ValueError:
+        pass
+    else:
+        assert False, "corrupted bundle loaded"
+
+if __name__ == "__main__":
+    test_pack_load()
+    test_checksum()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import cvm
+from cvm import nd
+
+
+def _random_params():
+    return {
+        'conv0_weight': np.random.randint(
+            -127, 128, size=(64, 3, 7, 7)).astype('int8'),
+        'conv0_bias': np.random.randint(
+            -(1 << 20), 1 << 20, size=(64,)).astype('int32'),
+        'scalar': np.array(3, dtype='int32'),
+    }
+
+def test_save_compatible():
+    params = _random_params()
+    cvm_params = {k: nd.array(v) for k, v in params.items()}
+    assert cvm.params.save_params(params) == \
+        nd.save_param_dict(cvm_params)
+
+def test_load_arena():
+    params = _random_params()
+    param_bytes = cvm.params.save_params(params)
+    arena = cvm.params.load_params(param_bytes)
+    assert list(arena.keys()) == list(params.keys())
+    for k, v in params.items():
+        assert arena[k].dtype == v.dtype
+        assert arena[k].shape == v.shape
+        assert (arena[k] == v).all()
+        assert (arena.as_ndarray(k).asnumpy() == v).all()
+
+def test_load_mmap():
+    params = _random_params()
+    fname = os.path.join(tempfile.mkdtemp(), "params")
+    cvm.params.save_params(params, fname)
+    with cvm.params.load_params(fname) as arena:
+        for k, v in params.items():
+            assert (arena[k] == v).all()
+
+if __name__ == "__main__":
+    test_save_compatible()
+    test_load_arena()
+    test_load_mmap()
+
+    params = {"w%d" % i: np.zeros((1 << 20,), dtype="int8") \
+        for i in range(256)}
+    fname = os.path.join(tempfile.mkdtemp(), "params")
+    cvm.params.save_params(params, fname)
+
+    start = time.time()
+    arena = cvm.params.load_params(fname)
+    print ("load_params %d MB: %.4fs" % (
+        arena.nbytes >> 20, time.time() - start))
+    with open(fname, "rb") as f:
+        param_bytes = f.read()
+    start = time.time()
+    nd.load_param_dict(param_bytes)
+    print ("load_param_dict: %.4fs" % (time.time() - start))
@@ -0,0 +1,40 @@
+import time
+
+import numpy as np
+
+from cvm.pipeline import Pipeline, Stage
+
+
+def _frames(num, delay=0.):
+    for i in range(num):
+        if delay:
+            time.sleep(delay)
+        yield np.full((4,), i)
+
+def _batch_sum(frames):
+    return [int(f.sum()) for f in np.stack(frames)]
+
+def test_order_batch():
+    pipe = Pipeline(_frames(100), [
+        Stage(lambda f: f * 2, name="scale", num_workers=4),
+        Stage(_batch_sum, batch_size=8, num_workers=2),
+    ])
+    assert pipe.run() == [8 * i for i in range(100)]
+    stats = pipe.stats()
+    assert stats["written"] == 100
+    assert stats["stages"][1]["calls"] < 100
+
+def test_drop_frames():
+    indices = []
+    pipe = Pipeline(_frames(200, 0.001), [
+        Stage(lambda f: (time.sleep(0.01), f)[1], name="slow", queue_size=2),
+    ], sink=lambda i, _: indices.append(i), drop_frames=True)
+    pipe.run()
+    stats = pipe.stats()
+    assert stats["dropped"] > 0
+    assert stats["frames"] == stats["dropped"] + stats["written"]
+    assert indices == sorted(indices)
+
+if __name__ == "__main__":
+    test_order_batch()
+    test_drop_frames()
@@ -0,0 +1,33 @@
+import numpy as np
+
+from cvm import preprocess
+
+
+def test_quantize_round():
+    data = np.array([0.5, -0.5, 1.5, -2.5, 100.]) / 2
+    out = preprocess.quantize(data, 2., target_bit=8)
+    assert out.tolist() == [1, -1, 2, -3, 100]
+    out = preprocess.quantize(data * 10, 2., target_bit=8)
+    assert out.max() == 127 and out.dtype == np.int8
+
+def test_preprocessor():
+    mean, std = [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]
+    images = np.random.randint(0, 256, size=(4, 32, 32, 3)).astype("uint8")
+    prep = preprocess.Preprocessor((4, 3, 32, 32), 48.1, 8, mean, std,
+                                   num_workers=2)
+    out = prep(images)
+    data = (images[..., ::-1] / 255. - np.array(mean)) / np.array(std)
+    ref = preprocess.quantize(data.transpose(0, 3, 1, 2), 48.1, 8)
+    assert (out == ref).all()
+    prep.close()
+
+def test_resize():
+    image = np.random.randint(0, 256, size=(64, 48, 3)).astype("uint8")
+    out = preprocess.Resize((32, 24))(image)
+    blocks = image.reshape(32, 2, 24, 2, 3).astype("float64").mean((1, 3))
+    assert (out == np.floor(blocks + 0.5)).all()
+
+if __name__ == "__main__":
+    test_quantize_round()
+    test_preprocessor()
+    test_resize()
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+import threading
+
+import numpy as np
+
+import cvm
+from cvm import runtime
+
+
+_GRAPH = {
+    "nodes": [{"op": "null", "name": "data", "inputs": []},
+              {"op": "null", "name": "w", "inputs": []},
+              {"op": "cvm_op", "name": "fc", "inputs": [[0, 0, 0], [1, 0, 0]],
+               "attrs": {"func_name": "dense", "num_inputs": "2",
+                         "num_outputs": "1", "flatten_data": "0"}}],
+    "arg_nodes": [0, 1], "node_row_ptr": [0, 1, 2, 3],
+    "heads": [[2, 0, 0]],
+    "attrs": {"shape": ["list_shape", [[1, 4], [3, 4], [1, 3]]],
+              "precision": ["list_int", [8, 8, 20]],
+              "storage_id": ["list_int", [0, 1, 2]],
+              "op_attrs": ["list_str", [
+                  "null", "null", '{"units": "3", "use_bias": "False"}']],
+              "dltype": ["list_str", ["int32", "int32", "int32"]]},
+    "version": "cvm_1.0.0",
+}
+_DATA = bytes([1, 2, 3, 4])
+
+def _model_dir(root, name, value=1):
+    model_dir = os.path.join(root, name)
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, "symbol"), "w") as fout:
+        json.dump(_GRAPH, fout)
+    weight = np.full((3, 4), value, "int8")
+    cvm.params.save_params({"w": weight}, os.path.join(model_dir, "params"))
+    return model_dir
+
+def _bad_dir(root, name):
+    model_dir = _model_dir(root, name)
+    with open(os.path.join(model_dir, "params"), "wb") as fout:
+        fout.write(b"bad params")
+    return model_dir
+
+def _slow_load(monkeypatch, seconds=0.1):
+    load = runtime.CVMAPILoadModel
+    def _load(*args):
+        time.sleep(seconds)
+        return load(*args)
+    monkeypatch.setattr(runtime, "CVMAPILoadModel", _load)
+
+def _inference(cache, model_dir):
+    return cache.inference(model_dir, _DATA).tolist()
+
+def _run_threads(func, num_threads):
+    barrier = threading.Barrier(num_threads)
+    results = [None] * num_threads
+    def _run(i):
+        barrier.wait()
+        try:
+            results[i] = func()
+        except Exception as err: # pylint: disable=broad-except
+            results[i] = err
+    threads = [threading.Thread(target=_run, args=(i,)) \
+               for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_cache_lru():
+    root = tempfile.mkdtemp()
+    a, b, c = [_model_dir(root, n) for n in "abc"]
+    cache = runtime.ModelCache(max_models=2)
+    for model_dir in [a, b, a, c]:
+        assert _inference(cache, model_dir) == [10, 10, 10]
+    assert a in cache and c in cache and b not in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+    assert (stats["loads"], stats["evictions"]) == (3, 1)
+
+    nbytes = stats["bytes"] // 2
+    cache = runtime.ModelCache(max_bytes=2 * nbytes)
+    for model_dir in [a, b, a, c]:
+        cache.inference(model_dir, _DATA)
+    assert len(cache) == 2 and b not in cache
+    assert cache.stats()["bytes"] == 2 * nbytes
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["bytes"] == 0
+
+def test_cache_pinned():
+    root = tempfile.mkdtemp()
+    a, b = _model_dir(root, "a"), _model_dir(root, "b", 2)
+    cache = runtime.ModelCache(max_models=1)
+    with cache.acquire(a) as net:
+        # the pinned model is kept over the limit, b is freed instead
+        assert _inference(cache, b) == [20, 20, 20]
+        assert a in cache and b not in cache
+        cache.clear()
+        cache.evict(a)
+        assert a in cache
+        assert runtime.CVMAPIInference(net, _DATA) == [10, 10, 10]
+    assert cache.stats()["evictions"] == 1
+    assert _inference(cache, b) == [20, 20, 20]
+    assert a not in cache and b in cache
+
+def test_cache_reload():
+    root = tempfile.mkdtemp()
+    a = _model_dir(root, "a")
+    cache = runtime.ModelCache()
+    assert _inference(cache, a) == [10, 10, 10]
+    _model_dir(root, "a", 2)
+    # the same size and mtime, if the filesystem is coarse
+    params_file = os.path.join(a, "params")
+    mtime = os.stat(params_file).st_mtime_ns
+    os.utime(params_file, ns=(mtime, mtime + 10 ** 9))
+    assert _inference(cache, a) == [20, 20, 20]
+    stats = cache.stats()
+    assert (stats["models"], stats["loads"], stats["evictions"]) == (1, 2, 1)
+
+def test_cache_concurrent(monkeypatch):
+    _slow_load(monkeypatch)
+    root = tempfile.mkdtemp()
+    a = _model_dir(root, "a")
+    cache = runtime.ModelCache()
+    rets = _run_threads(lambda: _inference(cache, a), 8)
+    assert rets == [[10, 10, 10]] * 8
+    stats = cache.stats()
+    assert (stats["loads"], stats["misses"], stats["hits"]) == (1, 1, 7)
+
+def test_cache_failure(monkeypatch):
+    _slow_load(monkeypatch)
+    root = tempfile.mkdtemp()
+    bad = _bad_dir(root, "bad")
+    cache = runtime.ModelCache(max_models=1)
+    rets = _run_threads(lambda: _inference(cache, bad), 4)
+    assert all(isinstance(r, Exception) for r in rets)
+    stats = cache.stats()
+    assert (stats["models"], stats["loads"], stats["misses"]) == (0, 0, 1)
+    # the reservation is released for the next model
+    a = _model_dir(root, "a")
+    assert _inference(cache, a) == [10, 10, 10]
+    assert cache.stats()["models"] == 1
+
+def test_load_models():
+    root = tempfile.mkdtemp()
+    dirs = [_model_dir(root, "m%d" % i, i) for i in range(4)]
+    bad = _bad_dir(root, "bad")
+    futures = runtime.load_models(dirs + [bad], num_workers=4, warmup=True)
+    assert list(futures) == dirs + [bad]
+    # the failure is raised by its future only
+    assert futures[bad].exception() is not None
+    for i, model_dir in enumerate(dirs):
+        net = futures[model_dir].result()
+        assert runtime.CVMAPIInference(net, _DATA) == [10 * i] * 3
+        runtime.CVMAPIFreeModel(net)
+
+def test_preload():
+    root = tempfile.mkdtemp()
+    dirs = [_model_dir(root, "m%d" % i) for i in range(4)]
+    bad = _bad_dir(root, "bad")
+    cache = runtime.ModelCache()
+    futures = cache.preload(dirs + [bad], num_workers=4)
+    for model_dir in dirs:
+        assert futures[model_dir].result() == model_dir
+        assert model_dir in cache
+    assert futures[bad].exception() is not None
+    stats = cache.stats()
+    assert (stats["models"], stats["loads"]) == (4, 4)
+
+def test_aload_models():
+    root = tempfile.mkdtemp()
+    dirs = [_model_dir(root, "m%d" % i) for i in range(3)]
+    bad = _bad_dir(root, "bad")
+    cache = runtime.ModelCache()
+    async def _main():
+        futures = runtime.aload_models(dirs + [bad], cache=cache)
+        return await asyncio.gather(*futures.values(),
+                                    return_exceptions=True)
+    rets = asyncio.run(_main())
+    assert rets[:3] == dirs and isinstance(rets[3], Exception)
+    assert cache.stats()["models"] == 3
@@ -0,0 +1,122 @@
+""" Benchmark of the vectorized entropy threshold search of
+    `HistogramCollector.get_entropy_threshold` against the reference
+    per-candidate loop, over synthesized ResNet-like activations.
+
+    The activations are histogrammed into --num-bins bins as the
+    entropy calibration does. The reference smooths in float32, so the
+    thresholds of near-tied candidates may differ by a few bins from
+    the float64 search, reported in the `same` column. The exactness
+    against a float64 reference is checked by `test_entropy.py`.
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.stats import entropy
+
+from yamrt.quant.calibrate import HistogramCollector
+from yamrt.quant.quant_utils import smooth_distribution
+
+parser = argparse.ArgumentParser("entropy threshold benchmark")
+parser.add_argument("--num-bins", type=int, default=2048)
+parser.add_argument("--num-quantized-bins", type=int, default=128)
+parser.add_argument("--batch", type=int, default=8)
+parser.add_argument("--repeats", type=int, default=3)
+
+# (name, shape, distribution) of typical ResNet-50 activations
+TENSORS = [
+    ("conv1", (64, 112, 112), "normal"),
+    ("layer1.relu", (256, 56, 56), "relu"),
+    ("layer2.conv", (512, 28, 28), "laplace"),
+    ("layer3.relu", (1024, 14, 14), "relu"),
+    ("layer4.conv", (2048, 7, 7), "laplace"),
+    ("fc", (1000,), "normal"),
+]
+
+def synthesize(shape, dist, batch, rng):
+    shape = (batch,) + shape
+    if dist == "relu":
+        return np.maximum(rng.normal(size=shape), 0).astype("float32")
+    if dist == "laplace":
+        return rng.laplace(scale=0.5, size=shape).astype("float32")
+    return rng.normal(size=shape).astype("float32")
+
+def histogram(data, num_bins):
+    threshold = float(np.abs(data).max())
+    hist, hist_edges = np.histogram(data, num_bins, range=(-threshold, threshold))
+    return (hist, hist_edges, float(data.min()), float(data.max()), threshold)
+
+def reference_entropy_threshold(histogram, num_quantized_bins):
+    """ The per-candidate loop of the previous implementation. """
+    hist, hist_edges, _, _, _ = histogram
+    num_bins = hist.size
+    zero_bin_index = num_bins // 2
+    num_half_quantized_bin = num_quantized_bins // 2
+
+    kl_divergence = np.zeros(zero_bin_index - num_half_quantized_bin + 1)
+    thresholds = [(0, 0) for i in range(kl_divergence.size)]
+
+    for i in range(num_half_quantized_bin, zero_bin_index + 1, 1):
+        start_index = zero_bin_index - i
+        end_index = zero_bin_index + i + 1 if (zero_bin_index + i + 1) <= num_bins else num_bins
+
+        thresholds[i - num_half_quantized_bin] = (float(hist_edges[start_index]), float(hist_edges[end_index]))
+
+        sliced_distribution = hist[start_index:end_index].copy()
+
+        p = sliced_distribution.copy()
+        p[0] += sum(hist[:start_index])
+        p[-1] += sum(hist[end_index:])
+
+        nonzeros = (p != 0).astype(np.int64)
+
+        quantized_bins = np.zeros(num_quantized_bins, dtype=np.int64)
+        num_merged_bins = sliced_distribution.size // num_quantized_bins
+
+        for index in range(num_quantized_bins):
+            start = index * num_merged_bins
+            end = start + num_merged_bins
+            quantized_bins[index] = sum(sliced_distribution[start:end])
+        quantized_bins[-1] += sum(sliced_distribution[num_quantized_bins * num_merged_bins:])
+
+        q = np.zeros(p.size, dtype=np.int64)
+        for index in range(num_quantized_bins):
+            start = index * num_merged_bins
+            end = start + num_merged_bins
+
+            norm = sum(nonzeros[start:end])
+            if norm != 0:
+                q[start:end] = float(quantized_bins[index]) / float(norm)
+
+        p = smooth_distribution(p)
+        q = smooth_distribution(q)
+
+        if isinstance(q, np.ndarray):
+            kl_divergence[i - num_half_quantized_bin] = entropy(p, q)
+        else:
+            kl_divergence[i - num_half_quantized_bin] = float('inf')
+
+    return thresholds[np.argmin(kl_divergence)]
+
+def bench(func, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        ret = func()
+    return (time.time() - start) / repeats, ret
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    collector = HistogramCollector('entropy', args.num_quantized_bins, 99.99)
+
+    print("{:<14} {:>12} {:>12} {:>9} {:>5}  {}".format(
+        "tensor", "loop(ms)", "vector(ms)", "speedup", "same", "threshold"))
+    for name, shape, dist in TENSORS:
+        hist = histogram(synthesize(shape, dist, args.batch, rng), args.num_bins)
+        ref_time, ref = bench(lambda: reference_entropy_threshold(
+            hist, args.num_quantized_bins), 1)
+        vec_time, vec = bench(lambda: collector.get_entropy_threshold(
+            hist, args.num_quantized_bins), args.repeats)
+        print("{:<14} {:>12.2f} {:>12.2f} {:>8.1f}x {:>5}  {}".format(
+            name, ref_time * 1e3, vec_time * 1e3, ref_time / vec_time,
+            str(np.allclose(vec, ref, rtol=1e-6)), "(%.6f, %.6f)" % vec))
@@ -0,0 +1,99 @@
+import numpy as np
+
+from yamrt.quant.calibrate import HistogramCollector
+
+
+def _smooth_distribution(p, eps=0.0001):
+    is_zeros = (p == 0).astype(np.float64)
+    is_nonzeros = (p != 0).astype(np.float64)
+    n_zeros = is_zeros.sum()
+    n_nonzeros = p.size - n_zeros
+    if not n_nonzeros:
+        return None
+    eps1 = eps * float(n_zeros) / float(n_nonzeros)
+    return p.astype(np.float64) + eps * is_zeros + (-eps1) * is_nonzeros
+
+def _reference_entropy_threshold(histogram, num_quantized_bins):
+    """ The per-candidate loop of `smooth_distribution` and
+        `scipy.stats.entropy`, accumulated in float64.
+    """
+    hist, hist_edges, _, _, _ = histogram
+    num_bins = hist.size
+    zero_bin_index = num_bins // 2
+    num_half_quantized_bin = num_quantized_bins // 2
+
+    kl_divergence, thresholds = [], []
+    for i in range(num_half_quantized_bin, zero_bin_index + 1):
+        start_index = zero_bin_index - i
+        end_index = min(zero_bin_index + i + 1, num_bins)
+        thresholds.append((float(hist_edges[start_index]),
+                           float(hist_edges[end_index])))
+
+        sliced_distribution = hist[start_index:end_index].copy()
+        p = sliced_distribution.copy()
+        p[0] += hist[:start_index].sum()
+        p[-1] += hist[end_index:].sum()
+        nonzeros = (p != 0).astype(np.int64)
+
+        num_merged_bins = sliced_distribution.size // num_quantized_bins
+        quantized_bins = np.zeros(num_quantized_bins, dtype=np.int64)
+        for index in range(num_quantized_bins):
+            start = index * num_merged_bins
+            quantized_bins[index] = \
+                sliced_distribution[start:start+num_merged_bins].sum()
+        quantized_bins[-1] += \
+            sliced_distribution[num_quantized_bins * num_merged_bins:].sum()
+
+        q = np.zeros(p.size, dtype=np.int64)
+        for index in range(num_quantized_bins):
+            start = index * num_merged_bins
+            end = start + num_merged_bins
+            norm = nonzeros[start:end].sum()
+            if norm != 0:
+                q[start:end] = float(quantized_bins[index]) / float(norm)
+
+        p, q = _smooth_distribution(p), _smooth_distribution(q)
+        if p is None or q is None:
+            kl_divergence.append(float('inf'))
+            continue
+        p, q = p / p.sum(), q / q.sum()
+        kl_divergence.append((p * np.log(p / q)).sum())
+    return thresholds[int(np.argmin(kl_divergence))]
+
+def _random_histogram(rng, dist, num_bins):
+    if dist == "integer":
+        hist = rng.integers(0, 50, size=num_bins)
+        hist[rng.random(num_bins) < 0.3] = 0
+    else:
+        data = rng.normal(size=4096)
+        if dist == "relu":
+            data = np.maximum(data, 0)
+        elif dist == "laplace":
+            data = rng.laplace(scale=0.5, size=4096)
+        threshold = float(np.abs(data).max())
+        hist, _ = np.histogram(data, num_bins, range=(-threshold, threshold))
+    edges = np.linspace(-1, 1, num_bins + 1)
+    return (hist.astype(np.int64), edges, -1., 1., 1.)
+
+def test_entropy_threshold():
+    rng = np.random.default_rng(0)
+    for num_quantized_bins in [8, 16, 128]:
+        collector = HistogramCollector('entropy', num_quantized_bins, 99.99)
+        for dist in ["normal", "relu", "laplace", "integer"]:
+            for _ in range(5):
+                num_bins = int(rng.integers(130, 700))
+                histogram = _random_histogram(rng, dist, num_bins)
+                ret = collector.get_entropy_threshold(
+                    histogram, num_quantized_bins)
+                des = _reference_entropy_threshold(
+                    histogram, num_quantized_bins)
+                assert ret == des, (dist, num_bins, num_quantized_bins)
+
+def test_entropy_threshold_blocks():
+    rng = np.random.default_rng(1)
+    collector = HistogramCollector('entropy', 16, 99.99)
+    histogram = _random_histogram(rng, "laplace", 513)
+    des = collector.get_entropy_threshold(histogram, 16)
+    # the candidates are processed by one row per block
+    assert collector.get_entropy_threshold(
+        histogram, 16, block_size=1) == des